@@ -0,0 +1,119 @@
+import re, json, unicodedata
+from typing import Any, Dict, Optional, Tuple
+
+from models import MessageToApproval
+
+
+# Replies are normalized (lowercase, no accents, no punctuation, no apostrophes) before matching.
+# Only a reply that is exactly one of these (optionally followed by a reason clause) is resolved locally
+AFFIRMATIONS = {
+    # English
+    "yes", "y", "yep", "yeah", "yup", "ok", "okay", "k", "sure", "approve", "approved", "i approve",
+    "go", "go ahead", "do it", "proceed", "confirm", "confirmed", "lgtm", "looks good", "sounds good",
+    "yes please", "yes go ahead", "yes do it", "yes proceed", "ok go ahead", "ok do it", "ship it",
+    # Spanish
+    "si", "sip", "claro", "dale", "de acuerdo", "adelante", "hazlo", "apruebo", "aprobado", "confirmo",
+    "procede", "proceder", "listo", "vale", "perfecto", "correcto", "ok dale", "si dale", "si hazlo",
+    "si adelante", "si procede", "si por favor", "si creala", "si crealo", "ya creala", "ya crealo",
+    "autorizo", "autorizado", "esta bien", "va",
+}
+NEGATIONS = {
+    # English
+    "no", "n", "nope", "nah", "cancel", "stop", "reject", "rejected", "deny", "denied", "abort",
+    "dont", "do not", "dont do it", "do not do it", "no thanks", "not now", "wait", "hold on",
+    # Spanish
+    "no gracias", "cancela", "cancelar", "cancelado", "rechazo", "rechazado", "detente", "para",
+    "mejor no", "no lo hagas", "no hagas nada", "espera", "todavia no", "aun no", "no autorizo",
+}
+# A second clause introduced by these words changes the request: let the LLM read it
+CONTRASTIVE = {"but", "however", "although", "except", "instead", "pero", "aunque", "excepto", "sino", "en vez", "en lugar"}
+# The only clause allowed after the decision word: "no, because ...", "si porque ..."
+REASON_MARKERS = ("because", "since", "porque", "ya que", "pues", "reason", "razon", "razón", "motivo")
+REASON_PATTERN = re.compile(r"(?:^|[\s,.;:!-])(" + "|".join(REASON_MARKERS) + r")\b", re.IGNORECASE)
+
+MAX_LOCAL_REPLY_CHARS = 280
+KEY_VALUE_PATTERN = re.compile(r"""([A-Za-z_][\w.-]*)\s*=\s*("[^"]*"|'[^']*'|\S+)""")
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize('NFKD', text)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = re.sub(r"['’]", "", text)     # "don't" -> "dont"
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _parse_value(raw: str) -> Any:
+    raw = raw.strip()
+    if len(raw) >= 2 and raw[0] == raw[-1] and raw[0] in "\"'":
+        return raw[1:-1]
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return raw
+
+
+def extract_edits(reply: str) -> Tuple[Optional[Dict[str, Any]], str]:
+    """Argument edits given as a JSON object or key=value pairs, and the reply without them.
+
+    Keys are not checked here: classify_approval only applies edits of arguments the tool call already has.
+    """
+    start, end = reply.find('{'), reply.rfind('}')
+    if start != -1 and end > start:
+        try:
+            edits = json.loads(reply[start:end + 1])
+            if isinstance(edits, dict) and edits:
+                return edits, (reply[:start] + " " + reply[end + 1:]).strip()
+        except ValueError:
+            pass
+
+    pairs = KEY_VALUE_PATTERN.findall(reply)
+    if pairs:
+        edits = {key: _parse_value(value) for key, value in pairs}
+        return edits, KEY_VALUE_PATTERN.sub(" ", reply).strip()
+    return None, reply
+
+
+def _split_decision(text: str) -> Tuple[str, str]:
+    """Normalized decision and the reason clause as the user wrote it ('' when there is none).
+
+    The decision is everything before the first reason marker, so "yes, wait" or "ok, what does this do"
+    come back as a decision that matches neither word list.
+    """
+    match = REASON_PATTERN.search(text)
+    if match is None:
+        return _normalize(text), ""
+    return _normalize(text[:match.start(1)]), text[match.start(1):].strip()
+
+
+def classify_approval(reply: str, tool_args: Optional[Dict[str, Any]] = None) -> Optional[MessageToApproval]:
+    """Resolve clear-cut approval replies locally. Returns None when the reply needs the LLM parser."""
+    if not reply or len(reply) > MAX_LOCAL_REPLY_CHARS or "?" in reply:     # Questions need an answer, not a decision
+        return None
+
+    edits, remainder = extract_edits(reply)
+    if edits and not set(edits) <= set(tool_args or {}):   # An unknown key would be silently ignored by the tool
+        return None
+    decision, reason = _split_decision(remainder)
+
+    approved = decision in AFFIRMATIONS
+    rejected = decision in NEGATIONS
+    if approved == rejected:    # Unknown wording
+        return None
+
+    normalized_reason = _normalize(reason)
+    if any(re.search(rf"\b{word}\b", normalized_reason) for word in CONTRASTIVE):
+        return None
+    if edits and not approved:  # "no, use x=1" means something else than a plain rejection
+        return None
+
+    if approved:
+        return MessageToApproval(
+            approved=True,
+            reason=reason or "User approved the proposed tool call.",
+            edited_args={**(tool_args or {}), **edits} if edits else None,
+        )
+    return MessageToApproval(
+        approved=False,
+        reason=reason or "User did not authorize this change.",
+    )
@@ -0,0 +1,93 @@
+import os, json, gzip, time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import boto3
+from botocore.config import Config
+from langchain_core.messages import BaseMessage, messages_to_dict
+
+
+BATCH_WRITE_MAX_ITEMS = 25     # DynamoDB BatchWriteItem limit
+DELETE_WORKERS = int(os.environ.get('CHECKPOINT_DELETE_WORKERS', 8))
+MAX_UNPROCESSED_RETRIES = 5
+
+
+class CheckpointLifecycleManager:
+    """Deletes (and optionally archives) the checkpoint items of finished threads off the reply's critical path."""
+
+    def __init__(self, table_name: str, archive_bucket: Optional[str] = None, region_name: Optional[str] = None):
+        region_name = region_name or os.environ.get("AWS_REGION", "us-east-1")
+        self.table_name = table_name
+        self.archive_bucket = archive_bucket
+        self.client = boto3.client('dynamodb', region_name=region_name, config=Config(max_pool_connections=DELETE_WORKERS + 2))
+        self.s3 = boto3.client('s3', region_name=region_name) if archive_bucket else None
+        self.background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="checkpoint-cleanup")
+        self.pending: List[Future] = []
+
+    def iter_keys(self, thread_id: str) -> Iterator[Dict[str, Any]]:
+        """Primary keys of every checkpoint item of the thread, following LastEvaluatedKey."""
+        paginator = self.client.get_paginator('query')
+        for page in paginator.paginate(
+            TableName=self.table_name,
+            KeyConditionExpression="PK = :pk",
+            ExpressionAttributeValues={":pk": {"S": thread_id}},
+            ProjectionExpression="PK, SK",
+        ):
+            yield from page.get('Items', [])
+
+    def _batch_delete(self, keys: Sequence[Dict[str, Any]]) -> int:
+        request_items = {self.table_name: [{"DeleteRequest": {"Key": key}} for key in keys]}
+        for attempt in range(MAX_UNPROCESSED_RETRIES + 1):
+            response = self.client.batch_write_item(RequestItems=request_items)
+            request_items = response.get('UnprocessedItems') or {}
+            if not request_items:
+                return len(keys)
+            time.sleep(min(0.05 * 2 ** attempt, 1.0))
+        raise RuntimeError(f"{len(request_items[self.table_name])} checkpoint items left unprocessed in {self.table_name}")
+
+    def delete_thread(self, thread_id: str) -> int:
+        """Delete every checkpoint item of the thread with parallel BatchWriteItem calls."""
+        keys = list(self.iter_keys(thread_id))
+        chunks = [keys[i:i + BATCH_WRITE_MAX_ITEMS] for i in range(0, len(keys), BATCH_WRITE_MAX_ITEMS)]
+        with ThreadPoolExecutor(max_workers=DELETE_WORKERS) as executor:
+            deleted = sum(executor.map(self._batch_delete, chunks))
+        print(f"Deleted {deleted} checkpoint items of thread {thread_id}", flush=True)
+        return deleted
+
+    def archive_transcript(self, thread_id: str, messages: Sequence[BaseMessage], metadata: Optional[dict] = None) -> Optional[str]:
+        """Store the gzip-compressed final transcript of the thread in S3 (no-op without an archive bucket)."""
+        if not self.s3:
+            return None
+        key = f"transcripts/{thread_id}/{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json.gz"
+        body = gzip.compress(json.dumps({
+            "thread_id": thread_id,
+            "metadata": metadata or {},
+            "messages": messages_to_dict(list(messages)),
+        }, default=str).encode('utf-8'))
+        self.s3.put_object(Bucket=self.archive_bucket, Key=key, Body=body,
+                           ContentType='application/json', ContentEncoding='gzip')
+        print(f"Archived transcript of thread {thread_id} to s3://{self.archive_bucket}/{key}", flush=True)
+        return key
+
+    def _cleanup(self, thread_id: str, messages: Optional[Sequence[BaseMessage]], metadata: Optional[dict]) -> int:
+        if messages is not None:
+            self.archive_transcript(thread_id, messages, metadata)
+        return self.delete_thread(thread_id)
+
+    def schedule_cleanup(self, thread_id: str, messages: Optional[Sequence[BaseMessage]] = None,
+                         metadata: Optional[dict] = None) -> Future:
+        """Archive (if messages are given) and delete the thread in the background."""
+        future = self.background.submit(self._cleanup, thread_id, messages, metadata)
+        self.pending.append(future)
+        return future
+
+    def wait(self, timeout: Optional[float] = None):
+        """Block until scheduled cleanups finish. Lambda freezes background threads once the handler returns."""
+        if not self.pending:
+            return
+        done, not_done = wait(self.pending, timeout=timeout)
+        for future in done:
+            if future.exception() is not None:
+                print(f"Checkpoint cleanup failed: {future.exception()}", flush=True)
+        self.pending = list(not_done)
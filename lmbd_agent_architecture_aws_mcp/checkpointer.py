@@ -0,0 +1,204 @@
+import os, zlib
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+from langgraph.checkpoint.memory import InMemorySaver
+
+
+# Checkpoints are written through to DynamoDB once the Lambda has less than this left
+FLUSH_MARGIN_MS = int(os.environ.get('CHECKPOINT_FLUSH_MARGIN_MS', 60_000))
+# Serialized values smaller than this are stored uncompressed
+COMPRESSION_MIN_BYTES = int(os.environ.get('CHECKPOINT_COMPRESSION_MIN_BYTES', 1024))
+COMPRESSED_PREFIX = "zlib+"
+
+
+class CompressedSerializer:
+    """Wraps a checkpoint serializer and zlib-compresses large payloads (uncompressed items still load)."""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.inner.dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        return self.inner.loads(data)
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = self.inner.dumps_typed(obj)
+        if len(data) >= COMPRESSION_MIN_BYTES:
+            return COMPRESSED_PREFIX + type_, zlib.compress(data)
+        return type_, data
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if type_.startswith(COMPRESSED_PREFIX):
+            return self.inner.loads_typed((type_[len(COMPRESSED_PREFIX):], zlib.decompress(payload)))
+        return self.inner.loads_typed(data)
+
+
+class WriteBehindSaver(BaseCheckpointSaver):
+    """Buffers checkpoints in memory during a run and persists only the resume points to the durable saver.
+
+    The graph writes a checkpoint after every super-step, but only the last one before an interrupt
+    is ever resumed. Call `flush` once the run pauses and `discard` when the thread is finished or failed.
+    Steps with side effects (an approved create/update/delete) call `write_through` first: their results and
+    the following checkpoint go to DynamoDB, so a retried invocation never runs them again.
+    """
+
+    def __init__(self, durable: BaseCheckpointSaver):
+        super().__init__(serde=durable.serde)
+        self.durable = durable
+        self.durable.serde = CompressedSerializer(durable.serde)
+        self.buffer = InMemorySaver()
+        self.buffered_threads: set = set()
+        self.write_through_threads: set = set()
+        # Latest checkpoint of each thread known to be in DynamoDB: the only valid parent of a flushed one
+        self.durable_heads: Dict[str, RunnableConfig] = {}
+        self.get_remaining_ms: Optional[Callable[[], int]] = None
+        self.stats = defaultdict(int)
+
+    @property
+    def config_specs(self):
+        return self.durable.config_specs
+
+    def set_deadline(self, get_remaining_ms: Optional[Callable[[], int]]):
+        """Register the Lambda `context.get_remaining_time_in_millis` so writes go through when time runs low."""
+        self.get_remaining_ms = get_remaining_ms
+
+    def _running_out_of_time(self) -> bool:
+        return self.get_remaining_ms is not None and self.get_remaining_ms() < FLUSH_MARGIN_MS
+
+    def write_through(self, thread_id: str):
+        """Persist the writes of the running step and the next checkpoint of the thread (the step has side effects)."""
+        self.write_through_threads.add(thread_id)
+
+    def _must_write_through(self, config: RunnableConfig) -> bool:
+        return self._thread_id(config) in self.write_through_threads or self._running_out_of_time()
+
+    def _durable_put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata) -> RunnableConfig:
+        saved = self.durable.put(config, checkpoint, metadata, checkpoint["channel_versions"])
+        self.durable_heads[self._thread_id(config)] = saved
+        self.stats["durable_puts"] += 1
+        return saved
+
+    @staticmethod
+    def _thread_id(config: RunnableConfig) -> str:
+        return config["configurable"]["thread_id"]
+
+    # Reads: the buffer holds the newest checkpoints of the running thread, DynamoDB everything else
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        if self._thread_id(config) in self.buffered_threads:
+            tup = self.buffer.get_tuple(config)
+            if tup is not None:
+                return tup
+        self.stats["durable_reads"] += 1
+        tup = self.durable.get_tuple(config)
+        if tup is not None and not config["configurable"].get("checkpoint_id"):
+            self.durable_heads[self._thread_id(config)] = tup.config
+        return tup
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        seen = set()
+        for saver in (self.buffer, self.durable):
+            for tup in saver.list(config, filter=filter, before=before, limit=limit):
+                checkpoint_id = tup.config["configurable"]["checkpoint_id"]
+                if checkpoint_id in seen:
+                    continue
+                seen.add(checkpoint_id)
+                yield tup
+                if limit is not None and len(seen) >= limit:
+                    return
+
+    # Writes: buffered, or written through (after flushing the buffer) for side effects and when the Lambda is
+    # about to time out
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        if self._must_write_through(config):
+            self.flush(config)
+            # The checkpoint after the side effect is durable: later steps can be buffered again
+            self.write_through_threads.discard(self._thread_id(config))
+            return self._durable_put(config, checkpoint, metadata)
+
+        self.buffered_threads.add(self._thread_id(config))
+        self.stats["buffered_puts"] += 1
+        # Store every channel: unchanged ones may only exist in DynamoDB when resuming
+        return self.buffer.put(config, checkpoint, metadata, checkpoint["channel_versions"])
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        if self._must_write_through(config):
+            self.flush(config)
+            self.stats["durable_writes"] += 1
+            return self.durable.put_writes(config, writes, task_id, task_path)
+
+        self.buffered_threads.add(self._thread_id(config))
+        self.stats["buffered_writes"] += 1
+        self.buffer.put_writes(config, writes, task_id, task_path)
+
+    def get_next_version(self, current: Optional[Any], channel: Any) -> Any:
+        return self.durable.get_next_version(current, channel)
+
+    def flush(self, config: RunnableConfig) -> Optional[RunnableConfig]:
+        """Persist the latest buffered checkpoint of the thread (and its pending writes) to the durable saver."""
+        thread_id = self._thread_id(config)
+        if thread_id not in self.buffered_threads:
+            return None
+        tup = self.buffer.get_tuple({"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}})
+        if tup is None:
+            return None
+
+        # The buffered parent was never persisted: chain to the latest durable checkpoint instead
+        parent_config = self.durable_heads.get(thread_id) or {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+        saved = self._durable_put(parent_config, tup.checkpoint, tup.metadata)
+
+        writes_by_task = defaultdict(list)
+        for task_id, channel, value in tup.pending_writes or []:
+            writes_by_task[task_id].append((channel, value))
+        for task_id, writes in writes_by_task.items():
+            self.durable.put_writes(saved, writes, task_id)
+
+        self.stats["durable_writes"] += len(writes_by_task)
+        print(f"Flushed checkpoint {tup.checkpoint['id']} of thread {thread_id}: {dict(self.stats)}", flush=True)
+        self._drop_buffer(thread_id)
+        return saved
+
+    def _drop_buffer(self, thread_id: str):
+        self.buffered_threads.discard(thread_id)
+        self.buffer.delete_thread(thread_id)
+
+    def discard(self, thread_id: str):
+        """Drop the buffered checkpoints of a thread without persisting them (and forget its run state)."""
+        self._drop_buffer(thread_id)
+        self.write_through_threads.discard(thread_id)
+        self.durable_heads.pop(thread_id, None)
+
+    def delete_thread(self, thread_id: str) -> None:
+        self.discard(thread_id)
+        self.durable.delete_thread(thread_id)
+
+    # The graph is invoked synchronously from the Lambda handler, async calls reuse the sync path
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self.get_tuple(config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None):
+        for tup in self.list(config, filter=filter, before=before, limit=limit):
+            yield tup
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        self.put_writes(config, writes, task_id, task_path)
@@ -0,0 +1,180 @@
+import os, json, time
+from typing import Any, Dict, List, Sequence
+
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    RemoveMessage,
+    SystemMessage,
+    ToolMessage,
+)
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain.chat_models import init_chat_model
+
+from models import AgentState
+
+
+# Compaction kicks in once the (approximate) history size crosses this threshold
+COMPACTION_TOKEN_THRESHOLD = int(os.environ.get('COMPACTION_TOKEN_THRESHOLD', 6000))
+# Minimum number of trailing messages that are always sent verbatim
+COMPACTION_KEEP_LAST = int(os.environ.get('COMPACTION_KEEP_LAST', 6))
+# Long tool outputs are clipped before being handed to the summarizer
+COMPACTION_MAX_CHARS_PER_MESSAGE = int(os.environ.get('COMPACTION_MAX_CHARS_PER_MESSAGE', 4000))
+# Tool calls and approval decisions rendered verbatim; older ones are folded into the summary
+COMPACTION_MAX_TOOL_LEDGER = int(os.environ.get('COMPACTION_MAX_TOOL_LEDGER', 20))
+COMPACTION_MAX_APPROVALS = int(os.environ.get('COMPACTION_MAX_APPROVALS', 10))
+
+summary_llm = init_chat_model(
+    "us.anthropic.claude-3-5-haiku-20241022-v1:0",
+    model_provider="bedrock_converse",
+    temperature=0.0,
+)
+
+SUMMARY_PROMPT = (
+    "You maintain the running memory of a conversation between a user and a cloud infrastructure assistant. "
+    "Merge the previous summary with the new conversation turns into a single concise summary. "
+    "Keep every fact needed to continue the task: user goals and preferences, resource names, IDs, ARNs, regions, "
+    "account details, decisions taken, errors found and pending questions. "
+    "Do not invent information. Answer only with the summary text."
+)
+
+
+def _message_text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, list):
+        content = "\n".join(
+            block.get("text", "") if isinstance(block, dict) else str(block)
+            for block in content
+        )
+    return str(content)
+
+
+def _pending_tool_call_ids(messages: Sequence[BaseMessage]) -> set:
+    """IDs of tool calls that do not have a ToolMessage answering them yet."""
+    requested = {tc["id"] for m in messages if isinstance(m, AIMessage) for tc in (m.tool_calls or [])}
+    answered = {m.tool_call_id for m in messages if isinstance(m, ToolMessage)}
+    return requested - answered
+
+
+def find_split(messages: Sequence[BaseMessage], keep_last: int = COMPACTION_KEEP_LAST) -> int:
+    """Index of the first message kept verbatim (0 means there is nothing to fold).
+
+    The kept window always opens with a HumanMessage, so tool_use/tool_result pairs are never split
+    and Bedrock Converse still receives a user turn first. Messages holding pending tool calls are never folded.
+    """
+    limit = len(messages) - keep_last
+    pending = _pending_tool_call_ids(messages)
+    for idx, m in enumerate(messages):
+        if isinstance(m, AIMessage) and any(tc["id"] in pending for tc in (m.tool_calls or [])):
+            limit = min(limit, idx)
+            break
+
+    for idx in range(limit, 0, -1):
+        if isinstance(messages[idx], HumanMessage):
+            return idx
+    return 0
+
+
+def tool_call_ledger(messages: Sequence[BaseMessage]) -> List[Dict[str, Any]]:
+    """Verbatim record of the tool calls (name and arguments) contained in the folded messages."""
+    results = {m.tool_call_id: m for m in messages if isinstance(m, ToolMessage)}
+    ledger = []
+    for m in messages:
+        if not isinstance(m, AIMessage):
+            continue
+        for tc in (m.tool_calls or []):
+            result = results.get(tc["id"])
+            ledger.append({
+                "id": tc["id"],
+                "tool_name": tc["name"],
+                "tool_args": tc.get("args", {}),
+                "status": getattr(result, "status", "success") if result is not None else "unanswered",
+            })
+    return ledger
+
+
+def _record(record: Dict[str, Any]) -> str:
+    return json.dumps(record, separators=(',', ':'), default=str)
+
+
+def summarize(previous_summary: str, messages: Sequence[BaseMessage], tool_calls: Sequence[dict] = (),
+              approvals: Sequence[dict] = ()) -> str:
+    """`tool_calls` and `approvals` are ledger records that no longer fit the verbatim ledgers."""
+    transcript = "\n".join(
+        [f"[tool call] {_record(t)[:COMPACTION_MAX_CHARS_PER_MESSAGE]}" for t in tool_calls]
+        + [f"[approval] {_record(a)[:COMPACTION_MAX_CHARS_PER_MESSAGE]}" for a in approvals]
+        + [f"[{m.type}] {_message_text(m)[:COMPACTION_MAX_CHARS_PER_MESSAGE]}" for m in messages]
+    )
+    response = summary_llm.invoke([
+        SystemMessage(content=SUMMARY_PROMPT),
+        HumanMessage(content=(
+            f"<previous_summary>\n{previous_summary or 'None'}\n</previous_summary>\n"
+            f"<new_turns>\n{transcript}\n</new_turns>"
+        )),
+    ], max_tokens=1024, config={'tags': ['arch-agent', 'compaction']})
+    return _message_text(response).strip()
+
+
+def render_memory_context(state: AgentState) -> str:
+    """Recalled memories, summary, approvals and folded tool calls rendered for the prompt ('' when there is nothing to add)."""
+    sections = []
+    if state.get("memories"):
+        sections.append(state["memories"])
+    if state.get("summary"):
+        sections.append(f"CONVERSATION SUMMARY (older turns):\n{state['summary']}")
+    if state.get("approvals"):
+        sections.append("USER APPROVAL DECISIONS (verbatim):\n" + "\n".join(_record(a) for a in state["approvals"]))
+    if state.get("tool_ledger"):
+        sections.append("TOOL CALLS ALREADY PERFORMED (verbatim):\n" + "\n".join(_record(t) for t in state["tool_ledger"]))
+    return "\n\n".join(sections)
+
+
+def _context_tokens(state: AgentState) -> int:
+    context = render_memory_context(state)
+    return count_tokens_approximately([SystemMessage(content=context)]) if context else 0
+
+
+def compact_memory(state: AgentState):
+    """Fold older turns, and the ledger records past their caps, into the running summary once the history
+    plus the rendered memory context crosses the token threshold."""
+    print(f"\n\n>>> compact_memory\n", flush=True)
+    messages = state["messages"]
+    tokens_before = count_tokens_approximately(messages) + _context_tokens(state)
+    if tokens_before < COMPACTION_TOKEN_THRESHOLD:
+        return {"messages": []}
+
+    split = find_split(messages)
+    folded, kept = messages[:split], messages[split:]
+    ledger = list(state.get("tool_ledger") or []) + tool_call_ledger(folded)
+    approvals = list(state.get("approvals") or [])
+    ledger_overflow, ledger = ledger[:-COMPACTION_MAX_TOOL_LEDGER], ledger[-COMPACTION_MAX_TOOL_LEDGER:]
+    approvals_overflow, approvals = approvals[:-COMPACTION_MAX_APPROVALS], approvals[-COMPACTION_MAX_APPROVALS:]
+    if not folded and not ledger_overflow and not approvals_overflow:
+        print(f"\tNothing to fold ({tokens_before} tokens, {len(messages)} messages)", flush=True)
+        return {"messages": []}
+
+    start = time.time()
+    summary = summarize(state.get("summary", ""), folded, ledger_overflow, approvals_overflow)
+    tokens_after = count_tokens_approximately(kept) + _context_tokens(
+        {**state, "summary": summary, "tool_ledger": ledger, "approvals": approvals})
+
+    previous = state.get("compaction") or {}
+    metrics = {
+        "rounds": previous.get("rounds", 0) + 1,
+        "folded_messages": previous.get("folded_messages", 0) + len(folded),
+        "folded_records": previous.get("folded_records", 0) + len(ledger_overflow) + len(approvals_overflow),
+        "last_tokens_before": tokens_before,
+        "last_tokens_after": tokens_after,
+        "tokens_saved": previous.get("tokens_saved", 0) + max(tokens_before - tokens_after, 0),
+        "last_latency_ms": int((time.time() - start) * 1000),
+    }
+    print(f"\tCompaction metrics: {metrics}", flush=True)
+
+    return {
+        "messages": [RemoveMessage(id=m.id) for m in folded],
+        "summary": summary,
+        "tool_ledger": {"replace": ledger},
+        "approvals": {"replace": approvals},
+        "compaction": metrics,
+    }
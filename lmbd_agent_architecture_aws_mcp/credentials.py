@@ -0,0 +1,108 @@
+import os, json, time, threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import boto3
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# Refresh this long before the session token expires
+REFRESH_MARGIN_SECONDS = int(os.environ.get('CREDENTIALS_REFRESH_MARGIN_SECONDS', 300))
+# Used when the credentials API does not return an expiration
+DEFAULT_TTL_SECONDS = int(os.environ.get('CREDENTIALS_DEFAULT_TTL_SECONDS', 3600))
+MIN_REFRESH_DELAY_SECONDS = 30
+
+
+def _parse_expiration(value) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) / 1000 if value > 1e11 else float(value)    # epoch in ms or s
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+class CredentialsProvider:
+    """Caches the credentials API response with its expiry and refreshes it in the background before it expires.
+
+    Listeners registered with `on_rotate` receive the new environment (AWS_ACCESS_KEY_ID, ...) on every rotation.
+    """
+
+    def __init__(self, url: str, api_key: str, profile: str = "admin"):
+        self.url = url
+        self.api_key = api_key
+        self.profile = profile
+        self.session = requests.Session()
+        retries = Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=["POST"])
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=retries))
+        self._lock = threading.Lock()
+        self._credentials: Optional[Dict[str, str]] = None
+        self._expires_at = 0.0
+        self._account_id: Optional[str] = os.environ.get('AWS_ACCOUNT_ID')
+        self._listeners: List[Callable[[Dict[str, str]], None]] = []
+        self._timer: Optional[threading.Timer] = None
+
+    def account_id(self) -> str:
+        """Account ID from AWS_ACCOUNT_ID, or a single STS call per container."""
+        if not self._account_id:
+            self._account_id = boto3.client('sts').get_caller_identity()['Account']
+        return self._account_id
+
+    def on_rotate(self, listener: Callable[[Dict[str, str]], None]):
+        self._listeners.append(listener)
+
+    def _fetch(self):
+        response = self.session.post(
+            self.url,
+            headers={'x-api-key': self.api_key, 'Content-Type': 'application/json'},
+            data=json.dumps({"profile": self.profile, "account_id": self.account_id()}),
+            timeout=(3, 10),
+        )
+        print(f"{response=}")
+        response.raise_for_status()
+        credentials = response.json()['credentials']
+        expires_at = _parse_expiration(credentials.get('expiration')) or time.time() + DEFAULT_TTL_SECONDS
+        return {
+            "AWS_ACCESS_KEY_ID": credentials['access_key'],
+            "AWS_SECRET_ACCESS_KEY": credentials['secret_key'],
+            "AWS_SESSION_TOKEN": credentials['session_token'],
+        }, expires_at
+
+    def _is_fresh(self) -> bool:
+        return self._credentials is not None and time.time() < self._expires_at - REFRESH_MARGIN_SECONDS
+
+    def refresh(self) -> Dict[str, str]:
+        with self._lock:
+            previous = self._credentials
+            self._credentials, self._expires_at = self._fetch()
+            credentials = dict(self._credentials)
+            self._schedule_refresh()
+        print(f"AWS credentials refreshed, valid until {datetime.fromtimestamp(self._expires_at).isoformat()}")
+        if previous is not None and previous != credentials:
+            for listener in self._listeners:
+                listener(credentials)
+        return credentials
+
+    def get(self) -> Dict[str, str]:
+        """Cached credentials; refreshed synchronously if the background refresh did not run (e.g. frozen Lambda)."""
+        if self._is_fresh():
+            return dict(self._credentials)
+        return self.refresh()
+
+    def _schedule_refresh(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        delay = max(self._expires_at - REFRESH_MARGIN_SECONDS - time.time(), MIN_REFRESH_DELAY_SECONDS)
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Background credentials refresh failed: {e.__class__.__name__}: {e}")
@@ -7,6 +7,7 @@ import traceback
 # from IPython.display import Image, display
 from langchain_core.tools import tool
 from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.runnables import RunnableConfig
 from langchain_core.messages import (
     AIMessage,
     BaseMessage,
@@ -22,13 +23,24 @@ from langgraph_checkpoint_dynamodb import DynamoDBSaver, DynamoDBConfig, DynamoD
 from langgraph_checkpoint_dynamodb.config import BillingMode
 
 from models import ResponseModel, AgentState
-from mcp_servers import multi_client
-from utils import _get_tools_sync, tools_to_text
+from mcp_servers import multi_client, credentials_provider
+from compaction import compact_memory, render_memory_context, _message_text
+from memories import MemoryStore
+from prompting import PromptAssembler
+from checkpointer import WriteBehindSaver
+from utils import _get_tools_sync
+from deadline import AGENT_TOOL_TIMEOUT_SECONDS, Deadline
 
 
 ALL_TOOLS = _get_tools_sync(multi_client)
 SELECTED_TOOLS = [t for t in ALL_TOOLS if t.name in ['call_aws']]
 NAME_TO_TOOL = {tool.name: tool for tool in SELECTED_TOOLS}
+# Budget of the current invocation (main.lambda_handler points it at the Lambda context)
+DEADLINE = Deadline()
+# A tool call requested by the last model step may run into the reserve, except what the flush and the reply need
+TOOL_RESERVE_SECONDS = 30
+# Summaries of finished threads (main.lambda_handler stores them, get_memories recalls them)
+MEMORIES = MemoryStore()
 
 llm = init_chat_model(
     "us.anthropic.claude-sonnet-4-20250514-v1:0",
@@ -43,12 +55,6 @@ system_prompt = (
     "You must decide when to call a tool and when to ask the user for more information or approval. "
 )
 
-available_tools = (
-    "\n\nTOOLS CATALOG:\n"
-    + tools_to_text(SELECTED_TOOLS) +
-    "\n\n"
-)
-
 considerations = (
     "\n\nCONSIDERATIONS:\n"
     "If you are unsure about any details, ask the user for clarification. "
@@ -58,80 +64,27 @@ considerations = (
     "Be cautious and prioritize safety and security in all your actions.\n\n"
 )
 
-ensure_struct_output = (
-    "\n\nSTRICT OUTPUT:\n"
-    "Respond ONLY with a valid JSON object that EXACTLY matches the schema below.\n"
-    "Do not include any additional text, explanations, visible reasoning, markdown, code blocks, or backticks. "
-    "Nothing outside the JSON.\n"
-    "Use standard JSON: double quotes, no comments, no trailing commas, and no extra fields.\n"
-    "If information is missing, state it ONLY in the 'content' field and set 'need_info' to true. "
-    "Do not include any tool call until the required details are clarified.\n"
-    "Do not wrap the response or add prefixes or suffixes.\n\n"
-    f"{json.dumps(ResponseModel.model_json_schema()['properties'], indent=2)}\n"
-)
-
-
-def parse_response(response: BaseMessage):
-    # Ensure string consistency
-    m = None
-    if isinstance(response.content, str):
-        m = response.content
-        m = "{" + m[:m.rindex('}')+1]
-        response.content = [{"type": "text", "text": m}]
-    elif isinstance(response.content, list) and response.content[0]['type'] == 'text':
-        m = response.content[0]['text']
-        m = "{" + m[:m.rindex('}')+1]
-        response.content[0]['text'] = m
-
-    # Add tool_calls if present in structured output or LangChain-native
-    struct = ResponseModel(**json.loads(m))
-
-    # Prefer LangChain-provided tool_calls if present; otherwise, use our structured output
-    existing_calls = list(getattr(response, "tool_calls", []) or [])
-    final_calls = existing_calls
-
-    if not final_calls and struct.tool_to_call:
-        id_ = f"tooluse_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
-        final_calls = [{
-            "id": id_,
-            "name": struct.tool_to_call,
-            "args": struct.tool_args or {}
-        }]
-
-    response.tool_calls = final_calls
-
-    # Keep JSON content consistent with the selected tool call (if any LangChain/Structured Output)
-    try:
-        patched = struct.model_dump()
-        if final_calls:
-            selected = final_calls[-1]
-            patched["tool_to_call"] = selected.get("name")
-            patched["tool_args"] = selected.get("args", {})
-        response.content[0]["text"] = json.dumps(patched)
-    except Exception:
-        pass
-
-    return response
+# Tools are bound and the static prompt sections rendered once per container
+prompt_assembler = PromptAssembler(llm, SELECTED_TOOLS, system_prompt, considerations)
 
 
-def get_memories(state: AgentState):
-    # - List all Cloud Formation Stacks
-    # - Describe specific Cloud Formation Stack
+def get_memories(state: AgentState, config: RunnableConfig):
+    # Resources, account facts and preferences from earlier threads save call_aws discovery and clarifying questions
+    print(f"\n\n>>> get_memories\n", flush=True)
+    query = next((_message_text(m) for m in reversed(state["messages"]) if isinstance(m, HumanMessage)), "")
     return {
-        "messages": []
+        "messages": [],
+        "memories": MEMORIES.recall(query, config.get("configurable", {}).get("thread_id")),
     }
 
 
 def llm_call(state: AgentState):
     print(f"\n\n>>> llm_call\n", flush=True)
-    response = llm.bind_tools(SELECTED_TOOLS).invoke([
-        SystemMessage(content=system_prompt),
-        *state["messages"], # [-5:]
-        SystemMessage(content=available_tools + considerations + ensure_struct_output),
-        AIMessage(content="{")  # https://docs.anthropic.com/en/docs/build-with-claude/prompt-engineering/prefill-claudes-response
-    ], max_tokens=1024, config={'tags': ['arch-agent', 'llm_call']})
-
-    response = parse_response(response)
+    response = prompt_assembler.invoke(
+        state["messages"],      # Older turns are folded into the summary by compact_memory
+        render_memory_context(state),
+        max_tokens=1024, config={'tags': ['arch-agent', 'llm_call']}
+    )
     print(f"\n\n>>> response\n", response, flush=True)
 
     return {
@@ -141,6 +94,21 @@ def llm_call(state: AgentState):
     }
 
 
+def route_before_llm(state: AgentState):
+    # Not enough time left for another model step (and whatever it calls): pause instead of being killed mid-step
+    return "deadline" if DEADLINE.expired() else "llm_call"
+
+
+def deadline_node(state: AgentState):
+    print(f"\n\n>>> deadline ({DEADLINE})\n", flush=True)
+    # Same resume path as need_info: the checkpoint is flushed and the user's reply continues the run
+    user_reply = interrupt({
+        "type": "need_info",
+        "message": "I ran out of time for this request before finishing. Reply to this message (e.g. 'continue') and I'll pick up where I left off."
+    })
+    return {"messages": [HumanMessage(content=user_reply if isinstance(user_reply, str) else json.dumps(user_reply))]}
+
+
 def route_after_llm(state: AgentState):
     print(f"\n\n>>> router\n", flush=True)
     last = state["messages"][-1]
@@ -183,12 +151,20 @@ def approval_node(state: AgentState):
         "risk_note": "This will create/update/delete cloud resources."
     })
 
+    decision = {
+        "tool_name": tool_name,
+        "tool_args": tool_args,
+        "approved": bool(user_input.get("approved", False)),
+        "reason": user_input.get("reason"),
+        "edited_args": user_input.get("edited_args"),
+    }
+
     if not user_input.get("approved", False):
         state["messages"][-1].tool_calls = []   # Remove tool call on rejection, bc Validation will fail otherwise
         reason = user_input.get("reason", "User did not authorize this change.")
         feedback = (f"Approval denied for {tool_name} with args {tool_args}. "
                     f"Reason: {reason}. Please propose an alternative or ask for clarification.")
-        return {"messages": [HumanMessage(content=feedback)], "approved": False}
+        return {"messages": [HumanMessage(content=feedback)], "approved": False, "approvals": [decision]}
     # TODO: save the authorization message in the Messages history for audit and approval saving
     # TODO: test edited args and ensure they are applied correctly
     # Edited args
@@ -201,15 +177,15 @@ def approval_node(state: AgentState):
                 content=[{"type": "text", "text": json.dumps(patched_json)}],
                 tool_calls=[call]
             )
-        ], "approved": True}
+        ], "approved": True, "approvals": [decision]}
 
     # Approved directly
-    return {"messages": [], "approved": True}
+    return {"messages": [], "approved": True, "approvals": [decision]}
 
 
 def route_after_approval(state: AgentState):
     print(f"\n\n>>> route_after_approval\n", flush=True)
-    return "tool_handler" if state.get("approved") else "llm_call"
+    return "tool_handler" if state.get("approved") else "compact_memory"
 
 
 def needinfo_node(state: AgentState):
@@ -228,23 +204,41 @@ def needinfo_node(state: AgentState):
 
 
 async def _run_tool_capture(_tool_name: str, _args: Dict[str, Any]):
+    timeout = DEADLINE.timeout(AGENT_TOOL_TIMEOUT_SECONDS, TOOL_RESERVE_SECONDS)
     try:
-        return True, await NAME_TO_TOOL[_tool_name].ainvoke(_args)
+        return True, await asyncio.wait_for(NAME_TO_TOOL[_tool_name].ainvoke(_args), timeout)
+    except asyncio.TimeoutError:
+        return False, (f"Tool '{_tool_name}' timed out after {timeout:.1f}s. The command may still complete on AWS: "
+                       "check the resource state before retrying it.")
     except Exception as e:
         err_text = f"Tool '{_tool_name}' failed: {e.__class__.__name__}: {str(e)}\n" + traceback.format_exc()
         return False, err_text
 
 
-def tool_handler(state: AgentState):
+def _has_side_effects(message: AIMessage) -> bool:
+    try:
+        struct = ResponseModel(**json.loads(message.content[0]["text"]))
+    except Exception:
+        return True     # Unknown operation: assume it changes resources
+    return struct.hitl_tool_approval or struct.operation_type in ("create", "update", "delete")
+
+
+def tool_handler(state: AgentState, config: RunnableConfig):
     print(f"\n\n>>> tool_handler\n", flush=True)
     
     last_message = state["messages"][-1]
     print(f"\t{last_message.tool_calls=}", flush=True)
+    if last_message.tool_calls and _has_side_effects(last_message):
+        # The result of a create/update/delete must survive a failed invocation, or its retry would run it again
+        checkpointer.write_through(config["configurable"]["thread_id"])
     if last_message.tool_calls:
         call = last_message.tool_calls[-1]
         tool_name = call["name"]
         args = dict(call.get("args") or {})
 
+        # Refreshes synchronously (and rotates the MCP server env) if the background refresh missed the expiry
+        credentials_provider.get()
+
         # # ! Enforce error for testing purposes
         # if tool_name == "call_aws":
         #     m = args['cli_command']
@@ -296,17 +290,25 @@ graph = StateGraph(AgentState)
 
 # Nodes
 graph.add_node("get_memories", get_memories)
+graph.add_node("compact_memory", compact_memory)
 graph.add_node("llm_call", llm_call)
 graph.add_node("tool_handler", tool_handler)
 graph.add_node("need_info", needinfo_node)
 graph.add_node("approval", approval_node)
+graph.add_node("deadline", deadline_node)
 
 # Edges
 graph.add_edge(START, "get_memories")
-graph.add_edge("get_memories", "llm_call")
-graph.add_edge("need_info", "llm_call")
-graph.add_edge("tool_handler", "llm_call")
+graph.add_edge("get_memories", "compact_memory")
+graph.add_edge("need_info", "compact_memory")
+graph.add_edge("tool_handler", "compact_memory")
+graph.add_conditional_edges("compact_memory", route_before_llm, {
+    "llm_call": "llm_call",
+    "deadline": "deadline",
+})
+graph.add_edge("deadline", "llm_call")
 graph.add_conditional_edges("llm_call", route_after_llm, {
+    "llm_call": "compact_memory",
     "need_info": "need_info",
     "approval": "approval",
     "tool_handler": "tool_handler",
@@ -314,7 +316,7 @@ graph.add_conditional_edges("llm_call", route_after_llm, {
 })
 graph.add_conditional_edges("approval", route_after_approval, {
     "tool_handler": "tool_handler",
-    "llm_call": "llm_call",
+    "compact_memory": "compact_memory",
 })
 
 
@@ -342,7 +344,8 @@ config = DynamoDBConfig(
     # aws_secret_access_key=aws_secret_key,
     # aws_session_token=aws_session_token,
 )
-checkpointer = DynamoDBSaver(config, deploy=True)
+# Checkpoints are buffered in memory during a run; main.lambda_handler flushes the resume points to DynamoDB
+checkpointer = WriteBehindSaver(DynamoDBSaver(config, deploy=True))
 
 agent = graph.compile(checkpointer=checkpointer)
 
@@ -352,6 +355,9 @@ agent = graph.compile(checkpointer=checkpointer)
 # -----------------------------------------------------------------------------
 
 if __name__ == "__main__":
+    # Approximate input tokens of each prompt layout (see prompting.py)
+    print(f"Prompt token report ({prompt_assembler.output_mode}/{prompt_assembler.tool_catalog}): {prompt_assembler.token_report()}")
+
     # display(Image(agent.get_graph(xray=False).draw_mermaid_png()))
 
     thread_config = {"configurable": {"thread_id": uuid.uuid4().hex}}
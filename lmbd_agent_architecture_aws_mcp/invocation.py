@@ -0,0 +1,65 @@
+import os, json, time
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+import boto3
+from langgraph.types import Interrupt
+
+
+class AgentRun(NamedTuple):
+    """Final snapshot of a graph run, built from the run result instead of reloading the checkpoint."""
+    values: Dict[str, Any]
+    interrupts: Tuple[Interrupt, ...]
+    next: Tuple[str, ...]
+
+
+def _interrupted_node(interrupt: Interrupt) -> str:
+    # Interrupt namespaces look like ("approval:<task_id>",)
+    ns = getattr(interrupt, 'ns', None)
+    return ns[0].split(':')[0] if ns else '__interrupt__'
+
+
+def run_agent(agent, graph_input, config) -> AgentRun:
+    """Invoke the graph and return its final values, interrupts and next nodes.
+
+    The graph only pauses on interrupts (no interrupt_before/after), so an empty `next` means it reached END.
+    """
+    result = agent.invoke(graph_input, config)
+    interrupts = tuple(result.get('__interrupt__', ()))
+    values = {k: v for k, v in result.items() if k != '__interrupt__'}
+    next_nodes = tuple(dict.fromkeys(_interrupted_node(i) for i in interrupts))
+    return AgentRun(values, interrupts, next_nodes)
+
+
+class InterruptIndex:
+    """O(1) pending-interrupt item per thread, stored next to the checkpoints.
+
+    Uses its own partition key (INTERRUPT#<thread_id>) so the checkpoint saver never reads it.
+    """
+
+    SK = "PENDING"
+
+    def __init__(self, table_name: str, ttl_days: int = 30, region_name: Optional[str] = None):
+        dynamo = boto3.resource("dynamodb", region_name=region_name or os.environ.get("AWS_REGION", "us-east-1"))
+        self.table = dynamo.Table(table_name)
+        self.ttl_seconds = ttl_days * 24 * 3600
+
+    @staticmethod
+    def _key(thread_id: str) -> dict:
+        return {'PK': f"INTERRUPT#{thread_id}", 'SK': InterruptIndex.SK}
+
+    def get(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        """Value of the pending interrupt of the thread, or None if it is not waiting on the user."""
+        item = self.table.get_item(Key=self._key(thread_id), ConsistentRead=True).get('Item')
+        return json.loads(item['value']) if item else None
+
+    def put(self, thread_id: str, interrupt_value: Dict[str, Any]):
+        self.table.put_item(Item={
+            **self._key(thread_id),
+            'type': interrupt_value.get('type'),
+            'value': json.dumps(interrupt_value, default=str),
+            'created_at': int(time.time()),
+            'expireAt': int(time.time()) + self.ttl_seconds,
+        })
+
+    def delete(self, thread_id: str):
+        self.table.delete_item(Key=self._key(thread_id))
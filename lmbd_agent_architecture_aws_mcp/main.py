@@ -26,39 +26,35 @@ from langgraph.prebuilt import ToolNode
 from langgraph.types import Command, Send, StateSnapshot, Interrupt
 from concurrent.futures import ThreadPoolExecutor
 
-from graph import llm, agent
+from graph import llm, agent, checkpointer, DEADLINE, MEMORIES
 from models import MessageToApproval
+from checkpoint_lifecycle import CheckpointLifecycleManager
+from invocation import InterruptIndex, run_agent
+from approval import classify_approval
+from idempotency import IdempotencyStore, channel_ts_key, idempotent_handler
+from transport import parse_event, send
+from usage import UsageLedger, UsageTracker
+
+CHECKPOINT_LIFECYCLE = CheckpointLifecycleManager(
+    os.environ["DYNAMO_DB_CHECKPOINT_TABLE"],
+    archive_bucket=os.environ.get("CHECKPOINT_ARCHIVE_BUCKET") or None,
+)
+INTERRUPT_INDEX = InterruptIndex(os.environ["DYNAMO_DB_CHECKPOINT_TABLE"])
+IDEMPOTENCY = IdempotencyStore('architecture_agent')
+USAGE = UsageLedger()
 
-LAMBDA_SERVICE = boto3.client('lambda')
-
-
-def invoke_message_event(request_args: dict):
-    if os.environ.get('ENV', 'dev') == 'dev':
-        sender_function_url = re.sub(r'https?:\/\/(localhost|127\.0\.0\.1)(:\d+)?', r'http://host.docker.internal\2', os.environ['LOCAL_SENDER_FUNCTION_URL'])
-
-        print(f"Calling local agent at {sender_function_url}")
-        response = requests.post(
-            sender_function_url,
-            headers={'Content-Type': 'application/json'},
-            json=request_args,
-        )
-        print("Event sent to local agent:", response.status_code, response.text)
-    else:
-        sender_lambda_arn = os.environ['SENDER_FUNCTION_ARN']
 
-        print(f"Invoking Lambda Function {sender_lambda_arn}")
-        response = LAMBDA_SERVICE.invoke(
-            FunctionName=sender_lambda_arn,
-            InvocationType='Event',  # Asynchronous invocation
-            Payload=json.dumps(request_args),
-        )
-        print("Event sent to Lambda:", response)
+def _request_key(event) -> str | None:
+    request = parse_event(event)
+    return channel_ts_key(request.get('channel'), request.get('ts'))
 
 
+# Async invokes are retried on error: a duplicate would resume the graph (or post the reply) twice
+@idempotent_handler(IDEMPOTENCY, _request_key)
 def lambda_handler(event, context):
     print(f"Received event: {json.dumps(event, indent=2)}")
     if 'body' in event:
-        request = json.loads(event['body']) if isinstance(event['body'], str) else event['body']
+        request = parse_event(event)
     else:
         raise ValueError("Invalid event structure: 'body' field missing.")
     
@@ -82,51 +78,62 @@ def lambda_handler(event, context):
         }
     
     thread_id = request['thread_ts']
-    thread_config = {"configurable": {"thread_id": thread_id}}
-
-    last_state: StateSnapshot = agent.get_state(thread_config)
-    print(f"\n\t{last_state}\n", last_state)
+    usage = UsageTracker()
+    # The callbacks reach every model call of the graph (llm_call, compaction)
+    thread_config = {"configurable": {"thread_id": thread_id}, "callbacks": [usage]}
+    # Drop progress buffered by a failed run in this container: the thread resumes from its last durable interrupt
+    checkpointer.discard(thread_id)
+    checkpointer.set_deadline(getattr(context, 'get_remaining_time_in_millis', None))
+    # The graph pauses (deadline interrupt) before a model step it can't finish in time
+    DEADLINE.set(getattr(context, 'get_remaining_time_in_millis', None))
+
+    # Route with the O(1) pending-interrupt item instead of loading the whole checkpoint
+    pending_interrupt = INTERRUPT_INDEX.get(thread_id)
+    print(f"\n\tpending_interrupt\n", pending_interrupt)
 
     # Send user message to the agent. TODO: format in case of HITL response
-    result_or_pause = None
-    if last_state.values and last_state.created_at: # Check if checkpoint exists
-        # Get last interruption if any
-        if hasattr(last_state, 'interrupts') and last_state.interrupts:
-            last_interrupt: Interrupt = last_state.interrupts[-1]
-            interrupt_type: str = last_state.interrupts[-1].value['type']
-
-            human_response = request['message']
-            # Continue graph execution based on the last interrupt type
-            print(f"Resuming from interrupt ({interrupt_type}): {last_interrupt}")
-            if interrupt_type == "need_info":
-                result_or_pause = agent.invoke(Command(resume=human_response), thread_config)
-            elif interrupt_type == "approval_request":
+    if pending_interrupt:
+        interrupt_type: str = pending_interrupt['type']
+
+        human_response = request['message']
+        # Continue graph execution based on the last interrupt type
+        print(f"Resuming from interrupt ({interrupt_type}): {pending_interrupt}")
+        if interrupt_type == "need_info":
+            run = run_agent(agent, Command(resume=human_response), thread_config)
+        elif interrupt_type == "approval_request":
+            # Clear-cut replies ("si", "yes", "no, because ...", "ok instance_type=t3.micro") skip the model call
+            approval = classify_approval(human_response, pending_interrupt.get('tool_args'))
+            if approval is None:
                 # Structured output/parsing can be replaced by Prompt Prefilling
                 messages = [
                     SystemMessage(content=f"You are a parsed system that extracts user approval decisions regarding a tool call. Respond ONLY with a valid JSON object that EXACTLY matches the schema below.\n{json.dumps(MessageToApproval.model_json_schema()['properties'], indent=2)}\n"),
-                    HumanMessage(content=f"Structure this Human Message approval:\n{human_response}\n With respect to this proposed tool call: {last_interrupt.value['message']}\n")
+                    HumanMessage(content=f"Structure this Human Message approval:\n{human_response}\n With respect to this proposed tool call: {pending_interrupt['message']}\n")
                 ]
-                response = llm.with_structured_output(MessageToApproval, include_raw=True).invoke(messages, config={'tags': ['arch-agent', 'parse-approval']})
+                response = llm.with_structured_output(MessageToApproval, include_raw=True).invoke(messages, config={'tags': ['arch-agent', 'parse-approval'], 'callbacks': [usage]})
 
                 print(f"LLM approval parsing response keys: {response.keys()}")
-                parsed_response = response['parsed'].model_dump()
-                print(f"Parsed content: {parsed_response}")
-                
-                result_or_pause = agent.invoke(Command(resume=response['parsed'].model_dump()), thread_config)
+                approval = response['parsed']
             else:
-                raise NotImplementedError(f"Logic not implemented yet for state interrupt type: {interrupt_type}")
+                print("Approval resolved locally")
+            print(f"Parsed content: {approval.model_dump()}")
+            
+            run = run_agent(agent, Command(resume=approval.model_dump()), thread_config)
         else:
-            raise NotImplementedError(f"State not supported yet: {last_state}")
-    else:   # Checkpoint does not exist, start fresh
+            raise NotImplementedError(f"Logic not implemented yet for state interrupt type: {interrupt_type}")
+    else:   # Not waiting on the user: start fresh (or continue a finished thread)
         print("Starting new thread")
-        result_or_pause = agent.invoke({"messages": [
-            HumanMessage(content=request['message'])
-        ]}, config=thread_config)
-
+        content = request['message']
+        if request.get('thread_context'):
+            # Compact Slack thread context built by the evaluator (rolling summary + last messages)
+            content = f"<thread_context>\n{request['thread_context']}\n</thread_context>\n\n{content}"
+        run = run_agent(agent, {"messages": [
+            HumanMessage(content=content)
+        ]}, thread_config)
+
+    result_or_pause = run.values
+    USAGE.record(request['channel'], request['thread_ts'], usage, 'architecture_agent')
     print("\n\tresult_or_pause\n", result_or_pause)
-    
-    new_state = agent.get_state(thread_config)
-    print("\n\tlast_state\n", new_state)
+    print("\n\tnext\n", run.next, run.interrupts)
 
     request_args = {
         'source': 'ArchitectureAgent',
@@ -134,6 +141,7 @@ def lambda_handler(event, context):
         
         'channel': request['channel'],
         'thread_ts': request['thread_ts'],
+        'ts': request.get('ts'),
         'human_message': request['message'],
 
         'args': {
@@ -143,42 +151,50 @@ def lambda_handler(event, context):
     }
 
     # Respond to user
-    if len(getattr(new_state, 'next', ())) == 0:
-        # TODO: If the graph ENDs, summarize the full checkpoint story and store it somewhere (S3, DynamoDB, etc) to then retrieve it later as memories via RAG.
+    if len(run.next) == 0:
         print("Empty tuple / Final state")
         content = result_or_pause['messages'][-1].content
         if isinstance(content, list) and content[0]['type'] == 'text':
             content = content[0]['text']
         
         response_dict: dict = json.loads(content)
-        
-        # Delete the checkpoint from the DB if not needed anymore
-        print(f"Deleting checkpoint ({thread_id}) from DB")
-        dynamo = boto3.resource("dynamodb", region_name=os.environ.get("AWS_REGION", "us-east-1"))
-        table = dynamo.Table(os.environ["DYNAMO_DB_CHECKPOINT_TABLE"])
-        
-        response = table.query(KeyConditionExpression=boto3.dynamodb.conditions.Key('PK').eq(thread_id))
-        with table.batch_writer() as batch:
-            for item in response['Items']:
-                batch.delete_item(Key={'PK': item['PK'], 'SK': item['SK']})  # Assuming SK is sort key
+
+        # Finished threads are never resumed, so the buffered checkpoints are not persisted
+        checkpointer.discard(thread_id)
+        if pending_interrupt:
+            INTERRUPT_INDEX.delete(thread_id)
 
         response_content = response_dict['content']
         request_args['ai_message'] = response_content
         request_args['args']['text'] = response_content
 
-        invoke_message_event(request_args)
+        send('Sender', request_args)
+
+        # Delete the checkpoint from the DB (archiving the transcript first) once the reply is on its way
+        print(f"Deleting checkpoint ({thread_id}) from DB")
+        CHECKPOINT_LIFECYCLE.schedule_cleanup(thread_id, result_or_pause['messages'], {
+            'channel': request['channel'],
+            'thread_ts': request['thread_ts'],
+        })
+        # Summarize the finished thread so later conversations can recall it (see memories.py)
+        MEMORIES.schedule_remember(thread_id, result_or_pause['messages'], result_or_pause.get('summary', ""),
+                                   result_or_pause.get('tool_ledger', []), {'channel': request['channel']})
+        CHECKPOINT_LIFECYCLE.wait()
+        MEMORIES.wait(DEADLINE.timeout(reserve=5))
 
         return {
             "statusCode": 200,
             "body": response_content
         }
     else:
-        print(new_state.next)
         print("Not final state")
+        # Persist the resume point (checkpoint + interrupt writes) before answering the user
+        checkpointer.flush(thread_config)
     
     # Ask user (HITL -> need_info or approval)
-    if '__interrupt__' in result_or_pause:
-        hitl_dict = result_or_pause['__interrupt__'][0].value
+    if run.interrupts:
+        hitl_dict = run.interrupts[0].value
+        INTERRUPT_INDEX.put(thread_id, hitl_dict)
         response_content = f"""
         Human intervention required (type: {hitl_dict['type']}):
         {hitl_dict['message']}
@@ -186,7 +202,7 @@ def lambda_handler(event, context):
 
         request_args['ai_message'] = response_content
         request_args['args']['text'] = response_content
-        invoke_message_event(request_args)
+        send('Sender', request_args)
 
         return {
             "statusCode": 200,
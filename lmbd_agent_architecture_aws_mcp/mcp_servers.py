@@ -1,41 +1,25 @@
 import os, shutil
 from langchain_mcp_adapters.client import MultiServerMCPClient
 from langchain_mcp_adapters.tools import load_mcp_tools
-import requests
 import json
-import boto3
+from credentials import CredentialsProvider
 
 
-def get_current_account_id() -> str:
-    """Fetch the current AWS account ID using STS."""
-    sts_client = boto3.client('sts')
-    identity = sts_client.get_caller_identity()
-    return identity['Account']
-
+# Credentials are cached with their expiry and refreshed in the background before the session token expires
+credentials_provider = CredentialsProvider(
+    os.environ['CREDENTIALS_API_URL'],
+    os.environ['CREDENTIALS_API_X_API_KEY'],
+)
 
-def get_aws_credentials() -> dict:
-    """Fetch AWS credentials from a secure endpoint."""
-    url = os.environ['CREDENTIALS_API_URL']
 
-    payload = json.dumps({
-        "profile": "admin",
-        "account_id": get_current_account_id()
-    })
-    headers = {
-        'x-api-key': os.environ['CREDENTIALS_API_X_API_KEY'],
-        'Content-Type': 'application/json'
-    }
+def get_current_account_id() -> str:
+    """Fetch the current AWS account ID (AWS_ACCOUNT_ID or STS, once per container)."""
+    return credentials_provider.account_id()
 
-    response = requests.request("POST", url, headers=headers, data=payload)
-    print(f"{response=}")
-    response_dict = json.loads(response.text)
-    print(f"{response_dict=}")
 
-    return {
-        "AWS_ACCESS_KEY_ID": response_dict['credentials']['access_key'],
-        "AWS_SECRET_ACCESS_KEY": response_dict['credentials']['secret_key'],
-        "AWS_SESSION_TOKEN": response_dict['credentials']['session_token']
-    }
+def get_aws_credentials() -> dict:
+    """Fetch AWS credentials from a secure endpoint (cached until shortly before they expire)."""
+    return credentials_provider.get()
 
 
 env_config = {
@@ -83,19 +67,31 @@ def _resolver_aws_api_mcp_server_cmd():
 
 cmd, args = _resolver_aws_api_mcp_server_cmd()
 
-multi_client = MultiServerMCPClient({
-    "awslabs.aws-api-mcp-server": {
-        "command": cmd,
-        "args": args,
-        "env": {
-            # "AWS_REGION": "us-east-1"
-            "READ_OPERATIONS_ONLY": "false",
-            "REQUIRE_MUTATION_CONSENT": "false",
-            **env_config,
-            **get_aws_credentials(),
-        },
-        # "disabled": "false",
-        # "autoApprove": [],
-        "transport": "stdio",
+aws_api_mcp_connection = {
+    "command": cmd,
+    "args": args,
+    "env": {
+        # "AWS_REGION": "us-east-1"
+        "READ_OPERATIONS_ONLY": "false",
+        "REQUIRE_MUTATION_CONSENT": "false",
+        **env_config,
+        **get_aws_credentials(),
     },
+    # "disabled": "false",
+    # "autoApprove": [],
+    "transport": "stdio",
+}
+
+
+def _apply_rotated_credentials(credentials: dict):
+    # Tools loaded without a session start a new stdio server process per call from this connection,
+    # so updating its env in place makes the next tool call run with the rotated credentials
+    aws_api_mcp_connection["env"].update(credentials)
+    print("Rotated AWS credentials applied to the MCP server configuration")
+
+
+credentials_provider.on_rotate(_apply_rotated_credentials)
+
+multi_client = MultiServerMCPClient({
+    "awslabs.aws-api-mcp-server": aws_api_mcp_connection,
 })
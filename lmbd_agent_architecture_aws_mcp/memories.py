@@ -0,0 +1,118 @@
+import os, json
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import List, Optional, Sequence
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+from models import ThreadMemory
+from compaction import summary_llm, _message_text
+from vector_index import VectorIndex, get_embeddings
+
+
+# s3://bucket/key.npz or a local path; unset = no memories
+MEMORY_INDEX_LOCATION = os.environ.get('MEMORY_INDEX_LOCATION')
+# Resources get deleted and accounts change: old memories stop being injected
+MEMORY_TTL_DAYS = float(os.environ.get('MEMORY_TTL_DAYS', 90))
+MEMORY_TOP_K = int(os.environ.get('MEMORY_TOP_K', 4))
+MEMORY_MIN_SCORE = float(os.environ.get('MEMORY_MIN_SCORE', 0.35))
+# Share of the BM25 keyword score in the ranking (resource names and IDs are matched literally)
+MEMORY_KEYWORD_WEIGHT = float(os.environ.get('MEMORY_KEYWORD_WEIGHT', 0.3))
+# What the memory extraction gets to see of a finished thread
+MEMORY_MAX_CHARS_PER_MESSAGE = 2000
+MEMORY_MAX_TRANSCRIPT_CHARS = 40000
+
+MEMORY_PROMPT = (
+    "You write the long-term memory of a finished conversation between a user and a cloud infrastructure assistant "
+    "that operates their AWS account. Future conversations will read it to avoid rediscovering the account and "
+    "asking the user again. Record only what the transcript shows: resources with their exact IDs/ARNs/regions and "
+    "final state, durable account facts, and the user's stated preferences. Do not invent information."
+)
+
+
+def thread_transcript(messages: Sequence[BaseMessage], summary: str = "", tool_ledger: Sequence[dict] = ()) -> str:
+    """Compaction summary, folded tool calls and remaining messages of a thread, newest kept when over budget."""
+    parts = [f"[summary of older turns] {summary}"] if summary else []
+    parts += [f"[tool call] {json.dumps(call, separators=(',', ':'), default=str)}" for call in tool_ledger]
+    parts += [f"[{m.type}] {_message_text(m)[:MEMORY_MAX_CHARS_PER_MESSAGE]}" for m in messages]
+    transcript = "\n".join(parts)
+    return transcript[-MEMORY_MAX_TRANSCRIPT_CHARS:]
+
+
+def memory_text(memory: ThreadMemory) -> str:
+    """What is indexed (and injected) for a thread."""
+    lines = [memory.summary]
+    for title, items in (("Resources", memory.resources), ("Account", memory.account_facts),
+                         ("Preferences", memory.preferences)):
+        if items:
+            lines.append(f"{title}: " + "; ".join(items))
+    return "\n".join(lines)
+
+
+def render_memories(results: Sequence[tuple]) -> str:
+    if not results:
+        return ""
+    lines = ["MEMORIES OF PREVIOUS CONVERSATIONS (most relevant first; they may be outdated, "
+             "verify a resource still exists before modifying it):"]
+    for _, entry in results:
+        date = datetime.fromtimestamp(entry['created_at'], timezone.utc).strftime("%Y-%m-%d")
+        channel = f", #{entry['channel']}" if entry.get('channel') else ""
+        lines.append(f"- [{date}{channel}] " + entry['text'].replace("\n", "\n  "))
+    return "\n".join(lines)
+
+
+class MemoryStore:
+    """Summaries of finished threads (resources, account facts, user preferences) and their retrieval.
+
+    The summary is written off the reply's critical path, like the checkpoint cleanup; both are best effort.
+    """
+
+    def __init__(self, location: Optional[str] = MEMORY_INDEX_LOCATION):
+        self.index = VectorIndex(location, get_embeddings(), MEMORY_TTL_DAYS * 86400) if location else None
+        self.background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memories")
+        self.pending: List[Future] = []
+
+    def recall(self, query: str, thread_id: Optional[str] = None) -> str:
+        """Rendered top-k memories for the query, excluding the thread's own ('' when there are none)."""
+        if self.index is None or not query.strip():
+            return ""
+        try:
+            results = self.index.search(query, k=MEMORY_TOP_K, min_score=MEMORY_MIN_SCORE,
+                                        keyword_weight=MEMORY_KEYWORD_WEIGHT,
+                                        where=lambda entry: entry.get('thread_id') != thread_id)
+        except Exception as e:
+            print(f"Memory recall failed: {e.__class__.__name__}: {e}", flush=True)
+            return ""
+        print(f"Recalled {len(results)} memories: {[round(score, 3) for score, _ in results]}", flush=True)
+        return render_memories(results)
+
+    def remember(self, thread_id: str, messages: Sequence[BaseMessage], summary: str = "",
+                 tool_ledger: Sequence[dict] = (), metadata: Optional[dict] = None) -> Optional[dict]:
+        memory = summary_llm.with_structured_output(ThreadMemory).invoke([
+            SystemMessage(content=MEMORY_PROMPT),
+            HumanMessage(content=f"<transcript>\n{thread_transcript(messages, summary, tool_ledger)}\n</transcript>"),
+        ], config={'tags': ['arch-agent', 'memory']})
+        if not memory.worth_remembering:
+            print(f"Nothing to remember from thread {thread_id}", flush=True)
+            return None
+        entry = self.index.add(memory_text(memory), {'thread_id': thread_id, **(metadata or {})})
+        print(f"Stored memory {entry['id']} of thread {thread_id}", flush=True)
+        return entry
+
+    def schedule_remember(self, thread_id: str, messages: Sequence[BaseMessage], summary: str = "",
+                          tool_ledger: Sequence[dict] = (), metadata: Optional[dict] = None) -> Optional[Future]:
+        if self.index is None:
+            return None
+        future = self.background.submit(self.remember, thread_id, list(messages), summary, list(tool_ledger), metadata)
+        self.pending.append(future)
+        return future
+
+    def wait(self, timeout: Optional[float] = None):
+        """Block until scheduled writes finish. Lambda freezes background threads once the handler returns."""
+        if not self.pending:
+            return
+        done, not_done = wait(self.pending, timeout=timeout)
+        for future in done:
+            if future.exception() is not None:
+                print(f"Could not store the thread memory: {future.exception()}", flush=True)
+        self.pending = list(not_done)
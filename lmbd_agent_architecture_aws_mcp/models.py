@@ -27,8 +27,33 @@ class ResponseModel(BaseModel):
         "When additional user information is needed before execution, explain why approval is required."
     ))
 
+class ThreadMemory(BaseModel):
+    summary: str = Field(description="One to three sentences on what the user wanted and what was done.")
+    resources: List[str] = Field(description="Each AWS resource created, modified, deleted or inspected, with its type, name/ID/ARN, region and what happened to it. Empty if none.")
+    account_facts: List[str] = Field(description="Durable facts about the AWS account or environment learned in the conversation (e.g. default VPC and subnets, existing key pairs, naming conventions, quotas hit). Empty if none.")
+    preferences: List[str] = Field(description="Preferences or constraints the user stated (e.g. 'prefers Amazon Linux', 'only us-east-1', 't3 instances'). Empty if none.")
+    worth_remembering: bool = Field(description="False when the conversation holds nothing reusable later (greetings, a single generic question).")
+
+
+def extend_or_replace(left: List[Dict[str, Any]], right: Any) -> List[Dict[str, Any]]:
+    """operator.add, except that {'replace': [...]} (plain data, so it survives checkpoint serialization) replaces the list.
+
+    Compaction uses it to cap the ledgers after folding the oldest records into the summary.
+    """
+    if isinstance(right, dict) and 'replace' in right:
+        return list(right['replace'])
+    return (left or []) + right
+
+
 class AgentState(MessagesState):
     # system_prompt: str = system_prompt
     # ensure_struct_output: str = ensure_struct_output
     tool_calls: List[Dict[str, Any]]
     approved: Optional[bool] = None
+    # Memory compaction (see compaction.py)
+    summary: str
+    tool_ledger: Annotated[List[Dict[str, Any]], extend_or_replace]
+    approvals: Annotated[List[Dict[str, Any]], extend_or_replace]
+    compaction: Dict[str, Any]
+    # Relevant memories of previous threads, rendered (see memories.py)
+    memories: str
@@ -0,0 +1,186 @@
+import os, json
+from datetime import datetime
+from typing import Any, Dict, List, Sequence
+
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    SystemMessage,
+)
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from models import ResponseModel
+from utils import _dumps, tools_to_text
+
+
+# 'prefill': JSON answer as text with a "{" prefill (parsed by parse_prefill_response)
+# 'structured': native tool-based response schema (parsed by parse_structured_response)
+OUTPUT_MODE = os.environ.get('ARCH_AGENT_OUTPUT_MODE', 'prefill')
+# 'names': tool schemas only travel through bind_tools, 'full': also render them (minified) in the prompt
+TOOL_CATALOG = os.environ.get('ARCH_AGENT_TOOL_CATALOG', 'names')
+
+
+def _tooluse_id() -> str:
+    return f"tooluse_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+
+
+def _response_text(struct: ResponseModel, final_calls: List[Dict[str, Any]]) -> str:
+    """JSON content kept consistent with the selected tool call (if any)."""
+    patched = struct.model_dump()
+    if final_calls:
+        selected = final_calls[-1]
+        patched["tool_to_call"] = selected.get("name")
+        patched["tool_args"] = selected.get("args", {})
+    return json.dumps(patched)
+
+
+def parse_prefill_response(response: BaseMessage):
+    # Ensure string consistency
+    m = None
+    if isinstance(response.content, str):
+        m = response.content
+        m = "{" + m[:m.rindex('}')+1]
+        response.content = [{"type": "text", "text": m}]
+    elif isinstance(response.content, list) and response.content[0]['type'] == 'text':
+        m = response.content[0]['text']
+        m = "{" + m[:m.rindex('}')+1]
+        response.content[0]['text'] = m
+
+    # Add tool_calls if present in structured output or LangChain-native
+    struct = ResponseModel(**json.loads(m))
+
+    # Prefer LangChain-provided tool_calls if present; otherwise, use our structured output
+    existing_calls = list(getattr(response, "tool_calls", []) or [])
+    final_calls = existing_calls
+
+    if not final_calls and struct.tool_to_call:
+        final_calls = [{
+            "id": _tooluse_id(),
+            "name": struct.tool_to_call,
+            "args": struct.tool_args or {}
+        }]
+
+    response.tool_calls = final_calls
+
+    # Keep JSON content consistent with the selected tool call (if any LangChain/Structured Output)
+    try:
+        response.content[0]["text"] = _response_text(struct, final_calls)
+    except Exception:
+        pass
+
+    return response
+
+
+def parse_structured_response(response: AIMessage):
+    """Turn the forced ResponseModel tool call into the same message shape produced by the prefill mode."""
+    struct_calls = [tc for tc in (response.tool_calls or []) if tc["name"] == ResponseModel.__name__]
+    if not struct_calls:
+        raise ValueError(f"Model did not call {ResponseModel.__name__}: {response.content}")
+    struct = ResponseModel(**struct_calls[-1]["args"])
+
+    final_calls = []
+    if struct.tool_to_call:
+        final_calls = [{
+            "id": _tooluse_id(),
+            "name": struct.tool_to_call,
+            "args": struct.tool_args or {}
+        }]
+
+    return AIMessage(
+        content=[{"type": "text", "text": _response_text(struct, final_calls)}],
+        tool_calls=final_calls,
+        id=response.id,
+        response_metadata=response.response_metadata,
+        usage_metadata=response.usage_metadata,
+    )
+
+
+class PromptAssembler:
+    """Builds the llm_call prompt. Tools are bound and static sections are rendered once per container."""
+
+    def __init__(self, llm, tools: Sequence, system_prompt: str, considerations: str,
+                 output_mode: str = OUTPUT_MODE, tool_catalog: str = TOOL_CATALOG):
+        if output_mode not in ('prefill', 'structured'):
+            raise ValueError(f"Unknown output mode: {output_mode}")
+        self.tools = list(tools)
+        self.output_mode = output_mode
+        self.tool_catalog = tool_catalog
+        self.considerations = considerations
+        self.system_message = SystemMessage(content=system_prompt)
+        self.instructions = SystemMessage(content=self._render_instructions(considerations))
+
+        # llm=None builds a render-only assembler (used by token_report)
+        self.runnable = None
+        if llm is not None and output_mode == 'structured':
+            self.runnable = llm.bind_tools([*self.tools, ResponseModel], tool_choice=ResponseModel.__name__)
+        elif llm is not None:
+            self.runnable = llm.bind_tools(self.tools)
+
+    def _render_catalog(self) -> str:
+        if self.tool_catalog == 'full':
+            body = tools_to_text(self.tools, minify=True)
+        else:
+            body = "Tool specifications are provided through the tool-use API: " + ", ".join(t.name for t in self.tools)
+        return "\n\nTOOLS CATALOG:\n" + body + "\n\n"
+
+    def _render_instructions(self, considerations: str) -> str:
+        if self.output_mode == 'structured':
+            struct_output = (
+                "\n\nSTRICT OUTPUT:\n"
+                f"Always answer by calling the `{ResponseModel.__name__}` tool. "
+                "Put the tool you want to execute, if any, in its 'tool_to_call' and 'tool_args' fields. "
+                "If information is missing, state it ONLY in the 'content' field and set 'need_info' to true. "
+                "Do not include any tool call until the required details are clarified.\n"
+            )
+        else:
+            struct_output = (
+                "\n\nSTRICT OUTPUT:\n"
+                "Respond ONLY with a valid JSON object that EXACTLY matches the schema below.\n"
+                "Do not include any additional text, explanations, visible reasoning, markdown, code blocks, or backticks. "
+                "Nothing outside the JSON.\n"
+                "Use standard JSON: double quotes, no comments, no trailing commas, and no extra fields.\n"
+                "If information is missing, state it ONLY in the 'content' field and set 'need_info' to true. "
+                "Do not include any tool call until the required details are clarified.\n"
+                "Do not wrap the response or add prefixes or suffixes.\n\n"
+                f"{_dumps(ResponseModel.model_json_schema()['properties'], minify=True)}\n"
+            )
+        return self._render_catalog() + considerations + struct_output
+
+    def build(self, messages: Sequence[BaseMessage], memory_context: str = "") -> List[BaseMessage]:
+        prompt = [
+            self.system_message,
+            *([SystemMessage(content=memory_context)] if memory_context else []),
+            *messages,
+            self.instructions,
+        ]
+        if self.output_mode == 'prefill':
+            prompt.append(AIMessage(content="{"))  # https://docs.anthropic.com/en/docs/build-with-claude/prompt-engineering/prefill-claudes-response
+        return prompt
+
+    def invoke(self, messages: Sequence[BaseMessage], memory_context: str = "", **kwargs):
+        response = self.runnable.invoke(self.build(messages, memory_context), **kwargs)
+        if self.output_mode == 'structured':
+            return parse_structured_response(response)
+        return parse_prefill_response(response)
+
+    def token_report(self, messages: Sequence[BaseMessage] = ()) -> Dict[str, int]:
+        """Approximate input tokens (prompt + tool specs) per prompt variant for the given conversation (empty by default)."""
+        def tool_spec_tokens(tools) -> int:
+            return count_tokens_approximately([SystemMessage(content=_dumps([convert_to_openai_tool(t) for t in tools], minify=True))])
+
+        # Previous layout: pretty-printed catalog and response schema on every call
+        legacy_text = (
+            "\n\nTOOLS CATALOG:\n" + tools_to_text(self.tools) + "\n\n" + self.considerations
+            + json.dumps(ResponseModel.model_json_schema()['properties'], indent=2)
+        )
+        report = {
+            "legacy": count_tokens_approximately([self.system_message, *messages, SystemMessage(content=legacy_text)])
+                      + tool_spec_tokens(self.tools),
+        }
+        for mode in ('prefill', 'structured'):
+            for catalog in ('full', 'names'):
+                variant = PromptAssembler(None, self.tools, self.system_message.content, self.considerations, mode, catalog)
+                tools = [*self.tools, ResponseModel] if mode == 'structured' else self.tools
+                report[f"{mode}/{catalog}"] = count_tokens_approximately(variant.build(messages)) + tool_spec_tokens(tools)
+        return report
@@ -18,27 +18,33 @@ def _get_tools_sync(client: MultiServerMCPClient):
     else:
         return asyncio.run(client.get_tools())
 
-def _render_tool_schema(tool: StructuredTool) -> str:
+def _dumps(obj, minify: bool = False) -> str:
+    if minify:
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+    return json.dumps(obj, indent=2)
+
+
+def _render_tool_schema(tool: StructuredTool, minify: bool = False) -> str:
     schema = getattr(tool, "args_schema", None)
     try:
         if schema is None:
-            return json.dumps({"properties": {}, "required": []}, indent=2)
+            return _dumps({"properties": {}, "required": []}, minify)
         if hasattr(schema, "model_json_schema"):
-            return json.dumps(schema.model_json_schema(), indent=2)
+            return _dumps(schema.model_json_schema(), minify)
         if isinstance(schema, (dict, list)):
-            return json.dumps(schema, indent=2)
-        return json.dumps({"schema": str(schema)}, indent=2)
+            return _dumps(schema, minify)
+        return _dumps({"schema": str(schema)}, minify)
     except Exception:
-        return json.dumps({"schema": str(schema)}, indent=2)
+        return _dumps({"schema": str(schema)}, minify)
 
 
-def tools_to_text(tools: list[StructuredTool]) -> str:
+def tools_to_text(tools: list[StructuredTool], minify: bool = False) -> str:
     formatted_tools = []
     for t in tools:
         formatted_tools.append(
             f"-> name: {t.name}\n"
             f"   -> description: {t.description}\n"
-            f"   -> args_schema:\n{_render_tool_schema(t)}"
+            f"   -> args_schema:\n{_render_tool_schema(t, minify)}"
         )
     return "\n\n".join(formatted_tools)
 
@@ -0,0 +1,118 @@
+import re, time, asyncio
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+
+from settings import settings
+from models import AgentResponse
+from router import URL_PATTERN
+from vector_index import VectorIndex, get_embeddings
+
+
+# Answers about prices, quotas, regions or new releases go stale sooner
+VOLATILE_PATTERN = re.compile(
+    r"\b(pric\w*|precio\w*|cost\w*|quota\w*|cuota\w*|limit\w*|l[ií]mite\w*|region\w*|regi[oó]n\w*|availab\w*|"
+    r"disponib\w*|new|nuev\w*|latest|[uú]ltim\w*|release\w*|preview|launch\w*|lanz\w*|version\w*|versi[oó]n\w*)\b",
+    re.IGNORECASE,
+)
+MENTION_PATTERN = re.compile(r"<[@!#][^>]*>")
+MIN_QUESTION_WORDS = 4      # Greetings and thanks are not worth caching
+ADAPT_TIMEOUT_SECONDS = 60
+
+ADAPT_PROMPT = (
+    "A teammate asked a question that is close to one you already answered. Adapt your previous answer to the new "
+    "question: keep what still applies, adjust what differs, and drop what is unrelated. Do not add facts that are "
+    "not supported by the previous answer; if part of the new question is not covered, say so in the summary. "
+    "Answer in the language of the new question.\n\n"
+    "<previous_question>\n{previous_question}\n</previous_question>\n\n"
+    "<previous_answer>\n{previous_answer}\n</previous_answer>\n\n"
+    "<question>\n{question}\n</question>"
+)
+
+
+def cache_question(channel_message: dict) -> Optional[str]:
+    """Text the cache is keyed by, or None when the answer depends on the thread (replies), on the content of a link
+    (questions that differ only in the URL embed alike) or it is not a question."""
+    if channel_message.get('message_idx', 0) != 0:
+        return None
+    message = channel_message['messages'][0]
+    text = message.get('message', '') if isinstance(message, dict) else str(message)
+    if URL_PATTERN.search(text):
+        return None
+    text = " ".join(MENTION_PATTERN.sub(" ", text).split())
+    return text if len(text.split()) >= MIN_QUESTION_WORDS else None
+
+
+@dataclass
+class CacheHit:
+    score: float
+    entry: dict
+
+    @property
+    def answer(self) -> AgentResponse:
+        return AgentResponse.model_validate(self.entry['answer'])
+
+    @property
+    def reusable(self) -> bool:
+        """Close enough to send as is; otherwise it is adapted to the new question first."""
+        return self.score >= settings.ANSWER_CACHE_REUSE_SCORE
+
+    def with_note(self, answer: AgentResponse) -> AgentResponse:
+        """`answer`, with a first processing step saying where it comes from."""
+        date = datetime.fromtimestamp(self.entry['created_at'], timezone.utc).strftime("%Y-%m-%d")
+        action = "Reutilicé" if self.reusable else "Adapté"
+        note = f"{action} una respuesta del {date} a una pregunta similar (similitud {self.score:.2f})"
+        return answer.model_copy(update={'processing_steps': [note, *answer.processing_steps]})
+
+    def to_item(self) -> dict:
+        """LogTable `routing` attribute of an answer served from the cache."""
+        return {
+            'profile': 'cache',
+            'similarity': f"{self.score:.3f}",
+            'adapted': not self.reusable,
+            'cache_id': self.entry['id'],
+            'cached_question': self.entry['text'],
+            'cached_channel': self.entry.get('channel'),
+        }
+
+
+class AnswerCache:
+    """Semantic cache of AgentResponse results, shared by every channel (see vector_index.py for the storage).
+
+    Best effort: a cache error never fails a request, the agent just runs.
+    """
+
+    def __init__(self, location: Optional[str] = settings.ANSWER_CACHE_LOCATION):
+        self.index = VectorIndex(location, get_embeddings(), settings.ANSWER_CACHE_TTL_DAYS * 86400) if location else None
+
+    def lookup(self, question: str) -> Optional[CacheHit]:
+        if self.index is None:
+            return None
+        try:
+            results = self.index.search(question, k=1, min_score=settings.ANSWER_CACHE_ADAPT_SCORE)
+        except Exception as e:
+            print(f"Answer cache lookup failed: {e.__class__.__name__}: {e}")
+            return None
+        return CacheHit(*results[0]) if results else None
+
+    def store(self, question: str, answer: AgentResponse, channel: str):
+        if self.index is None:
+            return
+        metadata = {'answer': answer.model_dump(), 'channel': channel}
+        if VOLATILE_PATTERN.search(question):
+            metadata['expires_at'] = time.time() + settings.ANSWER_CACHE_VOLATILE_TTL_DAYS * 86400
+        try:
+            self.index.add(question, metadata)
+        except Exception as e:
+            print(f"Could not store the answer in the cache: {e.__class__.__name__}: {e}")
+
+
+async def adapt_answer(llm, question: str, hit: CacheHit, callbacks: list | None = None,
+                       timeout: float | None = ADAPT_TIMEOUT_SECONDS) -> AgentResponse:
+    """Cached answer rewritten for a similar (not identical) question: one fast model call instead of a ReAct run."""
+    prompt = ADAPT_PROMPT.format(
+        previous_question=hit.entry['text'], previous_answer=hit.answer.model_dump_json(indent=2), question=question)
+    return await asyncio.wait_for(
+        llm.with_structured_output(AgentResponse).ainvoke(prompt, config={'callbacks': callbacks}),
+        timeout,
+    )
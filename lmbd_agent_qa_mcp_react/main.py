@@ -12,6 +12,9 @@ from langgraph.prebuilt import create_react_agent
 from langchain_tavily import TavilySearch
 from langgraph.checkpoint.memory import InMemorySaver, MemorySaver
 from langgraph.store.memory import InMemoryStore
+from langgraph.errors import GraphRecursionError
+from langchain_core.exceptions import OutputParserException
+from pydantic import ValidationError
 
 from langchain_mcp_adapters.tools import load_mcp_tools
 from langchain_mcp_adapters.client import MultiServerMCPClient
@@ -24,8 +27,17 @@ from memory import DynamoDBManager
 from prompts import prompt_template
 from utilities import pretty_print_messages, slack_ts_to_datetime
 from callbacks import *
-
-LAMBDA_SERVICE = boto3.client('lambda')
+from idempotency import IdempotencyStore, channel_ts_key, idempotent_handler
+from transport import parse_event, send
+from usage import UsageLedger, UsageTracker
+from deadline import AGENT_STEP_TIMEOUT_SECONDS, Deadline
+from time_budget import fallback_answer, force_final_answer, with_timeout
+from router import PROFILES, Escalation, ModelProfile, RoutingOutcome, route, validate_answer
+from answer_cache import ADAPT_TIMEOUT_SECONDS, AnswerCache, CacheHit, adapt_answer, cache_question
+
+IDEMPOTENCY = IdempotencyStore('qa_agent')
+USAGE = UsageLedger()
+ANSWER_CACHE = AnswerCache()
 
 class DataLoader:
     def __init__(self):
@@ -54,7 +66,7 @@ class MessageProcessor:
             if channel_name in sub_dict.get("channels_list", [])
         ]
 
-    def identify_message_participants(self, channel_name: str, message: str | list[dict], channel_members: list[dict]) -> dict:
+    def identify_message_participants(self, channel_name: str, message: str | list[dict], channel_members: list[dict], callbacks: list | None = None) -> dict:
         if isinstance(channel_members, list):
             channel_members = json.dumps(channel_members, indent=2)
 
@@ -78,16 +90,18 @@ class MessageProcessor:
                     " - \"receivers\": a list of names of the people who should pay attention to the message, formatted as a list of dictionaries, where each sub-dictionary contains the keys \"name\" and \"role\". "
                 ),
             }
-        ], temperature=0.0, max_tokens=750, top_p=0.95, performanceConfig={"latency": "optimized"})
+        ], config={"callbacks": callbacks}, temperature=0.0, max_tokens=750, top_p=0.95, performanceConfig={"latency": "optimized"})
 
         return res.model_dump()
 
     def create_prompt(self, channel_message: dict, participants: dict) -> str:
+        # The evaluator sends a token-budgeted context (rolling summary + last messages); compact JSON otherwise
+        channel_messages = channel_message.get('context') or json.dumps(channel_message['messages'], ensure_ascii=False, separators=(',', ':'))
         return prompt_template.invoke({
             "channel_name": channel_message['channel'],
-            "channel_messages": json.dumps(channel_message['messages'], indent=2),
-            "sent_at": json.dumps(participants['receivers'], indent=2),
-            "sent_by": json.dumps(participants['sender'], indent=2)
+            "channel_messages": channel_messages,
+            "sent_at": json.dumps(participants['receivers'], ensure_ascii=False, separators=(',', ':')),
+            "sent_by": json.dumps(participants['sender'], ensure_ascii=False, separators=(',', ':'))
         })
 
 
@@ -111,6 +125,14 @@ class AgentFactory:
             #     }
             # }
         )
+        # Fast profile of the router (see router.py)
+        self.llm_fast = init_chat_model(
+            settings.LLM_FAST_MODEL,
+            model_provider=settings.MODEL_PROVIDER,
+            region_name=settings.REGION_NAME,
+            temperature=settings.TEMPERATURE,
+        )
+        self.models = {settings.LLM_AGENT_MODEL: self.llm_agent, settings.LLM_FAST_MODEL: self.llm_fast}
         
         # Set up environment and cache directories
         os.makedirs(settings.CACHE_DIR, exist_ok=True)
@@ -172,8 +194,8 @@ class AgentFactory:
 
 
 
-    async def create_and_run_react_agent(self, prompt):
-        """Create and run ReactAgent with ALL tools loaded in the same context"""
+    async def load_tools(self, deadline: Deadline) -> list:
+        """MCP and search tools, loaded once per request (in the event loop the agent runs on) and shared by its runs"""
         # Load ALL tools using a single MultiServerMCPClient to avoid ClosedResourceError
         # This ensures tools and agent share the same execution context
         
@@ -230,23 +252,54 @@ class AgentFactory:
 
         logfire.info("Loaded tools", tools=tools)
         print("Available tools:", [get_name(copy.deepcopy(tool)) for tool in tools])
+        # A hung tool call must not eat the whole budget
+        return [with_timeout(tool, deadline) for tool in tools]
+
+    async def create_and_run_react_agent(self, prompt, tools: list, profile: ModelProfile = PROFILES['strong'],
+                                         callbacks: list | None = None, deadline: Deadline | None = None,
+                                         final_attempt: bool = True):
+        """Create and run ReactAgent on the model, recursion limit and tool subset of a routing profile.
+
+        The loop stops when the deadline budget runs out (or a step or the recursion limit is exceeded); the final
+        structured answer is then forced from what was gathered so far. Unless it is the final attempt, failures
+        other than running out of time raise Escalation instead (the caller retries with the strong profile).
+        """
+        deadline = deadline or Deadline()
+        llm = self.models[profile.model]
+        if profile.tools is not None:
+            tools = [tool for tool in tools if tool.name in profile.tools]
+        print(f"Running the {profile.name} profile ({profile.model}) with tools {[tool.name for tool in tools]}")
 
-        # Create agent immediately after loading tools in the same context
         react_agent = create_react_agent(
-            model=self.llm_agent,
+            model=llm,
             tools=tools,
             debug=False,
             response_format=AgentResponse,
             checkpointer=InMemorySaver(),
             store=InMemoryStore(),
         )
+        react_agent.step_timeout = deadline.timeout(AGENT_STEP_TIMEOUT_SECONDS)
         
         # Run the agent immediately in the same context
-        response = await react_agent.ainvoke(
-            prompt,
-            {**settings.config, "recursion_limit": settings.RECURSION_LIMIT}
-        )
-        
+        # The callbacks reach every ReAct step and the structured response call
+        config = {**settings.config, "recursion_limit": profile.recursion_limit, "callbacks": callbacks}
+        try:
+            response = await asyncio.wait_for(react_agent.ainvoke(prompt, config), deadline.timeout())
+        except (asyncio.TimeoutError, TimeoutError, GraphRecursionError, ValidationError, OutputParserException) as e:
+            if not final_attempt and not isinstance(e, (asyncio.TimeoutError, TimeoutError)):
+                raise Escalation(f"{e.__class__.__name__}: {e}") from e
+            # Every completed step is in the checkpointer: answer with what was gathered instead of nothing
+            print(f"React Agent stopped early ({e.__class__.__name__}, {deadline}), forcing the final answer")
+            gathered = (await react_agent.aget_state(config)).values.get("messages", [])
+            try:
+                structured = await force_final_answer(llm, prompt.to_messages(), gathered, deadline, callbacks)
+            except Exception as e:
+                print(f"Could not force the final answer: {e.__class__.__name__}: {e}")
+                structured = fallback_answer(gathered)
+            response = {"messages": gathered, "structured_response": structured, "forced": True}
+
+        if not final_attempt:
+            response["structured_response"] = validate_answer(response.get("structured_response"))
         return response
 
 
@@ -257,21 +310,21 @@ class QAAWSReactAgent:
         self.data_loader = DataLoader()
         self.dynamo_manager = DynamoDBManager()
 
-    async def process_message(self, channel_message: dict | list[dict]) -> str:
+    async def process_message(self, channel_message: dict | list[dict], deadline: Deadline | None = None) -> str:
         """Process a single channel message"""
         if isinstance(channel_message, list):
             raise ValueError("Expected a single channel message, not a list")
         
         print(f"Processing channel: {channel_message['channel']}")
 
-        # Get channel members and identify participants
         c_n = channel_message['channel']
         idx_msg = channel_message['message_idx']
-        channel_members = self.message_processor.get_channel_members(c_n)
-        participants = self.message_processor.identify_message_participants(c_n, channel_message['messages'][idx_msg], channel_members)
-
-        # Create prompt
-        prompt = self.message_processor.create_prompt(channel_message, participants)
+        usage = UsageTracker()
+        table_keys = {
+            'channel_name': channel_message['channel'],
+            'thread_ts': channel_message['thread_ts'],
+            'message_ts': channel_message['ts'],
+        }
 
         # TODO: pass this logic of saving message history to the Sender function
         thread_history = DynamoDBChatMessageHistory(
@@ -281,19 +334,67 @@ class QAAWSReactAgent:
         )
         thread_history.add_user_message(str(channel_message['messages'][idx_msg]))
 
-        user_response = await self._run_react_agent(prompt, {
-            'channel_name': channel_message['channel'],
-            'thread_ts': channel_message['thread_ts'],
-            'message_ts': channel_message['ts'],
-        })
+        # A question already answered (in any channel) is answered from the cache, in seconds
+        question = cache_question(channel_message)
+        hit = ANSWER_CACHE.lookup(question) if question else None
+        user_response = await self._answer_from_cache(question, hit, table_keys, usage, deadline) if hit else None
+
+        if user_response is None:
+            # Get channel members and identify participants
+            channel_members = self.message_processor.get_channel_members(c_n)
+            participants = self.message_processor.identify_message_participants(c_n, channel_message['messages'][idx_msg], channel_members, [usage])
+
+            # Create prompt
+            prompt = self.message_processor.create_prompt(channel_message, participants)
+
+            # Fast or strong model configuration, from the difficulty of the message
+            message = channel_message['messages'][idx_msg]
+            routing = route(message.get('message', '') if isinstance(message, dict) else str(message),
+                            channel_message.get('evaluator_reasoning') or "")
+            print(f"Routing: {routing}")
+
+            user_response = await self._run_react_agent(prompt, table_keys, usage, deadline, routing, question)
         thread_history.add_ai_message(user_response)
+        USAGE.record(channel_message['channel'], channel_message['thread_ts'], usage, 'qa_agent')
 
         return user_response
     
 
-    async def _run_react_agent(self, prompt, table_keys: dict) -> str:
-        response = await self.agent_factory.create_and_run_react_agent(prompt)
-        
+    async def _answer_from_cache(self, question: str, hit: CacheHit, table_keys: dict, usage: UsageTracker,
+                                 deadline: Deadline | None = None) -> str | None:
+        """Reply from a cached answer (adapted by the fast model when the question is only similar), None to run the agent"""
+        deadline = deadline or Deadline()
+        print(f"Answer cache hit ({hit.score:.3f}): {hit.entry['text']!r}")
+        try:
+            answer = hit.answer if hit.reusable else await adapt_answer(
+                self.agent_factory.llm_fast, question, hit, [usage], deadline.timeout(ADAPT_TIMEOUT_SECONDS))
+        except Exception as e:
+            print(f"Could not adapt the cached answer, running the agent: {e.__class__.__name__}: {e}")
+            return None
+        response = {"messages": [], "structured_response": hit.with_note(answer)}
+        return self._reply(response, table_keys, usage, hit.to_item())
+
+    async def _run_react_agent(self, prompt, table_keys: dict, usage: UsageTracker, deadline: Deadline | None = None,
+                               routing: RoutingOutcome | None = None, question: str | None = None) -> str:
+        deadline = deadline or Deadline()
+        routing = routing or RoutingOutcome('strong', 0, {})
+        tools = await self.agent_factory.load_tools(deadline)
+        profile = PROFILES[routing.profile]
+        try:
+            response = await self.agent_factory.create_and_run_react_agent(
+                prompt, tools, profile, [usage], deadline, final_attempt=profile.name == 'strong')
+        except Escalation as e:
+            print(f"Escalating to the strong profile: {e}")
+            routing.escalate(str(e)[:500])
+            response = await self.agent_factory.create_and_run_react_agent(prompt, tools, PROFILES['strong'], [usage], deadline)
+        print(f"Routing outcome: {routing.to_item()}")
+        # Only complete answers are worth reusing (not the ones forced out of an interrupted run)
+        if question and not response.get("forced"):
+            ANSWER_CACHE.store(question, response["structured_response"], table_keys['channel_name'])
+        return self._reply(response, table_keys, usage, routing.to_item())
+
+    def _reply(self, response: dict, table_keys: dict, usage: UsageTracker, routing: dict) -> str:
+        """Slack text of an answer, logged with its usage and routing"""
         logfire.info(f"Response from React Agent {datetime.now(timezone.utc)}", response=response)
         tool_call_list = pretty_print_messages(response["messages"])
         # print(f"{dir(response)=}")
@@ -312,44 +413,25 @@ class QAAWSReactAgent:
             f"{docs}"
         )
 
-        self.dynamo_manager.log_message(response, table_keys)
+        self.dynamo_manager.log_message(response, table_keys, usage.summary(), routing)
 
         return response['slack_response']
 
 
-def invoke_message_event(request_args: dict):
-    if os.environ.get('ENV', 'dev') == 'dev':
-        sender_function_url = re.sub(r'https?:\/\/(localhost|127\.0\.0\.1)(:\d+)?', r'http://host.docker.internal\2', os.environ['LOCAL_SENDER_FUNCTION_URL'])
-
-        print(f"Calling local agent at {sender_function_url}")
-        response = requests.post(
-            sender_function_url,
-            headers={'Content-Type': 'application/json'},
-            json=request_args,
-        )
-        print("Event sent to local agent:", response.status_code, response.text)
-    else:
-        sender_lambda_arn = os.environ['SENDER_FUNCTION_ARN']
-
-        print(f"Invoking Lambda Function {sender_lambda_arn}")
-        response = LAMBDA_SERVICE.invoke(
-            FunctionName=sender_lambda_arn,
-            InvocationType='Event',  # Asynchronous invocation
-            Payload=json.dumps(request_args),
-        )
-        print("Event sent to Lambda:", response)
+def _request_key(event) -> str | None:
+    request = parse_event(event)
+    return channel_ts_key(request.get('channel'), request.get('ts'))
 
 
+# Async invokes are retried on error: a duplicate would run the whole agent loop again
+@idempotent_handler(IDEMPOTENCY, _request_key)
 def lambda_handler(event, context):
     print(f"Received event: {json.dumps(event, indent=2)}")
 
     try:
         start = time.time()
-        # Parse the request body
-        if 'body' in event:
-            request = json.loads(event['body'])
-        else:
-            request = event
+        # Parse the request body (bodies with a long thread history arrive compressed)
+        request = parse_event(event)
         print(f"Parsed request: {json.dumps(request, indent=2)}")
         
         required_fields = ['channel', 'thread_ts']
@@ -375,6 +457,8 @@ def lambda_handler(event, context):
         channel_message = {
             'channel': request['channel'],
             'messages': request['thread_history'],
+            'context': request.get('thread_context'),
+            'evaluator_reasoning': request.get('evaluator_reasoning'),    # Difficulty signal for the model router
             'message_idx': request.get('message_idx', 0),  # Default to 0 if not provided
             'thread_ts': request['thread_ts'],  # Thread timestamp
             'ts': request['ts'] if 'ts' in request else request['thread_ts']    # Message timestamp
@@ -383,7 +467,8 @@ def lambda_handler(event, context):
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
         try:
-            response_content: str = loop.run_until_complete(agent.process_message(channel_message))
+            # Budget from the Lambda remaining time, so the reply is posted before the function times out
+            response_content: str = loop.run_until_complete(agent.process_message(channel_message, Deadline.from_context(context)))
         finally:
             loop.close()
 
@@ -393,6 +478,7 @@ def lambda_handler(event, context):
             
             'channel': request['channel'],
             'thread_ts': request['thread_ts'],
+            'ts': request.get('ts'),
             'human_message': human_message,
             'ai_message': response_content,
 
@@ -403,7 +489,7 @@ def lambda_handler(event, context):
             }
         }
         
-        invoke_message_event(request_args)
+        send('Sender', request_args)
 
         return {
             'statusCode': 200,
@@ -9,7 +9,7 @@ class DynamoDBManager():
     def __init__(self):
         self.dynamo = boto3.resource("dynamodb", region_name=os.environ.get("AWS_REGION", "us-east-1"))
     
-    def log_message(self, response: dict, table_keys: dict):
+    def log_message(self, response: dict, table_keys: dict, usage: dict | None = None, routing: dict | None = None):
         table = self.dynamo.Table(os.environ["DYNAMO_DB_LOG_TABLE"])
         # TODO: all chain log & tool call list should be in the same table
         new_row = {
@@ -18,6 +18,8 @@ class DynamoDBManager():
             "tool_calls": messages_to_dict(filter_messages(response['messages'], include_types=["tool"])),
             "agent_response": response['structured_response'].model_dump(),
             "slack_response": response.get('slack_response', ''),
+            "usage": usage or {},   # Tokens and cost of this answer (see usage.py for the thread/channel totals)
+            "routing": routing or {},   # Model profile, difficulty signals and escalation (see router.py)
         }
         new_row['thread_ts'] = slack_ts_to_datetime(table_keys['thread_ts'])
         new_row['message_ts'] = slack_ts_to_datetime(table_keys['message_ts'], True)
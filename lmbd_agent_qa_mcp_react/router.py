@@ -0,0 +1,113 @@
+import re, time
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from settings import settings
+from models import AgentResponse
+
+
+@dataclass(frozen=True)
+class ModelProfile:
+    name: str
+    model: str
+    recursion_limit: int
+    tools: Optional[Tuple[str, ...]] = None     # Tool names; None = every loaded tool
+
+
+PROFILES = {
+    # Factual questions: documentation search and web search are enough
+    'fast': ModelProfile('fast', settings.LLM_FAST_MODEL, settings.FAST_RECURSION_LIMIT,
+                         ('search_documentation', 'read_documentation', 'tavily_search')),
+    'strong': ModelProfile('strong', settings.LLM_AGENT_MODEL, settings.RECURSION_LIMIT),
+}
+
+URL_PATTERN = re.compile(r"https?://\S+")
+CODE_PATTERN = re.compile(r"```|Traceback|Exception|Error:|\{\s*\"")
+AWS_SERVICES = re.compile(
+    r"\b(lambda|s3|dynamo\s?db|ec2|ecs|eks|fargate|api\s?gateway|cloud\s?formation|cdk|sam|sqs|sns|eventbridge|"
+    r"step\s?functions|bedrock|sagemaker|rds|aurora|cloudfront|route\s?53|iam|vpc|kinesis|glue|athena|redshift|"
+    r"opensearch|cognito|waf|shield|cloudwatch|x-ray|appsync|amplify|elasticache|secrets\s?manager|kms|"
+    r"app\s?runner|lightsail|batch|emr|msk|transit\s?gateway|organizations|control\s?tower)\b",
+    re.IGNORECASE,
+)
+# Requests that need design work or several sources, in English and Spanish
+HARD_TASK_PATTERN = re.compile(
+    r"\b(compar\w*|architect\w*|arquitectura|design|diseñ\w*|migra\w*|trade-?offs?|cost\w*|implement\w*|"
+    r"deploy\w*|despleg\w*|desplie\w*|best practices|buenas prácticas|step by step|paso a paso|optimi[sz]\w*|"
+    r"troubleshoot\w*|debug\w*|scal\w*|escal\w*)\b",
+    re.IGNORECASE,
+)
+# The evaluator reasoning answers "Does the last message require performing a web search / fetching content from
+# URLs? (yes/no)": only a "yes" right after that question (or its "label:") counts
+NEEDS_RESEARCH_PATTERN = re.compile(
+    r"(web search|fetching content from urls)[^\n?:]*[?:]\s*(?:\(yes/no\)\s*)?[*_:\-\s]*(yes|s[ií])\b",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class RoutingOutcome:
+    profile: str
+    score: int
+    signals: Dict[str, int]
+    escalated_from: Optional[str] = None
+    escalation_reason: Optional[str] = None
+    started_at: float = field(default_factory=time.time)
+
+    def escalate(self, reason: str):
+        self.escalated_from, self.profile, self.escalation_reason = self.profile, 'strong', reason
+
+    def to_item(self) -> dict:
+        """LogTable attribute (ints and strings only)."""
+        return {
+            'profile': self.profile,
+            'score': self.score,
+            'signals': self.signals,
+            'escalated_from': self.escalated_from,
+            'escalation_reason': self.escalation_reason,
+            'duration_ms': int((time.time() - self.started_at) * 1000),
+        }
+
+
+class Escalation(Exception):
+    """The fast profile could not produce a valid AgentResponse: retry with the strong one."""
+
+
+def validate_answer(structured) -> AgentResponse:
+    """The structured response of a fast run, or Escalation if it is missing, invalid or empty."""
+    if structured is None:
+        raise Escalation("no structured response")
+    try:
+        answer = structured if isinstance(structured, AgentResponse) else AgentResponse.model_validate(structured)
+    except Exception as e:
+        raise Escalation(f"invalid structured response: {e}") from e
+    if not answer.summary.strip():
+        raise Escalation("empty summary")
+    return answer
+
+
+def difficulty_signals(message: str, evaluator_reasoning: str = "") -> Dict[str, int]:
+    words = len(message.split())
+    return {
+        'links': min(len(URL_PATTERN.findall(message)), 2) * 2,
+        'aws_services': max(len({m.lower().replace(" ", "") for m in AWS_SERVICES.findall(message)}) - 1, 0),
+        'length': (words > 60) + (words > 150),
+        'code': 2 if CODE_PATTERN.search(message) else 0,
+        'questions': 1 if message.count("?") > 1 else 0,
+        'hard_task': min(len(HARD_TASK_PATTERN.findall(message)), 3),
+        'research': 2 if NEEDS_RESEARCH_PATTERN.search(evaluator_reasoning or "") else 0,
+    }
+
+
+def route(message: str, evaluator_reasoning: str = "", mode: str = settings.ROUTER_MODE,
+          threshold: int = settings.ROUTER_STRONG_SCORE) -> RoutingOutcome:
+    """Fast or strong profile for a message, from cheap text signals (no model call)."""
+    signals = difficulty_signals(message, evaluator_reasoning)
+    score = sum(signals.values())
+    if mode in PROFILES:
+        profile = mode
+    elif signals['links']:      # Only the strong profile has the fetch tool
+        profile = 'strong'
+    else:
+        profile = 'strong' if score >= threshold else 'fast'
+    return RoutingOutcome(profile, score, signals)
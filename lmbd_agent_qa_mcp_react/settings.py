@@ -39,6 +39,18 @@ class Settings:
     
     # Agent Configuration
     RECURSION_LIMIT = 50
+    FAST_RECURSION_LIMIT = 16       # Fast profile (see router.py): a few tool calls, then escalate
+    # Model routing: 'auto' (by message difficulty), or always 'fast' / 'strong'
+    ROUTER_MODE = os.environ.get("QA_ROUTER_MODE", "auto")
+    ROUTER_STRONG_SCORE = int(os.environ.get("QA_ROUTER_STRONG_SCORE", 4))
+
+    # Semantic answer cache (see answer_cache.py): s3://bucket/key.npz or a local path, unset = no cache
+    ANSWER_CACHE_LOCATION = os.environ.get("ANSWER_CACHE_LOCATION")
+    ANSWER_CACHE_TTL_DAYS = float(os.environ.get("ANSWER_CACHE_TTL_DAYS", 30))
+    ANSWER_CACHE_VOLATILE_TTL_DAYS = float(os.environ.get("ANSWER_CACHE_VOLATILE_TTL_DAYS", 3))
+    # Cosine similarity to send a cached answer as is / to adapt it (Titan embeddings; EMBEDDINGS=hashing needs lower ones)
+    ANSWER_CACHE_REUSE_SCORE = float(os.environ.get("ANSWER_CACHE_REUSE_SCORE", 0.92))
+    ANSWER_CACHE_ADAPT_SCORE = float(os.environ.get("ANSWER_CACHE_ADAPT_SCORE", 0.82))
     
     DYNAMODB_SESSIONS_TABLE_NAME = os.environ['DYNAMO_DB_SESSION_TABLE']
 
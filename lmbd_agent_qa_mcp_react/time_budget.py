@@ -0,0 +1,84 @@
+import asyncio
+from typing import List, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.tools import BaseTool, StructuredTool
+
+from deadline import AGENT_TOOL_TIMEOUT_SECONDS, Deadline
+from models import AgentResponse
+
+
+# What the forced final answer gets to see of the tool results gathered so far
+MAX_CHARS_PER_RESULT = 3000
+MAX_GATHERED_CHARS = 24000
+# The forced answer must leave time to post the reply
+FINAL_ANSWER_SEND_MARGIN_SECONDS = 15
+
+FINAL_ANSWER_PROMPT = (
+    "You ran out of time to keep researching. Do not call any more tools. "
+    "Using only the findings below (and what you already know), write your final structured response now. "
+    "Mention in the summary which parts could not be verified.\n\n<findings>\n{findings}\n</findings>"
+)
+
+
+def with_timeout(tool: BaseTool, deadline: Deadline, timeout: float = AGENT_TOOL_TIMEOUT_SECONDS) -> BaseTool:
+    """Same tool, but a slow call returns an error message to the agent (which carries on) instead of hanging the run."""
+    async def run(**kwargs):
+        seconds = deadline.timeout(timeout)
+        try:
+            return await asyncio.wait_for(tool.ainvoke(kwargs), seconds)
+        except asyncio.TimeoutError:
+            return f"Tool '{tool.name}' timed out after {seconds:.1f}s. Continue with the information you already have."
+
+    return StructuredTool.from_function(coroutine=run, name=tool.name, description=tool.description,
+                                        args_schema=tool.args_schema)
+
+
+def _text(content) -> str:
+    if isinstance(content, list):
+        return "\n".join(block.get('text', '') if isinstance(block, dict) else str(block) for block in content)
+    return str(content)
+
+
+def gathered_findings(messages: Sequence[BaseMessage]) -> str:
+    """Reasoning and tool results of an interrupted run, newest last, within MAX_GATHERED_CHARS."""
+    parts: List[str] = []
+    for message in messages:
+        if isinstance(message, ToolMessage):
+            parts.append(f"[{message.name or 'tool'} result]\n{_text(message.content)[:MAX_CHARS_PER_RESULT]}")
+        elif isinstance(message, AIMessage) and _text(message.content).strip():
+            parts.append(f"[your notes]\n{_text(message.content)[:MAX_CHARS_PER_RESULT]}")
+    findings, size = [], 0
+    for part in reversed(parts):     # Keep the most recent findings when over budget
+        if size + len(part) > MAX_GATHERED_CHARS:
+            break
+        findings.insert(0, part)
+        size += len(part)
+    return "\n\n".join(findings) or "(no tool results yet)"
+
+
+async def force_final_answer(llm, prompt_messages: Sequence[BaseMessage], gathered: Sequence[BaseMessage],
+                             deadline: Deadline, callbacks: list | None = None) -> AgentResponse:
+    """Structured answer from the original prompt and what the interrupted ReAct loop gathered."""
+    left = deadline.lambda_remaining()
+    timeout = max(left - FINAL_ANSWER_SEND_MARGIN_SECONDS, 1.0) if left is not None else None
+    messages = [*prompt_messages, HumanMessage(content=FINAL_ANSWER_PROMPT.format(findings=gathered_findings(gathered)))]
+    return await asyncio.wait_for(
+        llm.with_structured_output(AgentResponse).ainvoke(messages, config={'callbacks': callbacks}),
+        timeout,
+    )
+
+
+def fallback_answer(gathered: Sequence[BaseMessage]) -> AgentResponse:
+    """Reply when not even the forced answer made it in time: at least say so, with the tools that were tried."""
+    tools = list(dict.fromkeys(message.name for message in gathered if isinstance(message, ToolMessage) and message.name))
+    return AgentResponse(
+        main_topic="Sin respuesta a tiempo",
+        intent="",
+        analysis="",
+        processing_steps=[f"Consulté {tool}" for tool in tools],
+        tasks=[],
+        documentation=[],
+        summary="No alcancé a completar la investigación dentro del tiempo disponible. "
+                "Vuelve a mencionarme en el hilo para intentarlo de nuevo.",
+    )
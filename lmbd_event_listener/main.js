@@ -10,6 +10,10 @@ const sqs = new AWS.SQS({
     region: process.env.AWS_REGION || 'us-east-1'
 });
 
+const dynamodb = new AWS.DynamoDB.DocumentClient({
+    region: process.env.AWS_REGION || 'us-east-1'
+});
+
 // SQS helper functions
 const sendMessageToSQS = async (event, logger) => {
     const queueUrl = process.env.SQS_QUEUE_URL;
@@ -51,45 +55,52 @@ const sendMessageToSQS = async (event, logger) => {
     }
 };
 
-const deleteMessageFromSQS = async (messageId, logger) => {
-    const queueUrl = process.env.SQS_QUEUE_URL;
-    if (!queueUrl) {
-        logger.warn('SQS_QUEUE_URL not set, cannot delete message');
-        return;
+// Slack ts ("<seconds>.<micro>") as integer microseconds, so ts compare as numbers (same as slack_ts_key in shared/slack_client.py).
+// Current ts stay below Number.MAX_SAFE_INTEGER.
+const slackTsKey = (ts) => {
+    const [seconds, micro = ''] = String(ts || '0').split('.');
+    return Number(seconds) * 1000000 + Number(micro.slice(0, 6).padEnd(6, '0'));
+};
+
+// Debounce registry: one item per channel/thread with the latest ts and a generation counter.
+// Every new message bumps the generation; the SQS processor drops queued messages whose generation is stale (O(1)),
+// instead of scanning the queue to cancel them.
+// Only newer messages bump it: a Slack retry of the same event (or an older one arriving late) must not make the
+// message already queued stale, since SQS drops the retry as a duplicate.
+const bumpDebounceGeneration = async (event, logger) => {
+    const tableName = process.env.DEBOUNCE_TABLE;
+    if (!tableName) {
+        logger.warn('DEBOUNCE_TABLE not set, messages will not be debounced');
+        return null;
     }
 
-    try {
-        // First, receive messages to find the one to delete
-        const receiveParams = {
-            QueueUrl: queueUrl,
-            MessageAttributeNames: ['MessageId'],
-            MaxNumberOfMessages: 10,
-            WaitTimeSeconds: 1
-        };
+    const now = Math.floor(Date.now() / 1000);
+    const params = {
+        TableName: tableName,
+        Key: { PK: `${event.channel}#${event.thread_ts || event.ts}` },
+        UpdateExpression: 'ADD generation :one SET latest_ts = :ts, latest_ts_key = :tsKey, updatedAt = :now, expireAt = :expireAt',
+        ConditionExpression: 'attribute_not_exists(latest_ts_key) OR latest_ts_key < :tsKey',
+        ExpressionAttributeValues: {
+            ':one': 1,
+            ':ts': event.ts,
+            ':tsKey': slackTsKey(event.ts),
+            ':now': now,
+            ':expireAt': now + 7 * 24 * 3600,
+        },
+        ReturnValues: 'UPDATED_NEW',
+    };
 
-        const messages = await sqs.receiveMessage(receiveParams).promise();
-        
-        if (messages.Messages) {
-            for (const message of messages.Messages) {
-                if (message.MessageAttributes && 
-                    message.MessageAttributes.MessageId && 
-                    message.MessageAttributes.MessageId.StringValue === messageId) {
-                    
-                    const deleteParams = {
-                        QueueUrl: queueUrl,
-                        ReceiptHandle: message.ReceiptHandle
-                    };
-                    
-                    await sqs.deleteMessage(deleteParams).promise();
-                    logger.info(`Deleted message from SQS: ${messageId}`);
-                    return;
-                }
-            }
-        }
-        
-        logger.info(`Message ${messageId} not found in SQS queue (omitting deletion)`);
+    try {
+        const result = await dynamodb.update(params).promise();
+        logger.info(`Debounce generation for ${params.Key.PK}: ${result.Attributes.generation}`);
+        return result.Attributes.generation;
     } catch (error) {
-        logger.error('Error deleting message from SQS:', error);
+        if (error.code === 'ConditionalCheckFailedException') {
+            logger.info(`Message ${event.ts} is not newer than the latest of ${params.Key.PK}, generation unchanged`);
+        } else {
+            logger.error('Error updating the debounce registry:', error);
+        }
+        return null;
     }
 };
 
@@ -161,14 +172,14 @@ app.event('message', async ({ event, client, logger }) => {
         wm = await wasBotMentioned([event]);
         logger.info('Was bot mentioned in message:', wm);
         
+        // Any new message in the thread supersedes the ones still queued for it
+        const generation = await bumpDebounceGeneration(event, logger);
+
         if (!wm) {
             logger.info('Bot was not mentioned, scheduling message for evaluation in 3 minutes via SQS');
             
-            // Check if there's already a queued message in this channel and replace it
-            try {
-                await deleteMessageFromSQS(messageId, logger);
-            } catch (error) {
-                logger.warn('Error checking/deleting existing message from SQS:', error);
+            if (generation !== null) {
+                event.debounce_generation = generation;
             }
             
             // Queue the new message for delayed processing
@@ -182,12 +193,6 @@ app.event('message', async ({ event, client, logger }) => {
         } else {
             logger.info('Bot was mentioned, sending immediately to the Evaluator Lambda for processing');
             
-            try {
-                await deleteMessageFromSQS(messageId, logger);
-            } catch (error) {
-                logger.debug('No pending message to cancel:', error);
-            }
-            
             // Send message to Agent Lambda whether local or deployed
             logger.info('Sending message to Agent Lambda:', event);
             try {
@@ -0,0 +1,215 @@
+import os, json, time, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import boto3
+from slack_sdk import WebClient
+
+
+DIRECTORY_TTL_SECONDS = int(os.environ.get('SLACK_DIRECTORY_TTL_SECONDS', 6 * 3600))
+DIRECTORY_MAX_ENTRIES = int(os.environ.get('SLACK_DIRECTORY_MAX_ENTRIES', 5000))
+# Resolve this many unknown users at once with a paginated users.list instead of one users.info each
+DIRECTORY_BULK_THRESHOLD = int(os.environ.get('SLACK_DIRECTORY_BULK_THRESHOLD', 5))
+DIRECTORY_WORKERS = int(os.environ.get('SLACK_DIRECTORY_WORKERS', 8))
+DIRECTORY_LOCAL_PATH = os.environ.get('SLACK_DIRECTORY_LOCAL_PATH', '/tmp/slack_directory.json')
+
+
+class TTLCache:
+    """Bounded LRU whose entries expire after `ttl` seconds. Thread-safe."""
+
+    def __init__(self, max_size: int = DIRECTORY_MAX_ENTRIES, ttl: int = DIRECTORY_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key: str, value, expires_at: Optional[float] = None):
+        with self._lock:
+            self._data[key] = (value, expires_at or time.time() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DynamoDirectoryStore:
+    """Persistent tier shared by every container: one item per user/channel, expired by DynamoDB TTL."""
+
+    def __init__(self, table_name: str, region_name: Optional[str] = None):
+        self.dynamo = boto3.resource("dynamodb", region_name=region_name or os.environ.get("AWS_REGION", "us-east-1"))
+        self.table = self.dynamo.Table(table_name)
+
+    def get_many(self, keys: List[str]) -> Dict[str, dict]:
+        found = {}
+        for i in range(0, len(keys), 100):  # BatchGetItem limit
+            request = {self.table.name: {'Keys': [{'PK': key} for key in keys[i:i + 100]]}}
+            while request:
+                response = self.dynamo.batch_get_item(RequestItems=request)
+                for item in response['Responses'].get(self.table.name, []):
+                    if int(item.get('expireAt', 0)) > time.time():
+                        found[item['PK']] = json.loads(item['value'])
+                request = response.get('UnprocessedKeys') or None
+        return found
+
+    def put_many(self, entries: Dict[str, dict], expires_at: float):
+        with self.table.batch_writer(overwrite_by_pkeys=['PK']) as batch:
+            for key, value in entries.items():
+                batch.put_item(Item={'PK': key, 'value': json.dumps(value), 'expireAt': int(expires_at)})
+
+
+class LocalDirectoryStore:
+    """Local stand-in for the DynamoDB tier (sam local / tests): a JSON file."""
+
+    def __init__(self, path: str = DIRECTORY_LOCAL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as f:
+            return json.load(f)
+
+    def get_many(self, keys: List[str]) -> Dict[str, dict]:
+        with self._lock:
+            data = self._read()
+        now = time.time()
+        return {key: data[key]['value'] for key in keys if key in data and data[key]['expireAt'] > now}
+
+    def put_many(self, entries: Dict[str, dict], expires_at: float):
+        with self._lock:
+            data = self._read()
+            data.update({key: {'value': value, 'expireAt': expires_at} for key, value in entries.items()})
+            with open(self.path, 'w') as f:
+                json.dump(data, f)
+
+
+def default_store():
+    table_name = os.environ.get('SLACK_DIRECTORY_TABLE')
+    if table_name:
+        return DynamoDirectoryStore(table_name)
+    if os.environ.get('ENV', 'dev') == 'dev':
+        return LocalDirectoryStore()
+    return None
+
+
+def _username(user: dict) -> str:
+    return user['profile'].get('display_name') or \
+           user['profile'].get('real_name') or \
+           user.get('name')
+
+
+def _channel(channel: dict) -> dict:
+    return {k: channel.get(k) for k in ('id', 'name', 'name_normalized', 'is_private')}
+
+
+class SlackDirectory:
+    """Container-lifetime user/channel directory: in-memory LRU, then the persistent tier, then the Slack API."""
+
+    def __init__(self, client: WebClient, store=None, ttl: int = DIRECTORY_TTL_SECONDS, max_size: int = DIRECTORY_MAX_ENTRIES):
+        self.client = client
+        self.store = store
+        self.ttl = ttl
+        self.cache = TTLCache(max_size, ttl)
+        self._users_warmed_at = 0.0
+        self._channels_warmed_at = 0.0
+
+    def _remember(self, entries: Dict[str, dict]):
+        expires_at = time.time() + self.ttl
+        for key, value in entries.items():
+            self.cache.put(key, value, expires_at)
+        if self.store is not None and entries:
+            try:
+                self.store.put_many(entries, expires_at)
+            except Exception as e:
+                print(f"Could not persist {len(entries)} directory entries: {e}")
+
+    def _lookup(self, keys: Iterable[str]) -> Dict[str, dict]:
+        """Memory first, then one batched read of the persistent tier for the misses."""
+        found, missing = {}, []
+        for key in dict.fromkeys(keys):
+            value = self.cache.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing and self.store is not None:
+            try:
+                stored = self.store.get_many(missing)
+            except Exception as e:
+                print(f"Could not read the directory store: {e}")
+                stored = {}
+            for key, value in stored.items():
+                self.cache.put(key, value)
+            found.update(stored)
+        return found
+
+    def warm_users(self):
+        """Load every workspace user with a paginated users.list."""
+        entries = {}
+        for page in self.client.users_list(limit=200):
+            for user in page['members']:
+                entries[f"USER#{user['id']}"] = {'id': user['id'], 'username': _username(user)}
+        self._remember(entries)
+        self._users_warmed_at = time.time()
+        print(f"Directory warmed with {len(entries)} users")
+
+    def warm_channels(self):
+        """Load every visible channel with a paginated conversations.list."""
+        entries = {}
+        for page in self.client.conversations_list(limit=200, types="public_channel,private_channel", exclude_archived=True):
+            for channel in page['channels']:
+                entries[f"CHANNEL#{channel['id']}"] = _channel(channel)
+        self._remember(entries)
+        self._channels_warmed_at = time.time()
+        print(f"Directory warmed with {len(entries)} channels")
+
+    def usernames(self, user_ids: Iterable[str]) -> Dict[str, str]:
+        """Display names of many users with at most one bulk Slack call (or a few users.info calls)."""
+        user_ids = list(dict.fromkeys(user_ids))
+        found = self._lookup(f"USER#{user_id}" for user_id in user_ids)
+        missing = [user_id for user_id in user_ids if f"USER#{user_id}" not in found]
+
+        if len(missing) >= DIRECTORY_BULK_THRESHOLD and time.time() - self._users_warmed_at > self.ttl:
+            self.warm_users()
+            found.update(self._lookup(f"USER#{user_id}" for user_id in missing))
+            missing = [user_id for user_id in missing if f"USER#{user_id}" not in found]
+
+        fetched = {}
+        if missing:     # Few misses (or users created after the warm-up), resolved concurrently
+            with ThreadPoolExecutor(max_workers=min(DIRECTORY_WORKERS, len(missing))) as executor:
+                for user_id, user in zip(missing, executor.map(lambda u: self.client.users_info(user=u)['user'], missing)):
+                    fetched[f"USER#{user_id}"] = {'id': user_id, 'username': _username(user)}
+        self._remember(fetched)
+        found.update(fetched)
+        return {user_id: found[f"USER#{user_id}"]['username'] for user_id in user_ids}
+
+    def username(self, user_id: str) -> str:
+        return self.usernames([user_id])[user_id]
+
+    def channel(self, channel_id: str) -> dict:
+        key = f"CHANNEL#{channel_id}"
+        found = self._lookup([key])
+        if key not in found and time.time() - self._channels_warmed_at > self.ttl:
+            self.warm_channels()
+            found = self._lookup([key])
+        if key in found:
+            return found[key]
+        channel = _channel(self.client.conversations_info(channel=channel_id)['channel'])
+        self._remember({key: channel})
+        return channel
@@ -16,8 +16,17 @@ from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
 from slack_sdk.web.slack_response import SlackResponse
 from pydantic import BaseModel, Field
-from typing import Literal
-from functools import lru_cache
+from typing import Literal, Optional
+from concurrent.futures import ThreadPoolExecutor
+
+from prefilter import Prefilter
+from directory import SlackDirectory, default_store
+from slack_client import get_slack_client
+from thread_store import EDIT_SUBTYPES, ThreadHistory, ThreadStore
+from thread_context import ThreadContextService
+from idempotency import IdempotencyStore, channel_ts_key, idempotent_handler
+from transport import parse_event, send
+from usage import UsageLedger, UsageTracker
 
 app = APIGatewayRestResolver()
 tracer = Tracer()
@@ -32,7 +41,16 @@ logger = Logger()
 # metrics.add_metric(name="HelloWorldInvocations", unit=MetricUnit.Count, value=1)
 metrics = Metrics(namespace="Powertools")
 
-LAMBDA_SERVICE = boto3.client('lambda')
+# 'combined': should_answer + sub-agent in one structured call
+# 'speculative': both calls run concurrently when the bot was mentioned in the thread (sequential otherwise)
+# 'sequential': should_answer, then the sub-agent selection if needed
+DECISION_MODE = os.environ.get('EVALUATOR_DECISION_MODE', 'combined')
+# Every decision is logged to LogTable: the LLM ones are the training labels of the pre-filter (see prefilter.py)
+DYNAMO_DB_LOG_TABLE = os.environ.get('DYNAMO_DB_LOG_TABLE')
+PREFILTER = Prefilter()
+IDEMPOTENCY = IdempotencyStore('evaluator')
+# Token usage and cost per thread/channel, in LogTable too
+USAGE = UsageLedger(DYNAMO_DB_LOG_TABLE)
 
 AGENT_NAME = "TARS"     # (The Architect and Research Specialist)
 SYSTEM_PROMPT_TEMPLATE = f"""
@@ -93,6 +111,33 @@ Provide a structured response in the following format:
 <sub_agent_reasoning>Your reasoning for choosing the sub-agent.</sub_agent_reasoning>
 """
 
+COMBINED_DECISION_TEMPLATE = f"""
+Analyze this thread and evaluate whether {AGENT_NAME} should respond to the last message in the thread and, if so, which sub-agent should handle it. {{specification}}
+
+Your decision should be based on whether the message to pay attention to has already been answered by {AGENT_NAME} or any member of the channel, or if the message requires {AGENT_NAME} to respond.
+
+<message_to_pay_attention>
+{{message_to_pay_attention}}
+</message_to_pay_attention>
+
+<thread_history>
+{{thread_history}}
+</thread_history>
+
+Provide a structured response in the following format:
+
+<reasoning>
+- Are the AWS documentation and resources relevant to answering the last message? (yes/no)
+- Does the last message require performing a web search to provide a useful answer? (yes/no)
+- Does the last message require fetching content from URLs/links in the message? (yes/no)
+- Is it necessary for {AGENT_NAME} to answer the message? (yes/no)
+- Conclusion: A description explaining why you decided whether or not to answer the last message, including any relevant context or considerations.
+</reasoning>
+<should_answer>Your decision as a boolean: True/False</should_answer>
+<sub_agent_name>Only if should_answer is True: the sub-agent that should handle the message, must be 'ArchitectureAgent' or 'QAAgent'.</sub_agent_name>
+<sub_agent_reasoning>Only if should_answer is True: your reasoning for choosing the sub-agent.</sub_agent_reasoning>
+"""
+
 class JudgeResponse(BaseModel):
     should_answer: bool = Field(description="Indicates if agent should answer the message.")
     reasoning: str = Field(description="Your reasoning for the decision, including any relevant context or considerations.")
@@ -101,6 +146,12 @@ class SubAgentChoice(BaseModel):
     sub_agent_name: Literal["ArchitectureAgent", "QAAgent"] = Field(description="The name of the sub-agent to make the API Call, must be 'ArchitectureAgent' or 'QAAgent'.")
     sub_agent_reasoning: str = Field(description="Your reasoning for choosing the sub-agent.")
 
+class RoutingDecision(BaseModel):
+    should_answer: bool = Field(description="Indicates if agent should answer the message.")
+    reasoning: str = Field(description="Your reasoning for the decision, including any relevant context or considerations.")
+    sub_agent_name: Optional[Literal["ArchitectureAgent", "QAAgent"]] = Field(default=None, description="The name of the sub-agent to make the API Call if should_answer is True, must be 'ArchitectureAgent' or 'QAAgent'.")
+    sub_agent_reasoning: Optional[str] = Field(default=None, description="Your reasoning for choosing the sub-agent.")
+
 
 class MessageEvaluator():
     def __init__(self):
@@ -120,7 +171,31 @@ class MessageEvaluator():
                 ("system", SYSTEM_PROMPT_TEMPLATE),
                 ("user", AGENT_SELECTION_TEMPLATE)
             ]
-        )   
+        )
+        self.combined_prompt_template = ChatPromptTemplate.from_messages(
+            [
+                ("system", SYSTEM_PROMPT_TEMPLATE),
+                ("user", COMBINED_DECISION_TEMPLATE)
+            ]
+        )
+        self.last_decision: RoutingDecision | None = None
+        self.last_decided_by: str | None = None     # 'mention' | 'heuristic' | 'model' | 'llm'
+        self.last_p_answer: float | None = None
+        self.last_mentioned_in_thread = False
+        self.usage = UsageTracker()     # One evaluator per request
+        # Compact summary + recent messages (see thread_context.py); the raw list is only a fallback.
+        # Built lazily: messages dropped by the pre-filter never pay for the summarizer
+        self._thread_context_factory = None
+        self._thread_context: str | None = None
+        self._thread_context_lock = threading.Lock()     # Speculative mode reads it from two threads
+
+
+    @property
+    def thread_context(self) -> str | None:
+        with self._thread_context_lock:
+            if self._thread_context is None and self._thread_context_factory is not None:
+                self._thread_context = self._thread_context_factory(self.usage)
+            return self._thread_context
 
 
     def was_bot_mentioned(self, thread_history, bot_tag: str, msg_idx: int):
@@ -133,16 +208,18 @@ class MessageEvaluator():
         return flag_all, flag_idx
 
 
-    def should_answer(self, thread_history, mentioned: bool, msg_idx: int) -> tuple[bool, JudgeResponse]:
-        spec = ""
+    @staticmethod
+    def _specification(mentioned: bool) -> str:
         if mentioned:
-            spec = f"As you will see, the bot was mentioned in some message of the thread, so you need to evaluate the thread to decide if {AGENT_NAME} should answer the last message or not."
-        else:
-            spec = f"As you will see, the bot was NOT mentioned in any message of the thread, so you need to evaluate the thread to decide if {AGENT_NAME} should answer the last message or not."
+            return f"As you will see, the bot was mentioned in some message of the thread, so you need to evaluate the thread to decide if {AGENT_NAME} should answer the last message or not."
+        return f"As you will see, the bot was NOT mentioned in any message of the thread, so you need to evaluate the thread to decide if {AGENT_NAME} should answer the last message or not."
+
+
+    def should_answer(self, thread_history, mentioned: bool, msg_idx: int) -> tuple[bool, JudgeResponse]:
         response = self.llm.with_structured_output(JudgeResponse, include_raw=True).invoke(
             self.evaluation_prompt_template.invoke({
-                'thread_history': thread_history, 'specification': spec, 'message_to_pay_attention': thread_history[msg_idx]['message']
-            }), temperature=0.0, top_p=0.95, performanceConfig={"latency": "optimized"}
+                'thread_history': self.thread_context or thread_history, 'specification': self._specification(mentioned), 'message_to_pay_attention': thread_history[msg_idx]['message']
+            }), config={'callbacks': [self.usage]}, temperature=0.0, top_p=0.95, performanceConfig={"latency": "optimized"}
         )
         print(f"{response.keys()=}")
         print(f"{response['parsed']=}")
@@ -150,40 +227,106 @@ class MessageEvaluator():
         return response['parsed'].should_answer, response['parsed']
 
 
-    def evaluate_thread(self, thread_history, bot_tag: str, msg_idx: int) -> tuple[bool, str|None]:
+    def select_agent(self, thread_history, reasoning: str, msg_idx: int) -> SubAgentChoice:
+        router_response = self.llm.with_structured_output(SubAgentChoice, include_raw=True).invoke(
+            self.agent_selection_prompt_template.invoke({
+                'thread_history': self.thread_context or thread_history, 'reasoning': reasoning, 'message_to_pay_attention': thread_history[msg_idx]['message']
+            }), config={'callbacks': [self.usage]}, temperature=0.0, top_p=0.95, performanceConfig={"latency": "optimized"}
+        )
+        print(f"{router_response['parsed']=}")
+        return router_response['parsed']
+
+
+    def decide(self, thread_history, mentioned: bool, msg_idx: int) -> RoutingDecision:
+        """should_answer, reasoning and sub-agent in a single model round trip."""
+        response = self.llm.with_structured_output(RoutingDecision, include_raw=True).invoke(
+            self.combined_prompt_template.invoke({
+                'thread_history': self.thread_context or thread_history, 'specification': self._specification(mentioned), 'message_to_pay_attention': thread_history[msg_idx]['message']
+            }), config={'callbacks': [self.usage]}, temperature=0.0, top_p=0.95, performanceConfig={"latency": "optimized"}
+        )
+        print(f"{response['parsed']=}")
+        decision: RoutingDecision = response['parsed']
+        if decision.should_answer and decision.sub_agent_name is None:
+            # The model skipped the optional field: fall back to the dedicated selection call
+            choice = self.select_agent(thread_history, decision.reasoning, msg_idx)
+            decision.sub_agent_name, decision.sub_agent_reasoning = choice.sub_agent_name, choice.sub_agent_reasoning
+        return decision
+
+
+    def decide_speculatively(self, thread_history, mentioned: bool, msg_idx: int) -> RoutingDecision:
+        """Run should_answer and the sub-agent selection concurrently; the selection is discarded if the answer is no."""
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            judge_future = executor.submit(self.should_answer, thread_history, mentioned, msg_idx)
+            # The selection can't wait for the judge reasoning, so it gets the mention context instead
+            choice_future = executor.submit(self.select_agent, thread_history, self._specification(mentioned), msg_idx)
+            send_to_agent, judge = judge_future.result()
+            choice = choice_future.result()
+        return RoutingDecision(
+            should_answer=send_to_agent,
+            reasoning=judge.reasoning,
+            sub_agent_name=choice.sub_agent_name if send_to_agent else None,
+            sub_agent_reasoning=choice.sub_agent_reasoning if send_to_agent else None,
+        )
+
+
+    def decide_sequentially(self, thread_history, mentioned: bool, msg_idx: int) -> RoutingDecision:
+        send_to_agent, judge = self.should_answer(thread_history, mentioned, msg_idx)
+        decision = RoutingDecision(should_answer=send_to_agent, reasoning=judge.reasoning)
+        if send_to_agent:
+            choice = self.select_agent(thread_history, judge.reasoning, msg_idx)
+            decision.sub_agent_name, decision.sub_agent_reasoning = choice.sub_agent_name, choice.sub_agent_reasoning
+        return decision
+
+
+    def evaluate_thread(self, thread_history, bot_tag: str, msg_idx: int, is_bot: bool = False, thread_context_factory=None,
+                        replying_to_bot: bool = False) -> tuple[bool, str|None]:
+        self._thread_context_factory, self._thread_context = thread_context_factory, None
         flag_all, flag_idx = self.was_bot_mentioned(thread_history, bot_tag, msg_idx)
 
         print(json.dumps(thread_history, indent=2))
+        print(f"Decision mode: {DECISION_MODE}")
 
-        send_to_agent = False
-        parsed_res = None
-        if not flag_idx and not flag_all:
-            print(f"Bot was not mentioned in either the thread or the main message (idx {msg_idx}), I'll evaluate the entire thread to decide if I should answer or not.")
-            send_to_agent, parsed_res = self.should_answer(thread_history, False, msg_idx)
-        elif not flag_idx and flag_all:
-            print(f"Bot was mentioned in the thread, but not in the main message (idx {msg_idx}), I'll evaluate the thread to decide if I should answer or not.")
-            send_to_agent, parsed_res = self.should_answer(thread_history, True, msg_idx)
-        elif flag_idx:
-            send_to_agent = True
-            print("Bot was mentioned in the main message of the thread, I'll answer it inmediately.")
+        self.last_decided_by, self.last_p_answer, self.last_mentioned_in_thread = 'llm', None, flag_all
+        prefiltered = None
+        if not flag_idx:
+            # Obvious "no" cases (small talk, emojis, bots) are decided locally; the rest goes to the LLM
+            prefiltered = PREFILTER.evaluate(thread_history[msg_idx]['message'], flag_all, is_bot, replying_to_bot)
+            self.last_p_answer = prefiltered.p_answer
+            print(f"Prefilter: {prefiltered}")
 
-        if parsed_res:
-            answer_rationale = parsed_res.reasoning
+        if flag_idx:
+            print("Bot was mentioned in the main message of the thread, I'll answer it inmediately.")
+            self.last_decided_by = 'mention'
+            choice = self.select_agent(thread_history, "The bot was mentioned in the main message of the thread.", msg_idx)
+            decision = RoutingDecision(
+                should_answer=True, reasoning="The bot was mentioned in the main message of the thread.",
+                sub_agent_name=choice.sub_agent_name, sub_agent_reasoning=choice.sub_agent_reasoning,
+            )
+        elif prefiltered.skip:
+            self.last_decided_by = prefiltered.stage
+            decision = RoutingDecision(should_answer=False, reasoning=prefiltered.reason)
         else:
-            answer_rationale = "The bot was mentioned in the main message of the thread."
-        
+            if flag_all:
+                print(f"Bot was mentioned in the thread, but not in the main message (idx {msg_idx}), I'll evaluate the thread to decide if I should answer or not.")
+            else:
+                print(f"Bot was not mentioned in either the thread or the main message (idx {msg_idx}), I'll evaluate the entire thread to decide if I should answer or not.")
+
+            if DECISION_MODE == 'combined':
+                decision = self.decide(thread_history, flag_all, msg_idx)
+            elif DECISION_MODE == 'speculative' and flag_all:
+                # A mention in the thread makes a "yes" likely, so the selection call is usually not wasted
+                decision = self.decide_speculatively(thread_history, flag_all, msg_idx)
+            else:
+                decision = self.decide_sequentially(thread_history, flag_all, msg_idx)
+
+        self.last_decision = decision
+        send_to_agent = decision.should_answer
         print(f"Should I send the message to {AGENT_NAME}? {send_to_agent}")
 
         # TODO: verify if some agent is in a intermediate step to call inmediately (using Checkpoint Table in DynamoDB)
         agent_to_call = None
         if send_to_agent:
-            router_response = self.llm.with_structured_output(SubAgentChoice, include_raw=True).invoke(
-                self.agent_selection_prompt_template.invoke({
-                    'thread_history': thread_history, 'reasoning': answer_rationale, 'message_to_pay_attention': thread_history[msg_idx]['message']
-                }), temperature=0.0, top_p=0.95, performanceConfig={"latency": "optimized"}
-            )
-            print(f"{router_response['parsed']=}")
-            agent_to_call = router_response['parsed'].sub_agent_name.strip()
+            agent_to_call = decision.sub_agent_name.strip()
             print(f"Agent to call: {agent_to_call}")
 
         return send_to_agent, agent_to_call
@@ -191,90 +334,77 @@ class MessageEvaluator():
 
 class SlackManager:
     def __init__(self):
-        self.client = WebClient(token=os.environ['SLACK_BOT_TOKEN'])
+        self.client = get_slack_client()
+        # Lives as long as the container (the manager is module-level), backed by the persistent tier
+        self.directory = SlackDirectory(self.client, store=default_store())
+        self.threads = ThreadStore(self.client, self.directory, store=self.directory.store)
 
 
     def get_channel_info(self, channel_id: str):
-        response: SlackResponse = self.client.conversations_info(channel=channel_id)
-        if response['ok']:
-            return response.data['channel']
-        else:
-            raise SlackApiError(f"Failed to fetch channel info: {response['error']}")
+        return self.directory.channel(channel_id)
 
 
-    def get_thread_history(self, channel_id: str, thread_ts: str):
-        response: SlackResponse = self.client.conversations_replies(
-            channel=channel_id,
-            ts=thread_ts
-        )
-        # print(f"{dir(response)=}")
-        # print(f"{vars(response)=}")
-        # print(f"{vars(response).keys()=}")
-
-        if response['ok']:
-            rs = response.data['messages']
-            for sub_dict in rs:
-                if 'user' in sub_dict:
-                    sub_dict['user'] = self.get_username_from_id(sub_dict['user'])
-            return rs
-        else:
-            raise SlackApiError(f"Failed to fetch thread history: {response['error']}")
+    def get_thread_history(self, channel_id: str, thread_ts: str, refresh: bool = False) -> ThreadHistory:
+        # Only the messages newer than the cached ones are fetched (and their authors resolved), except on a refresh
+        return self.threads.get(channel_id, thread_ts, refresh)
 
 
-    @lru_cache(maxsize=20)
     def get_username_from_id(self, user_id: str):
-        slack_response: SlackResponse = self.client.users_info(user=user_id)
-        
-        # print(f"{slack_response['user']['profile']=}")
+        return self.directory.username(user_id)
+
+
+SLACK_MANAGER = SlackManager()
+THREAD_CONTEXT = ThreadContextService(store=SLACK_MANAGER.directory.store)
+
+
+def log_decision(request_body: dict, message: str, msg_eval: MessageEvaluator):
+    """Store the routing decision in LogTable (best effort: logging never blocks the routing)."""
+    if not DYNAMO_DB_LOG_TABLE or msg_eval.last_decision is None:
+        return
+    decision = msg_eval.last_decision
+    item = {
+        'thread_ts': request_body.get('thread_ts', request_body['ts']),
+        'message_ts': f"EVAL#{request_body['ts']}",
+        'record_type': 'evaluator_decision',
+        'channel': request_body['channel'],
+        'message': message,
+        'mentioned_in_thread': msg_eval.last_mentioned_in_thread,
+        'should_answer': decision.should_answer,
+        'reasoning': decision.reasoning,
+        'sub_agent_name': decision.sub_agent_name,
+        'decided_by': msg_eval.last_decided_by,
+        'decision_mode': DECISION_MODE,
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+    if msg_eval.last_p_answer is not None:
+        item['prefilter_p_answer'] = str(round(msg_eval.last_p_answer, 4))     # DynamoDB doesn't take floats
+    try:
+        boto3.resource('dynamodb').Table(DYNAMO_DB_LOG_TABLE).put_item(Item=item)
+    except Exception as e:
+        print(f"Could not log the evaluator decision: {e}")
 
-        return slack_response['user']['profile'].get('display_name') or \
-               slack_response['user']['profile'].get('real_name') or \
-               slack_response['user'].get('name')
 
+def record_usage(request_body: dict, thread_ts: str, msg_eval: MessageEvaluator):
+    """Add the tokens of the evaluator calls to the thread/channel totals (keyed by channel name, like the agents)."""
+    if not msg_eval.usage.calls:
+        return
+    try:
+        channel_name = SLACK_MANAGER.get_channel_info(request_body['channel'])['name_normalized']
+    except Exception:
+        channel_name = request_body['channel']
+    USAGE.record(channel_name, thread_ts, msg_eval.usage, 'evaluator')
 
-def invoke_agent_by_environment(agent_to_call: str, request_args: dict):
-    if os.environ.get('ENV', 'dev') == 'dev':
-        if agent_to_call == 'QAAgent':
-            agent_url_key = 'LOCAL_AGENT_QA_URL'
-        elif agent_to_call == 'ArchitectureAgent':
-            agent_url_key = 'LOCAL_AGENT_ARCHITECTURE_URL'
-        else:
-            raise ValueError(f"Unknown agent to call: {agent_to_call}")
 
-        local_agent_url = re.sub(r'https?:\/\/(localhost|127\.0\.0\.1)(:\d+)?', r'http://host.docker.internal\2', os.environ[agent_url_key])
-        
-        print(f"Calling local agent at {local_agent_url}")
-        response = requests.post(
-            local_agent_url,
-            headers={'Content-Type': 'application/json'},
-            json=request_args,
-        )
-        print("Event sent to local agent:", response.status_code, response.text)
-    else:
-        if agent_to_call == 'QAAgent':
-            agent_url_key = 'AGENT_QA_LAMBDA_ARN'
-        elif agent_to_call == 'ArchitectureAgent':
-            agent_url_key = 'AGENT_ARCHITECTURE_LAMBDA_ARN'
-        else:
-            raise ValueError(f"Unknown agent to call: {agent_to_call}")
-        
-        agent_lambda_arn = os.environ[agent_url_key]
-
-        print(f"Invoking Lambda Function {agent_lambda_arn}")
-        response = LAMBDA_SERVICE.invoke(
-            FunctionName=agent_lambda_arn,
-            InvocationType='Event',
-            Payload=json.dumps({
-                'body': json.dumps(request_args),
-                'headers': {'Content-Type': 'application/json'}
-            })
-        )
-        print("Event sent to agent Lambda:", response)
+def _event_key(event) -> str | None:
+    # Same parsing as every other hop: an apostrophe in the Slack text must not break the claim
+    request_body = parse_event(event)
+    return channel_ts_key(request_body.get('channel'), request_body.get('ts'))
 
 
+@idempotent_handler(IDEMPOTENCY, _event_key)
 @tracer.capture_method
 def lambda_handler(event, context):
-    slack_client = SlackManager()
+    slack_client = SLACK_MANAGER
     msg_eval = MessageEvaluator()
     try:
         # Process the event
@@ -285,20 +415,25 @@ def lambda_handler(event, context):
             print(json.dumps(request_body, indent=2))
             raise ValueError("Invalid event structure.")
         
-        msg_to_pay_attention = request_body['text']
-        
         bot_tag = request_body.get('bot_tag', None)
+        thread_ts = request_body['thread_ts'] if 'thread_ts' in request_body else request_body['ts']
         thread_history = slack_client.get_thread_history(
             channel_id=request_body['channel'],
-            thread_ts=request_body['thread_ts'] if 'thread_ts' in request_body else request_body['ts']
+            thread_ts=thread_ts,
+            # An edit or deletion changes messages that are already cached
+            refresh=request_body.get('subtype') in EDIT_SUBTYPES or 'edited' in request_body,
         )
-        idx_msg_to_pay_attention = next((
-            idx for idx, msg in enumerate(thread_history)
-            if msg['text'] == msg_to_pay_attention
-        ), None)
-        print(json.dumps(thread_history, indent=2))
+        idx_msg_to_pay_attention = thread_history.position(request_body['ts'])
+        print(json.dumps(thread_history.messages, indent=2))
         print(f"{idx_msg_to_pay_attention=}")
 
+        if idx_msg_to_pay_attention is None:
+            print(f"Message {request_body['ts']} not found in the thread")
+            return {
+                'statusCode': 200,
+                'body': 'Message to pay attention not found in the thread'
+            }
+
         if idx_msg_to_pay_attention + 1 < len(thread_history):
             print(f"Message to pay attention is not the last message in the thread")
             return {
@@ -307,20 +442,32 @@ def lambda_handler(event, context):
             }
 
         t_story = [{"from": msg['user'], "message": msg['text']} for msg in thread_history if 'text' in msg and 'user' in msg]
-        send_to_agent, agent_to_call = msg_eval.evaluate_thread(t_story, bot_tag, idx_msg_to_pay_attention)
+        raw_msg = thread_history[idx_msg_to_pay_attention]
+        is_bot = 'bot_id' in raw_msg or raw_msg.get('subtype') == 'bot_message'
+        # An unmentioned "si"/"no" right after the bot may answer its approval or need_info question
+        previous_msg = thread_history[idx_msg_to_pay_attention - 1] if idx_msg_to_pay_attention > 0 else {}
+        replying_to_bot = 'bot_id' in previous_msg or previous_msg.get('subtype') == 'bot_message'
+        # Rolling summary + last messages within a token budget, shared with the agents
+        build_context = lambda usage: THREAD_CONTEXT.build(request_body['channel'], thread_ts, thread_history, idx_msg_to_pay_attention, [usage]).render()
+        send_to_agent, agent_to_call = msg_eval.evaluate_thread(t_story, bot_tag, idx_msg_to_pay_attention, is_bot, build_context, replying_to_bot)
         print(f"{send_to_agent=}")
+        log_decision(request_body, t_story[idx_msg_to_pay_attention]['message'], msg_eval)
+        record_usage(request_body, thread_ts, msg_eval)
 
         if send_to_agent:
             request_args = {
                 'channel': slack_client.get_channel_info(request_body['channel'])['name_normalized'],
                 'thread_history': t_story,
+                'thread_context': msg_eval.thread_context,
+                # Difficulty signal for the model router of the QA agent
+                'evaluator_reasoning': "\n".join(filter(None, (msg_eval.last_decision.reasoning, msg_eval.last_decision.sub_agent_reasoning))) if msg_eval.last_decision else None,
                 'thread_ts': request_body['thread_ts'] if 'thread_ts' in request_body else request_body['ts'],
                 'ts': request_body['ts'],
                 'message_idx': idx_msg_to_pay_attention,
                 'message': t_story[idx_msg_to_pay_attention]['message'],
                 'media_channel': 'slack'
             }
-            invoke_agent_by_environment(agent_to_call, request_args)
+            send(agent_to_call, request_args)
 
             return {
                 'statusCode': 200,
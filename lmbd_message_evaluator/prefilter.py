@@ -0,0 +1,215 @@
+import os, re, json, zlib, argparse, unicodedata
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# Decide "no" locally only when P(should_answer) <= 1 - PREFILTER_THRESHOLD; otherwise the LLM decides
+PREFILTER_THRESHOLD = float(os.environ.get('PREFILTER_THRESHOLD', 0.9))
+PREFILTER_WEIGHTS = os.environ.get('PREFILTER_WEIGHTS', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prefilter_weights.npz'))
+N_FEATURES = 2 ** 16
+
+URL_PATTERN = re.compile(r"https?://\S+|<https?://[^>]+>")
+SLACK_TOKEN_PATTERN = re.compile(r"<[@#!][^>]+>")     # <@U123>, <#C123|general>, <!here>
+EMOJI_CODE_PATTERN = re.compile(r":[a-z0-9_+\-']+:")
+WORD_PATTERN = re.compile(r"\w+")
+
+# Thanks that never need an answer on their own (normalized: lowercase, no accents, no punctuation).
+# No "yes"/"no"/"ok": outside a conversation with the bot they are rare, inside one they may answer its question
+ACKNOWLEDGEMENTS = {
+    "thanks", "thank you", "thanks a lot", "thank you so much", "many thanks", "thx", "ty", "tks",
+    "gracias", "muchas gracias", "mil gracias", "muchisimas gracias", "graciass",
+}
+
+
+class PrefilterDecision(NamedTuple):
+    skip: bool                  # True: do not answer, without calling the LLM
+    stage: Optional[str]        # 'heuristic' | 'model' | None (undecided)
+    p_answer: Optional[float]   # Model probability of should_answer, if the model ran
+    reason: str
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize('NFKD', text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = SLACK_TOKEN_PATTERN.sub(" ", text)
+    text = EMOJI_CODE_PATTERN.sub(" ", text)
+    text = re.sub(r"[^\w\s?]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def heuristic_skip(message: str, is_bot: bool = False, in_conversation: bool = False) -> Optional[str]:
+    """Reason to skip the message, or None if the heuristics can't tell.
+
+    `in_conversation` (the bot was mentioned in the thread, or the previous message is the bot's): even "si" or an
+    emoji may answer the bot's question (e.g. a pending approval), so only the LLM judge decides.
+    """
+    if is_bot:
+        return "Message was sent by a bot."
+    if in_conversation:
+        return None
+    if URL_PATTERN.search(message or ""):
+        return None     # Links may need to be fetched
+    normalized = normalize(message)
+    if not WORD_PATTERN.search(normalized):
+        return "Message is empty or only emojis/punctuation."
+    words = normalized.replace("?", " ").split()
+    if "?" not in normalized and " ".join(words) in ACKNOWLEDGEMENTS:
+        return "Message is a short acknowledgement."
+    if "?" not in normalized and len(words) <= 4 and all(w in ACKNOWLEDGEMENTS for w in words):
+        return "Message is a short acknowledgement."
+    return None
+
+
+def _bucket(token: str) -> int:
+    # crc32 instead of hash(): Python salts str hashes per process
+    return zlib.crc32(token.encode('utf-8')) % N_FEATURES
+
+
+def featurize(message: str, mentioned_in_thread: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """Hashed word uni/bigrams, char trigrams and a few flags, as (indices, values) of a sparse row."""
+    normalized = normalize(message)
+    words = WORD_PATTERN.findall(normalized)
+    tokens = [f"w:{w}" for w in words]
+    tokens += [f"b:{a}_{b}" for a, b in zip(words, words[1:])]
+    padded = f" {normalized} "
+    tokens += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    tokens += [
+        f"len:{min(len(words) // 5, 8)}",
+        f"question:{'?' in (message or '')}",
+        f"url:{bool(URL_PATTERN.search(message or ''))}",
+        f"code:{'`' in (message or '')}",
+        f"mentioned:{mentioned_in_thread}",
+    ]
+    indices, counts = np.unique(np.fromiter((_bucket(t) for t in tokens), dtype=np.int64, count=len(tokens)), return_counts=True)
+    values = counts.astype(np.float32)
+    return indices, values / np.sqrt((values ** 2).sum())    # L2-normalized
+
+
+class LogisticModel:
+    """Logistic regression over hashed features, trained with SGD (no dependency besides NumPy)."""
+
+    def __init__(self, weights: Optional[np.ndarray] = None, bias: float = 0.0):
+        self.weights = weights if weights is not None else np.zeros(N_FEATURES, dtype=np.float32)
+        self.bias = float(bias)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["LogisticModel"]:
+        if not os.path.exists(path):
+            return None
+        data = np.load(path)
+        return cls(data['weights'].astype(np.float32), float(data['bias']))
+
+    def save(self, path: str):
+        np.savez_compressed(path, weights=self.weights, bias=np.float32(self.bias))
+
+    def predict_proba(self, row: Tuple[np.ndarray, np.ndarray]) -> float:
+        indices, values = row
+        z = float(self.weights[indices] @ values) + self.bias
+        return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+    def fit(self, rows: Sequence[Tuple[np.ndarray, np.ndarray]], labels: Sequence[int],
+            epochs: int = 10, lr: float = 0.5, l2: float = 1e-5, seed: int = 0) -> "LogisticModel":
+        rng = np.random.default_rng(seed)
+        labels = np.asarray(labels, dtype=np.float32)
+        # Weight classes so the rare "answer" class isn't drowned by small talk
+        positives = max(labels.sum(), 1.0)
+        negatives = max(len(labels) - labels.sum(), 1.0)
+        class_weight = {1.0: len(labels) / (2 * positives), 0.0: len(labels) / (2 * negatives)}
+        for epoch in range(epochs):
+            step = lr / (1 + epoch)
+            for i in rng.permutation(len(rows)):
+                indices, values = rows[i]
+                error = (self.predict_proba(rows[i]) - labels[i]) * class_weight[float(labels[i])]
+                self.weights[indices] -= step * (error * values + l2 * self.weights[indices])
+                self.bias -= step * error
+        return self
+
+
+class Prefilter:
+    """Heuristics, then the hashed n-gram model. Only ever decides "no"; uncertain messages go to the LLM."""
+
+    def __init__(self, weights_path: str = PREFILTER_WEIGHTS, threshold: float = PREFILTER_THRESHOLD):
+        self.threshold = threshold
+        self.model = LogisticModel.load(weights_path)
+        if self.model is None:
+            print(f"Prefilter weights not found at {weights_path}, using heuristics only")
+
+    def evaluate(self, message: str, mentioned_in_thread: bool = False, is_bot: bool = False,
+                 replying_to_bot: bool = False) -> PrefilterDecision:
+        reason = heuristic_skip(message, is_bot, mentioned_in_thread or replying_to_bot)
+        if reason:
+            return PrefilterDecision(True, 'heuristic', None, reason)
+        if replying_to_bot:     # The classifier is not trained on replies to the agents' questions
+            return PrefilterDecision(False, None, None, "Reply to the bot, deferring to the LLM.")
+        if self.model is None:
+            return PrefilterDecision(False, None, None, "No local model.")
+
+        p_answer = self.model.predict_proba(featurize(message, mentioned_in_thread))
+        if p_answer <= 1 - self.threshold:
+            return PrefilterDecision(True, 'model', p_answer, f"Local classifier is confident no answer is needed (p_answer={p_answer:.3f}).")
+        return PrefilterDecision(False, None, p_answer, "Local classifier is not confident, deferring to the LLM.")
+
+
+def skip_metrics(p_answers: Iterable[float], labels: Iterable[int], threshold: float) -> dict:
+    """Precision/recall of the "skip" decision (positive class = should NOT answer) at the given threshold."""
+    p_answers, labels = np.asarray(list(p_answers)), np.asarray(list(labels))
+    predicted_skip = p_answers <= 1 - threshold
+    actual_skip = labels == 0
+    tp = int((predicted_skip & actual_skip).sum())
+    fp = int((predicted_skip & ~actual_skip).sum())
+    fn = int((~predicted_skip & actual_skip).sum())
+    return {
+        'threshold': threshold,
+        'precision': tp / (tp + fp) if tp + fp else 1.0,
+        'recall': tp / (tp + fn) if tp + fn else 0.0,
+        'coverage': float(predicted_skip.mean()) if len(p_answers) else 0.0,     # Share of traffic kept off Bedrock
+        'missed_answers': fp,
+        'samples': int(len(labels)),
+    }
+
+
+def load_logged_decisions(table_name: str) -> List[dict]:
+    """Evaluator decisions taken by the LLM (the labels), as logged to LogTable by the evaluator."""
+    import boto3
+    from boto3.dynamodb.conditions import Attr
+
+    table = boto3.resource("dynamodb", region_name=os.environ.get("AWS_REGION", "us-east-1")).Table(table_name)
+    scan_kwargs = {'FilterExpression': Attr('record_type').eq('evaluator_decision') & Attr('decided_by').eq('llm')}
+    items = []
+    while True:
+        response = table.scan(**scan_kwargs)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return items
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Train the evaluator pre-filter from the decisions logged in LogTable.")
+    parser.add_argument('--table', default=os.environ.get('DYNAMO_DB_LOG_TABLE'), help="LogTable name")
+    parser.add_argument('--output', default=PREFILTER_WEIGHTS)
+    parser.add_argument('--threshold', type=float, default=PREFILTER_THRESHOLD)
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--test-size', type=float, default=0.2)
+    args = parser.parse_args()
+
+    decisions = load_logged_decisions(args.table)
+    print(f"Loaded {len(decisions)} logged decisions from {args.table}")
+    # Split by thread so messages of the same conversation don't leak between train and test
+    is_test = [zlib.crc32(str(d['thread_ts']).encode()) % 100 < args.test_size * 100 for d in decisions]
+    rows = [featurize(d.get('message', ''), bool(d.get('mentioned_in_thread'))) for d in decisions]
+    labels = [int(bool(d['should_answer'])) for d in decisions]
+    train = [i for i, t in enumerate(is_test) if not t]
+    test = [i for i, t in enumerate(is_test) if t]
+
+    model = LogisticModel().fit([rows[i] for i in train], [labels[i] for i in train], epochs=args.epochs)
+    for name, split in (('train', train), ('test', test)):
+        metrics = skip_metrics([model.predict_proba(rows[i]) for i in split], [labels[i] for i in split], args.threshold)
+        print(f"{name}: {json.dumps(metrics)}")
+
+    heuristic = [i for i in test if heuristic_skip(decisions[i].get('message', ''))]
+    print(f"heuristics: skipped {len(heuristic)}/{len(test)} test messages, {sum(labels[i] for i in heuristic)} of them needed an answer")
+
+    model.save(args.output)
+    print(f"Saved weights to {args.output}")
@@ -0,0 +1,137 @@
+import os, re, time
+from typing import List, NamedTuple, Optional
+
+from langchain.chat_models import init_chat_model
+
+from directory import TTLCache
+from slack_client import slack_ts_key
+from thread_store import ThreadHistory
+
+
+# Approximate token budget of the serialized context (summary + verbatim messages)
+THREAD_CONTEXT_TOKEN_BUDGET = int(os.environ.get('THREAD_CONTEXT_TOKEN_BUDGET', 3000))
+# Trailing messages always sent verbatim
+THREAD_CONTEXT_KEEP_LAST = int(os.environ.get('THREAD_CONTEXT_KEEP_LAST', 8))
+# Older messages are folded into the summary in batches of this size (one summarizer call per batch, not per message)
+THREAD_CONTEXT_SUMMARY_BATCH = int(os.environ.get('THREAD_CONTEXT_SUMMARY_BATCH', 6))
+THREAD_CONTEXT_TTL_SECONDS = int(os.environ.get('THREAD_CONTEXT_TTL_SECONDS', 24 * 3600))
+MAX_CHARS_PER_MESSAGE = 2000
+
+SUMMARY_PROMPT = (
+    "You maintain the running summary of a Slack thread. Merge the previous summary with the new messages "
+    "into a single concise summary (at most 150 words). Keep who asked what, questions that were already answered "
+    "and by whom, open questions, decisions, and any AWS resource, service or link mentioned. "
+    "Do not invent information. Answer only with the summary text."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def _clip(text: str, max_chars: int) -> str:
+    return text if len(text) <= max_chars else text[:max_chars] + "…"
+
+
+def _line(msg: dict, max_chars: int = MAX_CHARS_PER_MESSAGE) -> str:
+    text = re.sub(r"\s*\n\s*", " / ", (msg.get('text') or "").strip())
+    return f"{msg['user']}: {_clip(text, max_chars)}"
+
+
+class ThreadContext(NamedTuple):
+    summary: str
+    messages: List[dict]     # Verbatim window, ending with the message to pay attention to
+    omitted: int             # Older messages neither verbatim nor summarized (budget or pending batch)
+
+    def render(self) -> str:
+        """Compact serialization: one `user: text` line per message, no indentation or metadata."""
+        lines = []
+        if self.summary:
+            lines.append(f"[summary of earlier messages] {self.summary}")
+        if self.omitted:
+            lines.append(f"[{self.omitted} earlier messages omitted]")
+        lines += [_line(msg) for msg in self.messages]
+        return "\n".join(lines)
+
+
+class ThreadContextService:
+    """Rolling summary per thread plus the last K messages verbatim, kept within a token budget."""
+
+    def __init__(self, store=None, budget: int = THREAD_CONTEXT_TOKEN_BUDGET, keep_last: int = THREAD_CONTEXT_KEEP_LAST,
+                 batch: int = THREAD_CONTEXT_SUMMARY_BATCH, ttl: int = THREAD_CONTEXT_TTL_SECONDS):
+        self.store = store
+        self.budget = budget
+        self.keep_last = keep_last
+        self.batch = batch
+        self.ttl = ttl
+        self.cache = TTLCache(ttl=ttl)
+        self.llm = init_chat_model(
+            "us.anthropic.claude-3-5-haiku-20241022-v1:0",
+            model_provider="bedrock_converse",
+            region_name="us-east-1",
+        )
+
+    @staticmethod
+    def _key(channel_id: str, thread_ts: str) -> str:
+        return f"CONTEXT#{channel_id}#{thread_ts}"
+
+    def _load(self, key: str) -> dict:
+        state = self.cache.get(key)
+        if state is None and self.store is not None:
+            try:
+                state = self.store.get_many([key]).get(key)
+            except Exception as e:
+                print(f"Could not read the thread summary {key}: {e}")
+        return state or {'summary': "", 'summarized_until': None}
+
+    def _save(self, key: str, state: dict):
+        self.cache.put(key, state)
+        if self.store is not None:
+            try:
+                self.store.put_many({key: state}, time.time() + self.ttl)
+            except Exception as e:
+                print(f"Could not persist the thread summary {key}: {e}")
+
+    def summarize(self, summary: str, messages: List[dict], callbacks: Optional[list] = None) -> str:
+        new_lines = "\n".join(_line(msg, 1000) for msg in messages)
+        response = self.llm.invoke([
+            ("system", SUMMARY_PROMPT),
+            ("user", f"<previous_summary>\n{summary or '(none)'}\n</previous_summary>\n<new_messages>\n{new_lines}\n</new_messages>"),
+        ], config={'callbacks': callbacks}, temperature=0.0, max_tokens=400)
+        content = response.content
+        if isinstance(content, list):
+            content = "".join(block.get('text', '') for block in content if isinstance(block, dict))
+        return content.strip()
+
+    def build(self, channel_id: str, thread_ts: str, thread: ThreadHistory, msg_idx: int,
+              callbacks: Optional[list] = None) -> ThreadContext:
+        """Context of the thread up to (and including) the message at `msg_idx`."""
+        messages = thread.messages[:msg_idx + 1]
+        window_start = max(len(messages) - self.keep_last, 0)
+        key = self._key(channel_id, thread_ts)
+        state = self._load(key)
+
+        # Older messages not folded into the summary yet
+        until = state['summarized_until']
+        pending = [msg for msg in messages[:window_start] if until is None or slack_ts_key(msg['ts']) > slack_ts_key(until)]
+        if len(pending) >= self.batch:
+            print(f"Folding {len(pending)} messages into the summary of {key}")
+            state = {'summary': self.summarize(state['summary'], pending, callbacks), 'summarized_until': pending[-1]['ts']}
+            self._save(key, state)
+            pending = []
+
+        # Messages waiting for the next batch stay verbatim while they fit
+        context = ThreadContext(state['summary'], pending + messages[window_start:], 0)
+        return self._fit(context)
+
+    def _fit(self, context: ThreadContext) -> ThreadContext:
+        """Drop the oldest verbatim messages, then clip the remaining ones, until the budget is met."""
+        summary, messages, omitted = context
+        while estimate_tokens(ThreadContext(summary, messages, omitted).render()) > self.budget and len(messages) > 1:
+            messages, omitted = messages[1:], omitted + 1
+        if estimate_tokens(ThreadContext(summary, messages, omitted).render()) > self.budget:
+            # A single huge message (the one to pay attention to): keep its beginning, and trim the summary first
+            summary = _clip(summary, self.budget)
+            remaining = max(self.budget * 4 - len(summary) - 200, 200)
+            messages = [{**messages[-1], 'text': _clip(messages[-1].get('text') or "", remaining)}]
+        return ThreadContext(summary, messages, omitted)
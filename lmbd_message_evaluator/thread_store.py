@@ -0,0 +1,129 @@
+import os, json, time
+from typing import Dict, List, Optional
+
+from slack_sdk import WebClient
+
+from directory import SlackDirectory, TTLCache
+from slack_client import fetch_replies, slack_ts_key
+
+
+THREAD_CACHE_TTL_SECONDS = int(os.environ.get('THREAD_CACHE_TTL_SECONDS', 24 * 3600))
+THREAD_CACHE_MAX_THREADS = int(os.environ.get('THREAD_CACHE_MAX_THREADS', 500))
+# Incremental fetches never see edits or deletions of cached messages: refetch the whole thread once it is this old
+THREAD_REFRESH_SECONDS = int(os.environ.get('THREAD_REFRESH_SECONDS', 120))
+# Events about a changed message force the full refetch right away
+EDIT_SUBTYPES = ('message_changed', 'message_deleted')
+# DynamoDB items are limited to 400KB: bigger threads are only kept in memory
+THREAD_CACHE_MAX_PERSIST_BYTES = 350_000
+
+
+class ThreadHistory:
+    """Normalized messages of a thread ({'ts', 'user', 'text'}, plus 'bot_id'/'subtype' for bot messages) with a ts index."""
+
+    def __init__(self, messages: Optional[List[dict]] = None, fetched_at: float = 0.0):
+        self.messages: List[dict] = []
+        self.index: Dict[str, int] = {}
+        self.fetched_at = fetched_at     # Last full fetch (epoch seconds)
+        self.extend(messages or [])
+
+    @property
+    def last_ts(self) -> Optional[str]:
+        return self.messages[-1]['ts'] if self.messages else None
+
+    def extend(self, messages: List[dict]):
+        new = list({msg['ts']: msg for msg in messages if msg['ts'] not in self.index}.values())
+        if not new:
+            return
+        self.messages = sorted(self.messages + new, key=lambda msg: slack_ts_key(msg['ts']))
+        self.index = {msg['ts']: idx for idx, msg in enumerate(self.messages)}
+
+    def position(self, ts: str) -> Optional[int]:
+        return self.index.get(ts)
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __getitem__(self, idx):
+        return self.messages[idx]
+
+    def __iter__(self):
+        return iter(self.messages)
+
+
+class ThreadStore:
+    """Threads cached by channel and thread_ts; each call only fetches the messages newer than the last cached one.
+
+    The whole thread is fetched again every THREAD_REFRESH_SECONDS (or on demand), so edited and deleted messages
+    are not served stale for longer than that.
+    """
+
+    def __init__(self, client: WebClient, directory: SlackDirectory, store=None,
+                 ttl: int = THREAD_CACHE_TTL_SECONDS, max_threads: int = THREAD_CACHE_MAX_THREADS):
+        self.client = client
+        self.directory = directory
+        self.store = store
+        self.ttl = ttl
+        self.cache = TTLCache(max_threads, ttl)
+
+    @staticmethod
+    def _key(channel_id: str, thread_ts: str) -> str:
+        return f"THREAD#{channel_id}#{thread_ts}"
+
+    def _load(self, key: str) -> Optional[ThreadHistory]:
+        thread = self.cache.get(key)
+        if thread is None and self.store is not None:
+            try:
+                stored = self.store.get_many([key]).get(key)
+            except Exception as e:
+                print(f"Could not read the cached thread {key}: {e}")
+                stored = None
+            if stored:
+                thread = ThreadHistory(stored['messages'], stored.get('fetched_at', 0.0))
+        return thread
+
+    def _save(self, key: str, thread: ThreadHistory):
+        self.cache.put(key, thread)
+        if self.store is None:
+            return
+        value = {'messages': thread.messages, 'fetched_at': thread.fetched_at}
+        if len(json.dumps(value)) > THREAD_CACHE_MAX_PERSIST_BYTES:
+            return
+        try:
+            self.store.put_many({key: value}, time.time() + self.ttl)
+        except Exception as e:
+            print(f"Could not persist the cached thread {key}: {e}")
+
+    def _normalize(self, messages: List[dict]) -> List[dict]:
+        usernames = self.directory.usernames(msg['user'] for msg in messages if 'user' in msg)
+        normalized = []
+        for msg in messages:
+            if 'user' in msg:
+                user = usernames[msg['user']]
+            else:   # Bot/integration messages have no user
+                user = msg.get('username') or msg.get('bot_profile', {}).get('name') or msg.get('bot_id', 'unknown')
+            item = {'ts': msg['ts'], 'user': user, 'text': msg.get('text', '')}
+            for key in ('bot_id', 'subtype'):
+                if key in msg:
+                    item[key] = msg[key]
+            normalized.append(item)
+        return normalized
+
+    def get(self, channel_id: str, thread_ts: str, refresh: bool = False) -> ThreadHistory:
+        key = self._key(channel_id, thread_ts)
+        thread = self._load(key)
+        if thread is None or refresh or time.time() - thread.fetched_at > THREAD_REFRESH_SECONDS:
+            started = time.time()
+            thread = ThreadHistory(self._normalize(fetch_replies(self.client, channel_id, thread_ts)), started)
+            print(f"Thread {key}: fetched {len(thread)} messages{' (refresh requested)' if refresh else ''}")
+            self._save(key, thread)
+            return thread
+        # `oldest` is exclusive; conversations.replies always returns the parent too (deduplicated by ts)
+        new_messages = fetch_replies(self.client, channel_id, thread_ts, oldest=thread.last_ts)
+        fresh = list({msg['ts']: msg for msg in new_messages if msg['ts'] not in thread.index}.values())
+        print(f"Thread {key}: {len(thread)} cached messages, {len(fresh)} new")
+        if fresh:
+            thread.extend(self._normalize(fresh))
+            self._save(key, thread)
+        else:
+            self.cache.put(key, thread)
+        return thread
@@ -0,0 +1,160 @@
+import os, time, random, threading
+from typing import Dict, List, Optional
+from urllib.error import URLError
+
+from requests.exceptions import RequestException
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+
+
+# Slack allows about one chat.postMessage per second per channel, with short bursts
+# https://api.slack.com/methods/chat.postMessage#rate_limiting
+SLACK_CHANNEL_RATE = float(os.environ.get('SLACK_CHANNEL_RATE', 1.0))
+SLACK_CHANNEL_BURST = int(os.environ.get('SLACK_CHANNEL_BURST', 3))
+SLACK_DELIVERY_MAX_ATTEMPTS = int(os.environ.get('SLACK_DELIVERY_MAX_ATTEMPTS', 5))
+# "text": long answers are posted as several messages; "blocks": as mrkdwn sections of one (or few) messages
+SLACK_DELIVERY_FORMAT = os.environ.get('SLACK_DELIVERY_FORMAT', 'text')
+
+# Slack truncates `text` after 40k characters but recommends at most 4k; section blocks hold 3k, messages 50 blocks
+# https://api.slack.com/methods/chat.postMessage#truncating
+MAX_TEXT_CHARS = 4000
+MAX_SECTION_CHARS = 3000
+MAX_BLOCKS_PER_MESSAGE = 50
+FALLBACK_TEXT_CHARS = 150
+
+RETRYABLE_ERRORS = {'ratelimited', 'internal_error', 'fatal_error', 'service_unavailable', 'request_timeout'}
+FENCE = "```"
+
+
+class TokenBucket:
+    """`rate` tokens per second up to `capacity`; acquire() blocks until a token is available."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def drain(self):
+        """Slack answered 429: spend the burst so the next posts follow the steady rate."""
+        with self.lock:
+            self.tokens = min(self.tokens, 0.0)
+            self.updated = time.monotonic()
+
+
+def split_text(text: str, limit: int) -> List[str]:
+    """Split on paragraph/line boundaries into chunks of at most `limit` characters, keeping code blocks balanced."""
+    budget = limit - len(FENCE) - 1     # Room to close an open code block at the end of a chunk
+    chunks, current, in_fence = [], "", False
+    for line in text.split("\n"):
+        pieces = [line[i:i + budget] for i in range(0, len(line), budget)] or [""]
+        for piece in pieces:
+            candidate = f"{current}\n{piece}" if current else piece
+            if len(candidate) > budget and current.strip():
+                chunks.append(f"{current}\n{FENCE}" if in_fence else current)
+                current = f"{FENCE}\n{piece}" if in_fence else piece
+            else:
+                current = candidate
+        if line.strip().startswith(FENCE):
+            in_fence = not in_fence
+    if current.strip():
+        chunks.append(current)
+    return chunks or [text]
+
+
+def build_messages(text: str, fmt: str = SLACK_DELIVERY_FORMAT) -> List[Dict]:
+    """chat.postMessage payloads (without channel/thread) for a formatted answer."""
+    if len(text) <= MAX_TEXT_CHARS:
+        return [{'text': text}]
+    if fmt != 'blocks':
+        return [{'text': chunk} for chunk in split_text(text, MAX_TEXT_CHARS)]
+    sections = split_text(text, MAX_SECTION_CHARS)
+    messages = []
+    for start in range(0, len(sections), MAX_BLOCKS_PER_MESSAGE):
+        group = sections[start:start + MAX_BLOCKS_PER_MESSAGE]
+        messages.append({
+            # Notification/accessibility fallback; the sections carry the content
+            'text': group[0][:FALLBACK_TEXT_CHARS],
+            'blocks': [{'type': 'section', 'text': {'type': 'mrkdwn', 'text': section}} for section in group],
+        })
+    return messages
+
+
+class SlackDelivery:
+    """Posts replies within the per-channel rate, splitting long answers and retrying transient failures."""
+
+    def __init__(self, client: WebClient, rate: float = SLACK_CHANNEL_RATE, burst: int = SLACK_CHANNEL_BURST,
+                 max_attempts: int = SLACK_DELIVERY_MAX_ATTEMPTS):
+        self.client = client
+        self.rate = rate
+        self.burst = burst
+        self.max_attempts = max_attempts
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, channel: str) -> TokenBucket:
+        with self.lock:
+            if channel not in self.buckets:
+                self.buckets[channel] = TokenBucket(self.rate, self.burst)
+            return self.buckets[channel]
+
+    @staticmethod
+    def _retry_after(error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying `error`, or None if it is not retryable."""
+        backoff = min(2 ** attempt, 30) * (0.5 + random.random() / 2)
+        if isinstance(error, SlackApiError):
+            if error.response.get('error') not in RETRYABLE_ERRORS and error.response.status_code < 500:
+                return None
+            retry_after = error.response.headers.get('Retry-After') or error.response.headers.get('retry-after')
+            return float(retry_after) if retry_after else backoff
+        if isinstance(error, (URLError, RequestException, TimeoutError, ConnectionError)):
+            return backoff
+        return None
+
+    def post(self, payload: dict, deadline: Optional[float] = None):
+        bucket = self.bucket(payload['channel'])
+        for attempt in range(self.max_attempts):
+            bucket.acquire()
+            try:
+                return self.client.chat_postMessage(**payload)
+            except Exception as e:
+                wait = self._retry_after(e, attempt)
+                if wait is None or attempt == self.max_attempts - 1:
+                    raise
+                if deadline is not None and time.monotonic() + wait > deadline:
+                    raise
+                print(f"Slack post to {payload['channel']} failed ({e}), retrying in {wait:.1f}s")
+                if isinstance(e, SlackApiError) and e.response.status_code == 429:
+                    bucket.drain()
+                time.sleep(wait)
+
+    def deliver(self, args: dict, deadline: Optional[float] = None) -> int:
+        """Post `args` (chat.postMessage arguments), split if needed. Returns the number of messages posted.
+
+        Raises on failure; the exception carries `delivered` so callers know whether a retry would repeat messages.
+        """
+        base = {k: v for k, v in args.items() if k not in ('text', 'blocks')}
+        messages = [{'text': args['text'], 'blocks': args['blocks']}] if args.get('blocks') else build_messages(args['text'])
+        delivered = 0
+        for message in messages:
+            try:
+                self.post({**base, **message}, deadline)
+            except Exception as e:
+                e.delivered = delivered
+                raise
+            delivered += 1
+        print(f"Delivered {delivered} message(s) to {args.get('channel')}")
+        return delivered
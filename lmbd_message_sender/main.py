@@ -1,12 +1,19 @@
-import os, json
-from slack_sdk import WebClient
+import os, json, time
 from slack_sdk.errors import SlackApiError
 
 from slackstyler import SlackStyler
+from delivery import SlackDelivery
+from idempotency import IdempotencyStore, channel_ts_key, idempotent_handler
+from slack_client import get_slack_client
+from transport import parse_event
 
 
-client = WebClient(token=os.environ['SLACK_BOT_TOKEN'])
+# Reused across invocations: pooled keep-alive session and per-channel rate limits.
+# SlackDelivery is the only retry layer: SDK retries would bypass the token bucket and re-post on 5xx
+client = get_slack_client(retry_handlers=[])
+DELIVERY = SlackDelivery(client)
 styler = SlackStyler()
+IDEMPOTENCY = IdempotencyStore('sender')
 
 
 def format_message_slack(message: str) -> str:
@@ -15,15 +22,19 @@ def format_message_slack(message: str) -> str:
     return slack_message
 
 
+def _reply_key(event) -> str | None:
+    # One reply per human message (ts) in the channel
+    event_body = parse_event(event)
+    return channel_ts_key(event_body.get('channel'), event_body.get('ts'))
+
+
+@idempotent_handler(IDEMPOTENCY, _reply_key)
 def lambda_handler(event, context):
     print(type(event))
     print(f"Received event: {json.dumps(event, indent=2)}")
-    event_body = {}
-    if 'body' in event:
-        event_body = json.loads(event.get('body')) if isinstance(event.get('body'), str) else event.get('body')
-    else:
-        event_body = json.loads(event) if isinstance(event, str) else event
-        
+    # Long answers arrive compressed
+    event_body = parse_event(event)
+
     print(f"Parsed body: {json.dumps(event_body, indent=2)}")
     
     if event_body['source'] == 'QAAgent':
@@ -33,12 +44,23 @@ def lambda_handler(event, context):
     else:
         raise ValueError(f"Unknown event source: {event_body['source']}")
     
-    try:        
-        # TODO: check if the model already replied in the thread
+    # Stop retrying with some margin before the Lambda timeout
+    deadline = None
+    if hasattr(context, 'get_remaining_time_in_millis'):
+        deadline = time.monotonic() + context.get_remaining_time_in_millis() / 1000 - 10
+
+    try:
+        # Duplicate deliveries of the same reply are skipped by the idempotency store
         event_body['args']['text'] = format_message_slack(event_body['args']['text'])
-        response = client.chat_postMessage(**event_body['args'])
-        print(f"{response=}")
+        delivered = DELIVERY.deliver(event_body['args'], deadline)
+        return {'statusCode': 200, 'body': json.dumps({'delivered': delivered})}
 
-    except SlackApiError as e:
-        print(f"Error posting message to Slack: {e.response['error']}")
+    except Exception as e:
+        error = e.response['error'] if isinstance(e, SlackApiError) else str(e)
+        print(f"Error posting message to Slack: {error}")
+        if getattr(e, 'delivered', 0):
+            # Part of the answer is already in the thread: a retry would post it again
+            return {'statusCode': 207, 'body': json.dumps({'delivered': e.delivered, 'error': error})}
+        # Nothing was posted: fail so the invocation is retried (the idempotency claim is released)
+        raise
 
@@ -2,94 +2,129 @@ import json
 import boto3
 import os
 import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from debounce import DebounceRegistry
+from idempotency import IdempotencyStore, channel_ts_key
+from slack_client import slack_ts_key
+from transport import send
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-lambda_client = boto3.client('lambda', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
+# Concurrent evaluator invokes per batch
+INVOKE_WORKERS = int(os.environ.get('SQS_PROCESSOR_INVOKE_WORKERS', 8))
+
+IDEMPOTENCY = IdempotencyStore('sqs_processor')
+DEBOUNCE = DebounceRegistry()
+
+
+def thread_key(slack_event: dict) -> tuple:
+    return slack_event.get('channel'), slack_event.get('thread_ts') or slack_event.get('ts')
+
+
+def forward_to_evaluator(slack_event: dict, context) -> dict:
+    """Invoke the Evaluator Lambda asynchronously for one Slack event. Raises on failure."""
+    # A newer message of the thread arrived after this one was queued (or the bot was mentioned): drop it
+    if DEBOUNCE.is_stale(slack_event):
+        logger.info(f"Stale message {slack_event.get('channel')}_{slack_event.get('ts')}, skipping")
+        return {'status': 'stale'}
+
+    # SQS delivers at least once: skip messages already forwarded (or being forwarded)
+    idempotency_key = channel_ts_key(slack_event.get('channel'), slack_event.get('ts'))
+    if not IDEMPOTENCY.claim(idempotency_key, context):
+        return {'status': 'duplicate'}
+
+    try:
+        # Asynchronous invoke of the Evaluator Lambda (EVALUATOR_LAMBDA_ARN), over the shared pooled client
+        response = send('Evaluator', slack_event)
+    except Exception:
+        # The retry must not be taken as a duplicate
+        IDEMPOTENCY.release(idempotency_key)
+        raise
+
+    IDEMPOTENCY.complete(idempotency_key)
+    logger.info(f'Evaluator Lambda invocation result: {response}')
+
+    # Lambda invoke response, or the handler response in process
+    status_code = response.get('StatusCode', response.get('statusCode')) if isinstance(response, dict) else response.status_code
+    if status_code in (200, 202):
+        return {'status': 'success', 'statusCode': status_code}
+    logger.warning(f'Unexpected status code: {status_code}')
+    return {'status': 'warning', 'statusCode': status_code}
+
 
 def lambda_handler(event, context):
     """
     SQS Message Processor Lambda Handler
-    
-    Processes delayed Slack messages from SQS and forwards them to the Evaluator Lambda
+
+    Processes delayed Slack messages from SQS and forwards them to the Evaluator Lambda.
+    Records of the same channel/thread are coalesced: only the newest one is evaluated (the evaluator
+    skips messages that are not the last of their thread anyway). Failed records are returned in
+    `batchItemFailures` so only they are retried.
     """
     logger.info('SQS Message Processor started')
     logger.info(f'Received SQS event: {json.dumps(event, indent=2)}')
-    
-    results = []
-    
-    # Process each record from SQS
-    for record in event.get('Records', []):
+
+    records = event.get('Records', [])
+    results = {}
+    failed = set()
+
+    # Parse every record and keep the newest message of each thread
+    newest = {}
+    members = {}
+    for record in records:
+        message_id = record.get('messageId')
         try:
-            logger.info(f'Processing SQS record: {record}')
-            
-            # Parse the Slack event from the message body
             slack_event = json.loads(record['body'])
-            logger.info(f'Parsed Slack event: {json.dumps(slack_event, indent=2)}')
-            
-            # Get the Evaluator Lambda ARN from environment variables
-            evaluator_lambda_arn = os.environ.get('EVALUATOR_LAMBDA_ARN')
-            
-            if not evaluator_lambda_arn:
-                raise ValueError('EVALUATOR_LAMBDA_ARN environment variable is not set')
-            
-            logger.info(f'Invoking Evaluator Lambda: {evaluator_lambda_arn}')
-            
-            # Prepare the payload for the Evaluator Lambda
-            payload = {
-                'body': json.dumps(slack_event),
-                'headers': {
-                    'Content-Type': 'application/json'
-                }
-            }
-            
-            logger.info(f'Lambda invoke payload: {json.dumps(payload, indent=2)}')
-            
-            # Invoke the Evaluator Lambda asynchronously
-            response = lambda_client.invoke(
-                FunctionName=evaluator_lambda_arn,
-                InvocationType='Event',  # Asynchronous invocation
-                Payload=json.dumps(payload)
-            )
-            
-            logger.info(f'Evaluator Lambda invocation result: {response}')
-            
-            if response['StatusCode'] == 202:
-                logger.info('Evaluator Lambda invocation accepted for async execution')
-                results.append({
-                    'messageId': record.get('messageId'),
-                    'status': 'success',
-                    'statusCode': response['StatusCode']
-                })
-            else:
-                logger.warning(f'Unexpected status code: {response["StatusCode"]}')
-                results.append({
-                    'messageId': record.get('messageId'),
-                    'status': 'warning',
-                    'statusCode': response['StatusCode']
-                })
-                
         except Exception as error:
-            logger.error(f'Error processing SQS record: {str(error)}')
-            logger.error(f'Record that failed: {json.dumps(record, indent=2)}')
-            
-            results.append({
-                'messageId': record.get('messageId'),
-                'status': 'error',
-                'error': str(error)
-            })
-            
-            # Re-raise error to send message to DLQ
-            raise error
-    
+            logger.error(f'Invalid SQS record {message_id}: {error}')
+            results[message_id] = {'status': 'error', 'error': str(error)}
+            failed.add(message_id)
+            continue
+        key = thread_key(slack_event)
+        members.setdefault(key, []).append(message_id)
+        if key not in newest or slack_ts_key(slack_event.get('ts')) >= slack_ts_key(newest[key][1].get('ts')):
+            newest[key] = (message_id, slack_event)
+
+    for key, ids in members.items():
+        for message_id in ids:
+            if message_id != newest[key][0]:
+                results[message_id] = {'status': 'coalesced', 'into': newest[key][0]}
+    logger.info(f'Coalesced {len(records)} records into {len(newest)} evaluator calls')
+
+    # Dispatch the remaining invokes concurrently
+    def dispatch(item):
+        key, (message_id, slack_event) = item
+        try:
+            return key, message_id, forward_to_evaluator(slack_event, context)
+        except Exception as error:
+            logger.error(f'Error processing SQS record {message_id}: {str(error)}')
+            return key, message_id, {'status': 'error', 'error': str(error)}
+
+    if newest:
+        with ThreadPoolExecutor(max_workers=min(INVOKE_WORKERS, len(newest))) as executor:
+            for key, message_id, result in executor.map(dispatch, newest.items()):
+                results[message_id] = result
+                if result['status'] == 'error':
+                    # The coalesced records are retried with it (and coalesced again)
+                    failed.update(members[key])
+
+    # FIFO: once a record of a message group fails, the later records of that group must be retried too
+    failed_groups = set()
+    for record in records:
+        group = record.get('attributes', {}).get('MessageGroupId')
+        if record.get('messageId') in failed:
+            failed_groups.add(group)
+        elif group is not None and group in failed_groups:
+            failed.add(record.get('messageId'))
+            results[record.get('messageId')] = {'status': 'retry', 'reason': 'an earlier record of its message group failed'}
+
     logger.info('SQS Message Processor completed')
     logger.info(f'Processing results: {json.dumps(results, indent=2)}')
-    
+
     return {
-        'statusCode': 200,
-        'body': json.dumps({
-            'message': 'SQS messages processed successfully',
-            'results': results
-        })
-    }
\ No newline at end of file
+        'batchItemFailures': [
+            {'itemIdentifier': record.get('messageId')} for record in records if record.get('messageId') in failed
+        ]
+    }
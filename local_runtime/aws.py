@@ -0,0 +1,206 @@
+import os, time, uuid, socket, logging, threading, itertools
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import boto3
+import yaml
+
+
+TEMPLATE_PATH = Path(__file__).resolve().parent.parent / "template.yaml"
+DEDUPLICATION_WINDOW_SECONDS = 300      # SQS FIFO deduplication interval
+
+
+class _CfnLoader(yaml.SafeLoader):
+    pass
+
+
+def _intrinsic(loader, suffix, node):
+    # !Ref X -> {'Ref': 'X'}, !GetAtt X.Arn -> {'GetAtt': 'X.Arn'}, ...
+    if isinstance(node, yaml.ScalarNode):
+        value = loader.construct_scalar(node)
+    elif isinstance(node, yaml.SequenceNode):
+        value = loader.construct_sequence(node, deep=True)
+    else:
+        value = loader.construct_mapping(node, deep=True)
+    return {suffix: value}
+
+
+_CfnLoader.add_multi_constructor('!', _intrinsic)
+
+
+def load_template(path: Path = TEMPLATE_PATH) -> dict:
+    with open(path) as f:
+        return yaml.load(f, Loader=_CfnLoader)
+
+
+def function_environment(template: dict, logical_id: str) -> Dict[str, str]:
+    """Environment variables of a function, with table references resolved to the local table names (= logical ids)."""
+    resources, parameters = template['Resources'], template.get('Parameters', {})
+    variables = resources[logical_id]['Properties'].get('Environment', {}).get('Variables', {})
+    env = {}
+    for key, value in variables.items():
+        if isinstance(value, dict) and 'Ref' in value:
+            ref = value['Ref']
+            if ref in resources:
+                env[key] = ref
+            elif ref in parameters:
+                env[key] = os.environ.get(key, str(parameters[ref].get('Default', "local")))
+        elif not isinstance(value, dict):
+            env[key] = str(value)
+        # !GetAtt ARNs are not used in process
+    return env
+
+
+def function_timeout(template: dict, logical_id: str) -> int:
+    properties = template['Resources'][logical_id]['Properties']
+    return int(properties.get('Timeout', template.get('Globals', {}).get('Function', {}).get('Timeout', 3)))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class LocalDynamoDB:
+    """In-memory DynamoDB (moto server) with the tables of template.yaml; only DynamoDB calls are redirected to it."""
+
+    def __init__(self, template: dict, port: Optional[int] = None):
+        from moto.server import ThreadedMotoServer
+        self.template = template
+        self.port = port or _free_port()
+        self.server = ThreadedMotoServer(ip_address="127.0.0.1", port=self.port, verbose=False)
+
+    @property
+    def endpoint_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> "LocalDynamoDB":
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)     # One access log line per DynamoDB call otherwise
+        self.server.start()
+        # Service-specific endpoint: Bedrock and the other services keep their real endpoints
+        os.environ['AWS_ENDPOINT_URL_DYNAMODB'] = self.endpoint_url
+        if boto3.Session().get_credentials() is None:
+            os.environ.setdefault('AWS_ACCESS_KEY_ID', 'local')
+            os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'local')
+        self.create_tables()
+        return self
+
+    def create_tables(self):
+        client = boto3.client('dynamodb', region_name=os.environ.get('AWS_REGION', 'us-east-1'), endpoint_url=self.endpoint_url)
+        for logical_id, resource in self.template['Resources'].items():
+            if resource['Type'] != 'AWS::DynamoDB::Table':
+                continue
+            properties = resource['Properties']
+            kwargs = {
+                'TableName': logical_id,
+                'AttributeDefinitions': properties['AttributeDefinitions'],
+                'KeySchema': properties['KeySchema'],
+                'BillingMode': 'PAY_PER_REQUEST',
+            }
+            if properties.get('GlobalSecondaryIndexes'):
+                kwargs['GlobalSecondaryIndexes'] = [
+                    {k: index[k] for k in ('IndexName', 'KeySchema', 'Projection')} for index in properties['GlobalSecondaryIndexes']
+                ]
+            client.create_table(**kwargs)
+
+    def stop(self):
+        self.server.stop()
+
+
+class LambdaContext:
+    """The attributes of the Lambda context object the handlers (and Powertools) read."""
+
+    def __init__(self, function_name: str, timeout: int, memory_limit_in_mb: int = 1024):
+        self.function_name = function_name
+        self.function_version = "$LATEST"
+        self.invoked_function_arn = f"arn:aws:lambda:us-east-1:000000000000:function:{function_name}"
+        self.memory_limit_in_mb = memory_limit_in_mb
+        self.aws_request_id = str(uuid.uuid4())
+        self.log_group_name = f"/aws/lambda/{function_name}"
+        self.log_stream_name = "local"
+        self._deadline = time.monotonic() + timeout
+
+    def get_remaining_time_in_millis(self) -> int:
+        return int(max(self._deadline - time.monotonic(), 0) * 1000)
+
+
+class LocalFifoQueue:
+    """SQS FIFO semantics the pipeline relies on: per-message delay, deduplication ids, message groups delivered in order
+    (no message of a group while another one of it is in flight), visibility timeout and a dead-letter list."""
+
+    def __init__(self, visibility_timeout: float = 180, max_receive_count: int = 3):
+        self.visibility_timeout = visibility_timeout
+        self.max_receive_count = max_receive_count
+        self.messages: List[dict] = []
+        self.dead_letters: List[dict] = []
+        self.deduplicated = 0
+        self._dedup: Dict[str, float] = {}
+        self._ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def send(self, body: str, group_id: str, deduplication_id: str, delay: float = 0.0) -> Optional[str]:
+        now = time.monotonic()
+        with self.lock:
+            if self._dedup.get(deduplication_id, 0) > now:
+                self.deduplicated += 1
+                return None
+            self._dedup[deduplication_id] = now + DEDUPLICATION_WINDOW_SECONDS
+            message_id = f"local-{next(self._ids)}"
+            self.messages.append({
+                'messageId': message_id, 'body': body, 'group_id': group_id, 'sent_at': time.time(),
+                'visible_at': now + delay, 'in_flight': False, 'receive_count': 0,
+            })
+            return message_id
+
+    def receive(self, max_messages: int = 10) -> List[dict]:
+        now = time.monotonic()
+        with self.lock:
+            busy = {m['group_id'] for m in self.messages if m['in_flight'] and m['visible_at'] > now}
+            batch, blocked = [], set(busy)
+            for message in self.messages:
+                if len(batch) == max_messages:
+                    break
+                if message['group_id'] in blocked:
+                    continue
+                if message['visible_at'] > now:
+                    blocked.add(message['group_id'])      # Later messages of the group wait for this one
+                    continue
+                message.update(in_flight=True, visible_at=now + self.visibility_timeout, receive_count=message['receive_count'] + 1)
+                batch.append(message)
+            return [dict(m) for m in batch]
+
+    def delete(self, message_ids):
+        with self.lock:
+            self.messages = [m for m in self.messages if m['messageId'] not in set(message_ids)]
+
+    def release(self, message_ids, delay: float = 0.0):
+        """Failed records become visible again (after `delay`) or go to the dead-letter list."""
+        now = time.monotonic()
+        with self.lock:
+            for message in [m for m in self.messages if m['messageId'] in set(message_ids)]:
+                if message['receive_count'] >= self.max_receive_count:
+                    self.messages.remove(message)
+                    self.dead_letters.append(message)
+                else:
+                    message.update(in_flight=False, visible_at=now + delay)
+
+    def __len__(self):
+        with self.lock:
+            return len(self.messages)
+
+    @staticmethod
+    def to_record(message: dict) -> dict:
+        """SQS event record, as Lambda delivers it."""
+        return {
+            'messageId': message['messageId'],
+            'receiptHandle': message['messageId'],
+            'body': message['body'],
+            'attributes': {
+                'ApproximateReceiveCount': str(message['receive_count']),
+                'SentTimestamp': str(int(message['sent_at'] * 1000)),
+                'MessageGroupId': message['group_id'],
+            },
+            'messageAttributes': {},
+            'eventSource': 'aws:sqs',
+        }
@@ -0,0 +1,193 @@
+import json, time, threading, itertools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+
+BOT_USER_ID = "U0LOCALBOT"
+BOT_ID = "B0LOCALBOT"
+BOT_TAG = f"<@{BOT_USER_ID}>"
+
+
+class FakeSlack:
+    """In-memory Slack workspace behind the Web API methods the functions call (served over HTTP, see FakeSlackServer).
+
+    Unknown users and channels are created on first use. `latency` delays every call; `post_rate` (posts per second
+    per channel) answers faster chat.postMessage calls with 429 + Retry-After, like Slack does.
+    """
+
+    def __init__(self, latency: float = 0.0, post_rate: Optional[float] = None, page_size: int = 200):
+        self.latency = latency
+        self.post_rate = post_rate
+        self.page_size = page_size
+        self.users: Dict[str, dict] = {BOT_USER_ID: self._user(BOT_USER_ID, "TARS", is_bot=True)}
+        self.channels: Dict[str, dict] = {}
+        self.threads: Dict[tuple, List[dict]] = {}      # (channel_id, thread_ts) -> messages, oldest first
+        self.posted: List[dict] = []
+        self.calls: Dict[str, int] = {}
+        self.rate_limited = 0
+        self.on_post: Optional[Callable[[dict], None]] = None
+        self._last_post: Dict[str, float] = {}
+        self._ts = itertools.count()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _user(user_id: str, name: str, is_bot: bool = False) -> dict:
+        return {'id': user_id, 'name': name, 'is_bot': is_bot, 'profile': {'display_name': name, 'real_name': name}}
+
+    def _channel_id(self, channel: str) -> str:
+        """Channels can be addressed by id or by name (chat.postMessage accepts both)."""
+        for channel_id, info in self.channels.items():
+            if channel in (channel_id, info['name']):
+                return channel_id
+        self.channels[channel] = {'id': channel, 'name': channel.lower(), 'name_normalized': channel.lower(), 'is_private': False}
+        return channel
+
+    def add_user(self, user_id: str, name: str):
+        with self.lock:
+            self.users[user_id] = self._user(user_id, name)
+
+    def add_channel(self, channel_id: str, name: str):
+        with self.lock:
+            self.channels[channel_id] = {'id': channel_id, 'name': name, 'name_normalized': name, 'is_private': False}
+
+    def new_ts(self) -> str:
+        return f"{time.time():.0f}.{next(self._ts) % 1_000_000:06d}"
+
+    def add_message(self, event: dict) -> dict:
+        """Store a message of a (listener-shaped) Slack event, as Slack would before notifying the app."""
+        with self.lock:
+            channel_id = self._channel_id(event['channel'])
+            if 'user' in event and event['user'] not in self.users:
+                self.users[event['user']] = self._user(event['user'], f"user-{event['user'].lower()}")
+            message = {k: event[k] for k in ('ts', 'user', 'text', 'bot_id', 'subtype', 'thread_ts') if k in event}
+            thread = self.threads.setdefault((channel_id, event.get('thread_ts') or event['ts']), [])
+            if any(stored['ts'] == message['ts'] for stored in thread):
+                return message      # Redelivery of the same event
+            thread.append(message)
+            thread.sort(key=lambda msg: float(msg['ts']))
+            return message
+
+    # Web API methods: https://api.slack.com/methods
+
+    def auth_test(self, args: dict) -> dict:
+        return {'ok': True, 'user_id': BOT_USER_ID, 'bot_id': BOT_ID, 'user': 'tars'}
+
+    def conversations_replies(self, args: dict) -> dict:
+        channel_id = self._channel_id(args['channel'])
+        messages = self.threads.get((channel_id, args['ts']), [])
+        # The parent is always returned; `oldest` is exclusive
+        parent, replies = messages[:1], messages[1:]
+        if args.get('oldest'):
+            replies = [msg for msg in replies if float(msg['ts']) > float(args['oldest'])]
+        messages = parent + replies
+        start = int(args.get('cursor') or 0)
+        limit = int(args.get('limit') or self.page_size)
+        page = messages[start:start + limit]
+        next_cursor = str(start + limit) if start + limit < len(messages) else ""
+        return {'ok': True, 'messages': page, 'has_more': bool(next_cursor), 'response_metadata': {'next_cursor': next_cursor}}
+
+    def users_info(self, args: dict) -> dict:
+        user = self.users.get(args['user'])
+        return {'ok': True, 'user': user} if user else {'ok': False, 'error': 'user_not_found'}
+
+    def users_list(self, args: dict) -> dict:
+        return {'ok': True, 'members': list(self.users.values()), 'response_metadata': {'next_cursor': ""}}
+
+    def conversations_info(self, args: dict) -> dict:
+        return {'ok': True, 'channel': self.channels[self._channel_id(args['channel'])]}
+
+    def conversations_list(self, args: dict) -> dict:
+        return {'ok': True, 'channels': list(self.channels.values()), 'response_metadata': {'next_cursor': ""}}
+
+    def chat_postMessage(self, args: dict) -> dict:
+        channel_id = self._channel_id(args['channel'])
+        now = time.monotonic()
+        if self.post_rate and now - self._last_post.get(channel_id, 0.0) < 1 / self.post_rate:
+            self.rate_limited += 1
+            raise RateLimited(1)
+        self._last_post[channel_id] = now
+        ts = self.new_ts()
+        message = {'ts': ts, 'user': BOT_USER_ID, 'bot_id': BOT_ID, 'text': args.get('text', '')}
+        if args.get('blocks'):
+            message['blocks'] = args['blocks'] if isinstance(args['blocks'], list) else json.loads(args['blocks'])
+        thread_ts = args.get('thread_ts') or ts
+        self.threads.setdefault((channel_id, thread_ts), []).append({**message, 'thread_ts': thread_ts})
+        posted = {**message, 'channel': channel_id, 'thread_ts': thread_ts, 'posted_at': time.time()}
+        self.posted.append(posted)
+        if self.on_post:
+            self.on_post(posted)
+        return {'ok': True, 'channel': channel_id, 'ts': ts, 'message': message}
+
+    def call(self, method: str, args: dict) -> dict:
+        if self.latency:
+            time.sleep(self.latency)
+        handler = getattr(self, method.replace('.', '_'), None)
+        if handler is None:
+            return {'ok': False, 'error': 'unknown_method'}
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            return handler(args)
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+
+
+class FakeSlackServer:
+    """Serves a FakeSlack at http://127.0.0.1:<port>/api/ (the functions use it through SLACK_API_URL)."""
+
+    def __init__(self, slack: FakeSlack, port: int = 0):
+        self.slack = slack
+        fake = slack
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"    # Keep-alive, like the real API
+
+            def _respond(self, status: int, body: dict, headers: Optional[dict] = None):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _handle(self):
+                url = urlparse(self.path)
+                args = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    raw = self.rfile.read(length).decode()
+                    if self.headers.get("Content-Type", "").startswith("application/json"):
+                        args.update(json.loads(raw))
+                    else:
+                        args.update({k: v[-1] for k, v in parse_qs(raw).items()})
+                try:
+                    self._respond(200, fake.call(url.path.rsplit('/', 1)[-1], args))
+                except RateLimited as e:
+                    self._respond(429, {'ok': False, 'error': 'ratelimited'}, {'Retry-After': str(e.retry_after)})
+
+            do_GET = _handle
+            do_POST = _handle
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}/api/"
+
+    def start(self) -> "FakeSlackServer":
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
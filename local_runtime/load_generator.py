@@ -0,0 +1,288 @@
+"""Synthetic Slack traffic through the single-process runtime, with a latency/throughput report.
+
+Messages are built from the evaluator test events (events/test-lmbd-msg-evaluator_*.json) and the questions of the
+other test events, spread over many channels with one of these arrival processes:
+
+    steady        Poisson arrivals at --rate messages/s
+    bursty        --rate outside bursts, --burst-factor times more during --burst-seconds every --burst-period
+    long-threads  every message is a reply in one of --threads threads (many replies per thread)
+
+Models replay recorded responses (local_runtime/recordings/), falling back to schema-valid synthetic answers; agents
+are echo stand-ins. Record real responses once with --models record (Bedrock credentials needed).
+
+    python local_runtime/load_generator.py --pattern bursty --channels 50 --rate 5 --duration 30
+"""
+import sys, json, time, glob, random, asyncio, argparse
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from fake_slack import BOT_TAG, FakeSlack
+from loader import REPO_ROOT
+from recorded_model import DEFAULT_RECORDINGS, install
+from runtime import LocalRuntime, load_event
+
+
+ACKNOWLEDGEMENTS = ["gracias!", "ok", "👍", "perfecto, gracias", "+1", "dale", "thanks!", "entendido"]
+FOLLOW_UPS = [
+    "¿y eso funciona también con Lambda?",
+    "¿alguien tiene un ejemplo con CDK?",
+    "¿cuánto costaría eso al mes más o menos?",
+    "¿hay algún límite de cuotas que debamos considerar?",
+    "¿y en términos de latencia cómo se compara?",
+    "lo probé ayer y me dio un error de permisos en IAM",
+]
+# Slack retries an event it did not get a timely ack for
+SLACK_RETRY_DELAY_SECONDS = 1.0
+
+
+def load_corpus() -> Tuple[List[dict], List[str]]:
+    """Template events (evaluator test events) and the questions found in the other test events."""
+    templates = [load_event(path) for path in sorted(glob.glob(str(REPO_ROOT / "events" / "test-lmbd-msg-evaluator_*.json")))]
+    questions = [event['text'].replace(BOT_TAG, "").strip() for event in templates]
+    for path in glob.glob(str(REPO_ROOT / "events" / "**" / "*.json"), recursive=True):
+        try:
+            with open(path) as f:
+                body = json.load(f).get('body') or {}
+            body = json.loads(body) if isinstance(body, str) else body
+        except (ValueError, AttributeError):
+            continue
+        if isinstance(body, dict) and isinstance(body.get('message'), str):
+            questions.append(body['message'])
+    return templates, questions
+
+
+def arrivals(pattern: str, rate: float, duration: float, rng: random.Random, burst_factor: float = 10,
+             burst_seconds: float = 2, burst_period: float = 10) -> Iterator[float]:
+    """Arrival offsets (seconds) of a Poisson process, modulated during bursts (thinning)."""
+    peak = rate * burst_factor if pattern == 'bursty' else rate
+    t = 0.0
+    while True:
+        t += rng.expovariate(peak)
+        if t >= duration:
+            return
+        in_burst = pattern == 'bursty' and (t % burst_period) < burst_seconds
+        if pattern != 'bursty' or in_burst or rng.random() < rate / peak:
+            yield t
+
+
+class TrafficGenerator:
+    def __init__(self, pattern: str, channels: int, users: int, threads: int, p_reply: float, p_mention: float,
+                 p_ack: float, p_duplicate: float, seed: int):
+        self.pattern = pattern
+        self.rng = random.Random(seed)
+        self.templates, self.questions = load_corpus()
+        self.channels = [f"C{i:08d}" for i in range(channels)]
+        self.users = [template['user'] for template in self.templates] + [f"U{i:08d}" for i in range(users)]
+        self.threads = threads
+        self.p_reply = 1.0 if pattern == 'long-threads' else p_reply
+        self.p_mention = p_mention
+        self.p_ack = p_ack
+        self.p_duplicate = p_duplicate
+        self.open_threads: Dict[str, List[str]] = {}
+        self._micro = 0
+
+    def _ts(self, base: float, offset: float) -> str:
+        self._micro = (self._micro + 1) % 1000
+        return f"{int(base + offset)}.{int((offset % 1) * 1000):03d}{self._micro:03d}"
+
+    def _text(self, reply: bool) -> str:
+        if reply and self.rng.random() < self.p_ack:
+            return self.rng.choice(ACKNOWLEDGEMENTS)
+        text = self.rng.choice(FOLLOW_UPS if reply and self.rng.random() < 0.5 else self.questions)
+        return f"{BOT_TAG} {text}" if self.rng.random() < self.p_mention else text
+
+    def events(self, offsets: Iterator[float], base: float) -> List[Tuple[float, dict]]:
+        schedule = []
+        long_threads = []
+        for offset in offsets:
+            template = self.rng.choice(self.templates)
+            if self.pattern == 'long-threads':
+                if len(long_threads) < self.threads:
+                    channel, thread_ts = self.rng.choice(self.channels), None
+                else:
+                    channel, thread_ts = self.rng.choice(long_threads)
+            else:
+                channel = self.rng.choice(self.channels)
+                open_threads = self.open_threads.get(channel, [])
+                thread_ts = self.rng.choice(open_threads[-5:]) if open_threads and self.rng.random() < self.p_reply else None
+            ts = self._ts(base, offset)
+            event = {**template, 'user': self.rng.choice(self.users), 'ts': ts, 'event_ts': ts, 'channel': channel,
+                     'text': self._text(thread_ts is not None)}
+            event.pop('bot_tag', None)
+            event.pop('client_msg_id', None)
+            if thread_ts:
+                event['thread_ts'] = thread_ts
+            else:
+                self.open_threads.setdefault(channel, []).append(ts)
+                if self.pattern == 'long-threads':
+                    long_threads.append((channel, ts))
+            schedule.append((offset, event))
+            if self.rng.random() < self.p_duplicate:
+                schedule.append((offset + SLACK_RETRY_DELAY_SECONDS, dict(event)))
+        return sorted(schedule, key=lambda item: item[0])
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))]
+
+
+def _stats(values: List[float]) -> dict:
+    return {'p50': percentile(values, 50), 'p95': percentile(values, 95), 'p99': percentile(values, 99)}
+
+
+def build_report(runtime: LocalRuntime, wall_seconds: float, injected_duplicates: int, recordings) -> dict:
+    recorder = runtime.recorder
+    ingested = recorder.ingested
+    stages = {}
+    for stage in dict.fromkeys(span.stage for span in recorder.spans):
+        spans = [span for span in recorder.spans if span.stage == stage]
+        stages[stage] = {
+            'calls': len(spans),
+            'error_rate': sum(span.status in ('error', 'retry') for span in spans) / len(spans),
+            'duplicates': sum(span.status == 'duplicate' for span in spans),
+            'wait': _stats([span.wait for span in spans]),
+            'duration': _stats([span.duration for span in spans]),
+        }
+
+    # Reply latency: from the human message to the end of the Sender invocation that answered it
+    answered = {}
+    for span in recorder.spans:
+        if span.stage == 'Sender' and span.status == 'ok' and span.key in ingested:
+            answered[span.key] = min(answered.get(span.key, span.ended_at), span.ended_at)
+    mentioned = [ts for ts, info in ingested.items() if info['mentioned']]
+    unmentioned = [ts for ts, info in ingested.items() if not info['mentioned']]
+    evaluated = {span.key for span in recorder.spans if span.stage == 'Evaluator' and span.status != 'duplicate'}
+    replies_per_message = {}
+    for span in recorder.spans:
+        if span.stage == 'Sender' and span.status == 'ok':
+            replies_per_message[span.key] = replies_per_message.get(span.key, 0) + 1
+
+    return {
+        'wall_seconds': wall_seconds,
+        'throughput': {
+            'messages_per_second': len(ingested) / wall_seconds,
+            'evaluations_per_second': stages.get('Evaluator', {}).get('calls', 0) / wall_seconds,
+            'replies_per_second': len(recorder.replies) / wall_seconds,
+        },
+        'messages': {'ingested': len(ingested), 'mentioned': len(mentioned), 'unmentioned': len(unmentioned),
+                     'answered': len(answered), 'dead_letters': len(runtime.queue.dead_letters)},
+        'reply_latency': {
+            'mentioned': _stats([answered[ts] - ingested[ts]['at'] for ts in mentioned if ts in answered]),
+            'unmentioned': _stats([answered[ts] - ingested[ts]['at'] for ts in unmentioned if ts in answered]),
+        },
+        'stages': stages,
+        'debounce': {
+            # Unmentioned messages that never reached the evaluator: superseded by a newer message of their thread
+            # (stale generation) or coalesced with it in the same batch
+            'suppressed': sum(ts not in evaluated for ts in unmentioned),
+            'suppressed_rate': sum(ts not in evaluated for ts in unmentioned) / len(unmentioned) if unmentioned else 0.0,
+        },
+        'dedup': {
+            'injected_duplicates': injected_duplicates,
+            'dropped_by_queue': runtime.queue.deduplicated,
+            'dropped_by_idempotency': {stage: info['duplicates'] for stage, info in stages.items() if info['duplicates']},
+            'duplicate_replies': sum(count - 1 for count in replies_per_message.values() if count > 1),
+        },
+        'slack': {'calls': dict(runtime.slack.calls), 'rate_limited': runtime.slack.rate_limited},
+        'models': {'recorded': recordings.hits, 'synthetic': recordings.misses} if recordings else None,
+    }
+
+
+def format_report(report: dict) -> str:
+    ms = lambda stats: "/".join(f"{stats[q] * 1000:.0f}" for q in ('p50', 'p95', 'p99'))
+    lines = [
+        f"{report['messages']['ingested']} messages in {report['wall_seconds']:.1f}s: "
+        f"{report['throughput']['messages_per_second']:.1f} msg/s in, {report['throughput']['evaluations_per_second']:.1f} "
+        f"evaluations/s, {report['throughput']['replies_per_second']:.2f} replies/s",
+        f"reply latency p50/p95/p99 ms: mentioned {ms(report['reply_latency']['mentioned'])}, "
+        f"unmentioned {ms(report['reply_latency']['unmentioned'])}",
+        "",
+        f"{'stage':<18}{'calls':>7}{'err %':>8}{'dup':>6}{'wait p50/p95/p99 ms':>24}{'run p50/p95/p99 ms':>24}",
+    ]
+    for stage, info in report['stages'].items():
+        lines.append(f"{stage:<18}{info['calls']:>7}{info['error_rate'] * 100:>8.1f}{info['duplicates']:>6}"
+                     f"{ms(info['wait']):>24}{ms(info['duration']):>24}")
+    debounce, dedup = report['debounce'], report['dedup']
+    lines += [
+        "",
+        f"debounce: {debounce['suppressed']} of {report['messages']['unmentioned']} unmentioned messages never reached "
+        f"the evaluator ({debounce['suppressed_rate'] * 100:.0f}%)",
+        f"dedup: {dedup['injected_duplicates']} injected duplicates, {dedup['dropped_by_queue']} dropped by the queue, "
+        f"idempotency {dedup['dropped_by_idempotency']}, {dedup['duplicate_replies']} duplicate replies",
+        f"slack: {report['slack']['rate_limited']} rate-limited posts, dead letters: {report['messages']['dead_letters']}",
+    ]
+    if report['models']:
+        lines.append(f"models: {report['models']['recorded']} recorded responses, {report['models']['synthetic']} synthetic")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pattern', choices=('steady', 'bursty', 'long-threads'), default='steady')
+    parser.add_argument('--rate', type=float, default=2.0, help="Messages per second (outside bursts)")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds of traffic")
+    parser.add_argument('--channels', type=int, default=50)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=5, help="Threads of the long-threads pattern")
+    parser.add_argument('--burst-factor', type=float, default=10.0)
+    parser.add_argument('--burst-seconds', type=float, default=2.0)
+    parser.add_argument('--burst-period', type=float, default=10.0)
+    parser.add_argument('--p-reply', type=float, default=0.6, help="Probability that a message is a thread reply")
+    parser.add_argument('--p-mention', type=float, default=0.2, help="Probability that a message mentions the bot")
+    parser.add_argument('--p-ack', type=float, default=0.3, help="Probability that a reply is an acknowledgement")
+    parser.add_argument('--p-duplicate', type=float, default=0.05, help="Probability that Slack redelivers an event")
+    parser.add_argument('--debounce', type=float, default=2.0, help="Seconds unmentioned messages wait in the queue")
+    parser.add_argument('--models', choices=('replay', 'record', 'real'), default='replay')
+    parser.add_argument('--recordings', default=str(DEFAULT_RECORDINGS))
+    parser.add_argument('--model-latency-scale', type=float, default=1.0, help="Multiplier of the replayed latencies")
+    parser.add_argument('--answer-rate', type=float, default=0.3, help="P(should_answer) of the synthetic decisions")
+    parser.add_argument('--agents', choices=('echo', 'real'), default='echo')
+    parser.add_argument('--agent-latency', type=float, default=2.0, help="Seconds each agent stand-in takes")
+    parser.add_argument('--slack-latency', type=float, default=0.05, help="Seconds each Slack API call takes")
+    parser.add_argument('--slack-post-rate', type=float, default=None, help="Posts/s per channel before Slack answers 429")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', help="Also write the report to this file")
+    args = parser.parse_args()
+
+    recordings = None
+    if args.models != 'real':
+        recordings = install(args.models, Path(args.recordings), args.answer_rate, args.model_latency_scale)
+
+    generator = TrafficGenerator(args.pattern, args.channels, args.users, args.threads, args.p_reply, args.p_mention,
+                                 args.p_ack, args.p_duplicate, args.seed)
+    rng = random.Random(args.seed)
+    offsets = arrivals(args.pattern, args.rate, args.duration, rng, args.burst_factor, args.burst_seconds, args.burst_period)
+    schedule = generator.events(offsets, base=time.time())
+    injected_duplicates = len(schedule) - len({event['ts'] for _, event in schedule})
+    print(f"{len(schedule)} events ({args.pattern}, {injected_duplicates} duplicates) over {args.duration:.0f}s")
+
+    async def run():
+        slack = FakeSlack(latency=args.slack_latency, post_rate=args.slack_post_rate)
+        runtime = LocalRuntime(args.agents, args.debounce, args.agent_latency, slack)
+        await runtime.start()
+        try:
+            start = time.monotonic()
+            for offset, event in schedule:
+                delay = start + offset - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await runtime.ingest(event)
+            await runtime.drain()
+            report = build_report(runtime, time.monotonic() - start, injected_duplicates, recordings)
+        finally:
+            runtime.stop()
+        print(format_report(report))
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+import os, sys, importlib.util
+from pathlib import Path
+from types import ModuleType
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SHARED_DIR = REPO_ROOT / "shared"
+
+
+def load_function(name: str, directory: Path) -> ModuleType:
+    """Import `<directory>/main.py` as `<name>_main`, the way Lambda would with the function directory as task root.
+
+    The functions share module names (main, models, ...): once imported, the function's own modules are moved out of
+    the top-level namespace (to `<name>.<module>`), so the next function imports its own versions. The shared layer
+    modules stay shared, as in a single container.
+    """
+    directory = Path(directory).resolve()
+    if str(SHARED_DIR) not in sys.path:
+        sys.path.append(str(SHARED_DIR))
+    module_name = f"{name}_main"
+    before = set(sys.modules)
+    sys.path.insert(0, str(directory))
+    try:
+        spec = importlib.util.spec_from_file_location(module_name, directory / "main.py")
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(str(directory))
+        for imported in set(sys.modules) - before:
+            path = getattr(sys.modules[imported], '__file__', None) or ""
+            if imported != module_name and path.startswith(str(directory) + os.sep):
+                sys.modules[f"{name}.{imported}"] = sys.modules.pop(imported)
+    return module
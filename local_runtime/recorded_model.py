@@ -0,0 +1,148 @@
+import json, time, random, hashlib, threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+
+DEFAULT_RECORDINGS = Path(__file__).resolve().parent / "recordings" / "model_responses.jsonl"
+# Latency of a synthetic response when nothing was recorded for the model
+FALLBACK_LATENCY_SECONDS = 0.8
+
+
+class ModelRecordings:
+    """Model responses keyed by a hash of the model id, the prompt and the bound tools (JSONL file, one per line)."""
+
+    def __init__(self, path: Path = DEFAULT_RECORDINGS):
+        self.path = Path(path)
+        self.entries: Dict[str, List[dict]] = {}
+        self.latencies: Dict[str, List[float]] = {}
+        self.hits = self.misses = 0
+        self.lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path) as f:
+                for line in f:
+                    if line.strip():
+                        self._index(json.loads(line))
+
+    def _index(self, entry: dict):
+        self.entries.setdefault(entry['key'], []).append(entry)
+        self.latencies.setdefault(entry['model'], []).append(entry['latency'])
+
+    @staticmethod
+    def key(model: str, messages: List[BaseMessage], tools: list) -> str:
+        prompt = [(message.type, message.content if isinstance(message.content, str) else json.dumps(message.content))
+                  for message in messages]
+        raw = json.dumps([model, prompt, [tool['function']['name'] for tool in tools]], ensure_ascii=False)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self.lock:
+            entries = self.entries.get(key)
+            if entries:
+                self.hits += 1
+                entries.append(entries.pop(0))      # Cycle through the recorded responses of the same prompt
+                return entries[-1]
+            self.misses += 1
+            return None
+
+    def add(self, key: str, model: str, message: AIMessage, latency: float):
+        entry = {'key': key, 'model': model, 'message': message_to_dict(message), 'latency': round(latency, 4)}
+        with self.lock:
+            self._index(entry)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def typical_latency(self, model: str, rng: random.Random) -> float:
+        latencies = self.latencies.get(model)
+        return rng.choice(latencies) if latencies else FALLBACK_LATENCY_SECONDS
+
+
+def _synthesize(schema: dict, rng: random.Random, answer_rate: float) -> Any:
+    """A value matching a JSON schema (tool arguments of a structured output call)."""
+    if 'anyOf' in schema:
+        options = [option for option in schema['anyOf'] if option.get('type') != 'null']
+        return _synthesize(options[0], rng, answer_rate) if options else None
+    if 'enum' in schema:
+        return rng.choice(schema['enum'])
+    kind = schema.get('type')
+    if kind == 'boolean':
+        return rng.random() < answer_rate
+    if kind in ('integer', 'number'):
+        return 0
+    if kind == 'array':
+        return []
+    if kind == 'object':
+        return {name: _synthesize(prop, rng, answer_rate) for name, prop in schema.get('properties', {}).items()}
+    return "Synthetic response (no recording for this prompt)."
+
+
+class RecordedChatModel(BaseChatModel):
+    """Chat model stand-in: replays recorded responses with their recorded latency, or records the real model's.
+
+    Prompts without a recording get a synthetic answer (schema-valid for structured output) with a typical latency,
+    so load tests run offline and in seconds.
+    """
+
+    model_id: str
+    recordings: Any
+    inner: Optional[Any] = None          # Real model (record mode), with the tools bound
+    tools: List[dict] = []
+    answer_rate: float = 0.3             # P(true) of the synthetic booleans (should_answer)
+    latency_scale: float = 1.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "recorded"
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        inner = self.inner.bind_tools(tools, tool_choice=tool_choice, **kwargs) if self.inner is not None else None
+        return self.model_copy(update={'inner': inner, 'tools': [convert_to_openai_tool(tool) for tool in tools]})
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        key = self.recordings.key(self.model_id, messages, self.tools)
+        if self.inner is not None:
+            start = time.monotonic()
+            message = self.inner.invoke(messages, stop=stop, **kwargs)
+            self.recordings.add(key, self.model_id, message, time.monotonic() - start)
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+        rng = random.Random(key)
+        entry = self.recordings.get(key)
+        if entry is not None:
+            message = messages_from_dict([entry['message']])[0]
+            latency = entry['latency']
+        else:
+            message = self._synthetic(rng)
+            latency = self.recordings.typical_latency(self.model_id, rng)
+        time.sleep(latency * self.latency_scale)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _synthetic(self, rng: random.Random) -> AIMessage:
+        if not self.tools:
+            return AIMessage(content=_synthesize({'type': 'string'}, rng, self.answer_rate))
+        function = self.tools[0]['function']
+        args = _synthesize(function.get('parameters', {}), rng, self.answer_rate)
+        return AIMessage(content="", tool_calls=[{'name': function['name'], 'args': args, 'id': f"call_{rng.getrandbits(32):08x}"}])
+
+
+def install(mode: str = 'replay', path: Path = DEFAULT_RECORDINGS, answer_rate: float = 0.3, latency_scale: float = 1.0) -> ModelRecordings:
+    """Make `init_chat_model` return recorded models; call before the functions are imported.
+
+    mode: 'replay' (recordings, then synthetic answers) or 'record' (real models, responses appended to `path`).
+    """
+    import langchain.chat_models as chat_models
+    real_init_chat_model = chat_models.init_chat_model
+    recordings = ModelRecordings(path)
+
+    def init_chat_model(model: str, **kwargs):
+        inner = real_init_chat_model(model, **kwargs) if mode == 'record' else None
+        return RecordedChatModel(model_id=model, recordings=recordings, inner=inner,
+                                 answer_rate=answer_rate, latency_scale=latency_scale)
+
+    chat_models.init_chat_model = init_chat_model
+    return recordings
@@ -0,0 +1,354 @@
+"""Single-process runtime of the whole pipeline: listener -> SQS -> processor -> evaluator -> agents -> sender.
+
+Every Python handler runs in one asyncio process. SQS and the Lambda async invokes are in-memory queues, DynamoDB is
+an in-memory moto server with the tables of template.yaml, and Slack is a local fake of the Web API. The listener
+(Node.js) is emulated here, with the debounce delay injected on the queued messages.
+
+    python local_runtime/runtime.py --event events/test-lmbd-msg-evaluator_no_tag.json --debounce 2
+
+The models are the real ones (Bedrock credentials needed) unless load_generator.py replays recorded responses.
+"""
+import os, sys, json, time, asyncio, argparse, threading, traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from aws import LambdaContext, LocalDynamoDB, LocalFifoQueue, function_environment, function_timeout, load_template
+from fake_slack import BOT_TAG, FakeSlack, FakeSlackServer
+from loader import REPO_ROOT, SHARED_DIR, load_function
+
+
+FUNCTIONS = {
+    # Transport target: (template logical id, function directory)
+    'SqsProcessor': ('SqsMessageProcessor', 'lmbd_sqs_processor'),
+    'Evaluator': ('SlackMessageRouter', 'lmbd_message_evaluator'),
+    'QAAgent': ('QAResearchAgentFunction', 'lmbd_agent_qa_mcp_react'),
+    'ArchitectureAgent': ('ArchitectureAgentFunction', 'lmbd_agent_architecture_aws_mcp'),
+    'Sender': ('SlackMessageSenderFunction', 'lmbd_message_sender'),
+}
+AGENTS = ('QAAgent', 'ArchitectureAgent')
+# Lambda retries a failed async invocation twice, about 1 and 2 minutes later
+ASYNC_RETRY_DELAYS = (60, 120)
+SQS_BATCH_SIZE = 10
+
+
+@dataclass
+class Span:
+    stage: str
+    key: Optional[str]          # ts of the Slack message the work is about
+    queued_at: float
+    started_at: float = 0.0
+    ended_at: float = 0.0
+    status: str = 'ok'          # ok | error | duplicate | retry
+    attempt: int = 1
+
+    @property
+    def wait(self) -> float:
+        return self.started_at - self.queued_at
+
+    @property
+    def duration(self) -> float:
+        return self.ended_at - self.started_at
+
+
+class Recorder:
+    """Timeline of the run: every invocation (queueing delay, duration, status) keyed by the Slack message ts."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self.ingested: Dict[str, dict] = {}
+        self.replies: List[dict] = []
+        self.lock = threading.Lock()
+
+    def span(self, span: Span):
+        with self.lock:
+            self.spans.append(span)
+
+    def ingest(self, event: dict, mentioned: bool):
+        with self.lock:
+            self.ingested[event['ts']] = {'at': time.time(), 'channel': event['channel'],
+                                          'thread_ts': event['thread_ts'], 'mentioned': mentioned}
+
+    def reply(self, posted: dict):
+        with self.lock:
+            self.replies.append(posted)
+
+
+def correlation_key(event) -> Optional[str]:
+    from transport import parse_event
+    try:
+        return parse_event(event).get('ts')
+    except Exception:
+        return None
+
+
+def echo_agent(source: str, latency: float = 0.0) -> Callable:
+    """Agent stand-in: replies with the message itself through the Sender (no model, MCP server or checkpoint)."""
+    from transport import parse_event, send
+
+    def handler(event, context):
+        request = parse_event(event)
+        time.sleep(latency)
+        answer = f"[{source}] {request.get('message', '')}"
+        send('Sender', {
+            'source': source,
+            'channel': request['channel'],
+            'thread_ts': request['thread_ts'],
+            'ts': request.get('ts'),
+            'human_message': request.get('message'),
+            'ai_message': answer,
+            'args': {'channel': request['channel'], 'thread_ts': request['thread_ts'], 'text': answer},
+        })
+        return {'statusCode': 200, 'body': json.dumps({'success': True})}
+    return handler
+
+
+class LocalRuntime:
+    def __init__(self, agents: str = 'echo', debounce_seconds: float = 3.0, agent_latency: float = 0.0,
+                 slack: Optional[FakeSlack] = None, workers: int = 64, pollers: int = 5, retry_scale: float = 0.01):
+        self.agents = agents
+        self.debounce_seconds = debounce_seconds
+        self.agent_latency = agent_latency
+        self.slack = slack or FakeSlack()
+        self.pollers = pollers
+        self.retry_scale = retry_scale      # Lambda/SQS retry delays are scaled down (seconds -> 10s of milliseconds)
+        self.template = load_template()
+        self.queue = LocalFifoQueue(visibility_timeout=180 * retry_scale)
+        self.recorder = Recorder()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="lambda")
+        self.handlers: Dict[str, Callable] = {}
+        self.timeouts: Dict[str, int] = {}
+        self.pending = 0
+        self.pending_lock = threading.Lock()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def _environment(self, slack_url: str) -> Dict[str, str]:
+        env = {}
+        for target, (logical_id, _) in FUNCTIONS.items():
+            if target in AGENTS and self.agents != 'real':
+                continue
+            env.update(function_environment(self.template, logical_id))
+        env.update({
+            'ENV': 'local',
+            'TRANSPORT_MODE': 'inprocess',
+            'SLACK_API_URL': slack_url,
+            'SLACK_BOT_TOKEN': os.environ.get('SLACK_BOT_TOKEN', 'xoxb-local'),
+            'POWERTOOLS_TRACE_DISABLED': 'true',
+            # Both are set in Lambda; boto3 reads the second one
+            'AWS_REGION': os.environ.get('AWS_REGION', 'us-east-1'),
+            'AWS_DEFAULT_REGION': os.environ.get('AWS_DEFAULT_REGION', os.environ.get('AWS_REGION', 'us-east-1')),
+        })
+        return env
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.dynamodb = LocalDynamoDB(self.template).start()
+        self.slack_server = FakeSlackServer(self.slack).start()
+        self.slack.on_post = self.recorder.reply
+        # The modules read their configuration at import time
+        os.environ.update(self._environment(self.slack_server.url))
+        sys.path.append(str(SHARED_DIR))
+        import transport
+
+        for target, (logical_id, directory) in FUNCTIONS.items():
+            self.timeouts[target] = function_timeout(self.template, logical_id)
+            if target in AGENTS and self.agents != 'real':
+                self.handlers[target] = echo_agent(target, self.agent_latency)
+            else:
+                print(f"Loading {directory}")
+                self.handlers[target] = load_function(target, REPO_ROOT / directory).lambda_handler
+            transport.register(target, self._async_invoker(target))
+
+        import boto3
+        self.debounce_table = boto3.resource('dynamodb').Table(os.environ['DEBOUNCE_TABLE'])
+        self._tasks = [asyncio.create_task(self._poll()) for _ in range(self.pollers)]
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.slack_server.stop()
+        self.dynamodb.stop()
+
+    # Lambda async invokes
+
+    def _async_invoker(self, target: str) -> Callable:
+        def invoke(event, context):
+            self.invoke(target, event)
+            return {'StatusCode': 202}
+        return invoke
+
+    def invoke(self, target: str, event, attempt: int = 1, delay: float = 0.0):
+        """Queue an asynchronous invocation; callable from the event loop or from a handler thread."""
+        with self.pending_lock:
+            self.pending += 1
+        coroutine = self._invoke(target, event, time.time(), attempt, delay)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self.loop.create_task(coroutine)
+        else:
+            asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    async def _invoke(self, target: str, event, queued_at: float, attempt: int, delay: float):
+        from idempotency import DUPLICATE_RESPONSE
+        try:
+            if delay:
+                await asyncio.sleep(delay)
+            span = Span(target, correlation_key(event), queued_at, time.time(), attempt=attempt)
+            context = LambdaContext(FUNCTIONS[target][0], self.timeouts[target])
+            failed = False
+            try:
+                result = await self.loop.run_in_executor(self.executor, self.handlers[target], event, context)
+                if result == DUPLICATE_RESPONSE:
+                    span.status = 'duplicate'
+                elif isinstance(result, dict) and int(result.get('statusCode', 200)) >= 500:
+                    span.status = 'error'
+            except Exception:
+                traceback.print_exc()
+                span.status, failed = 'error', True
+            span.ended_at = time.time()
+            self.recorder.span(span)
+            # Only raised errors are retried by Lambda, not error responses
+            if failed and attempt <= len(ASYNC_RETRY_DELAYS):
+                self.invoke(target, event, attempt + 1, ASYNC_RETRY_DELAYS[attempt - 1] * self.retry_scale)
+        finally:
+            with self.pending_lock:
+                self.pending -= 1
+
+    # SQS event source mapping
+
+    async def _poll(self):
+        while True:
+            batch = self.queue.receive(SQS_BATCH_SIZE)
+            if not batch:
+                await asyncio.sleep(0.01)
+                continue
+            with self.pending_lock:
+                self.pending += 1
+            try:
+                started = time.time()
+                event = {'Records': [LocalFifoQueue.to_record(message) for message in batch]}
+                context = LambdaContext(FUNCTIONS['SqsProcessor'][0], self.timeouts['SqsProcessor'])
+                try:
+                    result = await self.loop.run_in_executor(self.executor, self.handlers['SqsProcessor'], event, context)
+                    failed = {failure['itemIdentifier'] for failure in (result or {}).get('batchItemFailures', [])}
+                except Exception:
+                    traceback.print_exc()
+                    failed = {message['messageId'] for message in batch}
+                ended = time.time()
+                for message in batch:
+                    key = json.loads(message['body']).get('ts')
+                    status = 'retry' if message['messageId'] in failed else 'ok'
+                    self.recorder.span(Span('SqsProcessor', key, message['sent_at'] + self.debounce_seconds,
+                                            started, ended, status, message['receive_count']))
+                self.queue.delete([m['messageId'] for m in batch if m['messageId'] not in failed])
+                self.queue.release(failed, delay=self.queue.visibility_timeout)
+            finally:
+                with self.pending_lock:
+                    self.pending -= 1
+
+    # lmbd_event_listener
+
+    def bump_generation(self, event: dict) -> Optional[int]:
+        from slack_client import slack_ts_key
+        now = int(time.time())
+        try:
+            result = self.debounce_table.update_item(
+                Key={'PK': f"{event['channel']}#{event['thread_ts']}"},
+                UpdateExpression='ADD generation :one SET latest_ts = :ts, latest_ts_key = :tsKey, updatedAt = :now, expireAt = :expireAt',
+                ConditionExpression='attribute_not_exists(latest_ts_key) OR latest_ts_key < :tsKey',
+                ExpressionAttributeValues={':one': 1, ':ts': event['ts'], ':tsKey': slack_ts_key(event['ts']), ':now': now,
+                                           ':expireAt': now + 7 * 24 * 3600},
+                ReturnValues='UPDATED_NEW',
+            )
+        except self.debounce_table.meta.client.exceptions.ConditionalCheckFailedException:
+            return None     # Retry of the same event, or an older message
+        return int(result['Attributes']['generation'])
+
+    async def ingest(self, event: dict):
+        """What the event listener does with a Slack `message` event (after Slack stored the message)."""
+        if event.get('subtype'):
+            return
+        event = dict(event)
+        self.slack.add_message(event)
+        event['message'] = event.get('text', '')
+        event['bot_tag'] = BOT_TAG
+        event['blocks'] = []
+        event.setdefault('thread_ts', event['ts'])
+        mentioned = BOT_TAG in event['message']
+        self.recorder.ingest(event, mentioned)
+
+        generation = await self.loop.run_in_executor(self.executor, self.bump_generation, event)
+        if not mentioned:
+            if generation is not None:
+                event['debounce_generation'] = generation
+            self.queue.send(json.dumps(event), event['channel'], f"{event['channel']}_{event['ts']}", self.debounce_seconds)
+        else:
+            self.invoke('Evaluator', {'body': json.dumps(event), 'headers': {'Content-Type': 'application/json'}})
+
+    async def drain(self, poll: float = 0.05):
+        """Wait until every queued message and invocation has been processed."""
+        while True:
+            with self.pending_lock:
+                idle = self.pending == 0
+            if idle and len(self.queue) == 0:
+                return
+            await asyncio.sleep(poll)
+
+    def summary(self) -> str:
+        lines = [f"{'stage':<18}{'calls':>7}{'errors':>8}{'dup':>6}{'avg wait s':>12}{'avg run s':>11}"]
+        for stage in dict.fromkeys(span.stage for span in self.recorder.spans):
+            spans = [span for span in self.recorder.spans if span.stage == stage]
+            errors = sum(span.status in ('error', 'retry') for span in spans)
+            duplicates = sum(span.status == 'duplicate' for span in spans)
+            lines.append(f"{stage:<18}{len(spans):>7}{errors:>8}{duplicates:>6}"
+                         f"{sum(s.wait for s in spans) / len(spans):>12.3f}{sum(s.duration for s in spans) / len(spans):>11.3f}")
+        lines.append(f"{len(self.recorder.ingested)} messages in, {len(self.recorder.replies)} replies posted, "
+                     f"{len(self.queue.dead_letters)} dead letters")
+        return "\n".join(lines)
+
+
+def load_event(path: str) -> dict:
+    """A Slack message event, from a raw event file or an evaluator test event (API-shaped, see events/)."""
+    with open(path) as f:
+        event = json.load(f)
+    if 'body' in event:
+        event = json.loads(event['body'])
+    if event.get('bot_tag'):
+        event['text'] = event.get('text', '').replace(event['bot_tag'], BOT_TAG)
+    return event
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--event', action='append', required=True, help="Slack event file (repeatable)")
+    parser.add_argument('--agents', choices=('echo', 'real'), default='echo', help="Agent stand-ins or the real agents")
+    parser.add_argument('--debounce', type=float, default=3.0, help="Seconds unmentioned messages wait in the queue")
+    parser.add_argument('--agent-latency', type=float, default=0.0, help="Seconds each agent stand-in takes")
+    parser.add_argument('--slack-latency', type=float, default=0.0, help="Seconds each Slack API call takes")
+    args = parser.parse_args()
+
+    async def run():
+        runtime = LocalRuntime(args.agents, args.debounce, args.agent_latency, FakeSlack(latency=args.slack_latency))
+        await runtime.start()
+        try:
+            for path in args.event:
+                await runtime.ingest(load_event(path))
+            await runtime.drain()
+            print(runtime.summary())
+            for reply in runtime.slack.posted:
+                print(f"[{reply['channel']} {reply['thread_ts']}] {reply['text'][:200]}")
+        finally:
+            runtime.stop()
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
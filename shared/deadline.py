@@ -0,0 +1,52 @@
+import os
+from typing import Callable, Optional
+
+
+# Time kept back from the Lambda timeout to wrap up: final answer, checkpoint flush and the reply to Slack
+DEADLINE_RESERVE_SECONDS = float(os.environ.get('DEADLINE_RESERVE_SECONDS', 90))
+# Longest a single agent step (model call + its tool calls) may take
+AGENT_STEP_TIMEOUT_SECONDS = float(os.environ.get('AGENT_STEP_TIMEOUT_SECONDS', 240))
+# Longest a single tool call may take; the agent gets an error message instead and carries on
+AGENT_TOOL_TIMEOUT_SECONDS = float(os.environ.get('AGENT_TOOL_TIMEOUT_SECONDS', 90))
+
+
+class Deadline:
+    """Time budget of an invocation: what `context.get_remaining_time_in_millis()` reports, minus the reserve.
+
+    Without a Lambda context (local runs) there is no deadline.
+    """
+
+    def __init__(self, get_remaining_ms: Optional[Callable[[], int]] = None, reserve: float = DEADLINE_RESERVE_SECONDS):
+        self.get_remaining_ms = get_remaining_ms
+        self.reserve = reserve
+
+    @classmethod
+    def from_context(cls, context, reserve: float = DEADLINE_RESERVE_SECONDS) -> "Deadline":
+        return cls(getattr(context, 'get_remaining_time_in_millis', None), reserve)
+
+    def set(self, get_remaining_ms: Optional[Callable[[], int]]):
+        """Point a long-lived (module-level) deadline at the context of the current invocation."""
+        self.get_remaining_ms = get_remaining_ms
+
+    def lambda_remaining(self) -> Optional[float]:
+        """Seconds until Lambda kills the invocation (None without a deadline)."""
+        return self.get_remaining_ms() / 1000 if self.get_remaining_ms is not None else None
+
+    def remaining(self, reserve: Optional[float] = None) -> Optional[float]:
+        """Seconds left for work before the reserve (None without a deadline)."""
+        left = self.lambda_remaining()
+        return max(left - (self.reserve if reserve is None else reserve), 0.0) if left is not None else None
+
+    def expired(self) -> bool:
+        return self.remaining() == 0.0
+
+    def timeout(self, cap: Optional[float] = None, reserve: Optional[float] = None) -> Optional[float]:
+        """Timeout for the next operation: `cap`, shortened to what is left of the budget (or of a smaller reserve)."""
+        left = self.remaining(reserve)
+        if left is None:
+            return cap
+        return left if cap is None else min(cap, left)
+
+    def __repr__(self) -> str:
+        left = self.remaining()
+        return f"Deadline({'none' if left is None else f'{left:.1f}s left'}, reserve={self.reserve:.0f}s)"
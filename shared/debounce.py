@@ -0,0 +1,41 @@
+import os
+from typing import Optional
+
+import boto3
+
+
+DEBOUNCE_TABLE = os.environ.get('DEBOUNCE_TABLE')
+
+
+def debounce_key(channel: Optional[str], thread_ts: Optional[str]) -> Optional[str]:
+    # Same key as the event listener: one item per channel/thread
+    return f"{channel}#{thread_ts}" if channel and thread_ts else None
+
+
+class DebounceRegistry:
+    """Latest ts and generation counter per channel/thread, bumped by the event listener on every message.
+
+    A queued message is stale when a newer message of its thread bumped the generation after it was queued.
+    Without a table (local runs), or for messages queued without a generation, nothing is stale.
+    """
+
+    def __init__(self, table_name: Optional[str] = DEBOUNCE_TABLE, region_name: Optional[str] = None):
+        self.table = None
+        if table_name:
+            dynamo = boto3.resource("dynamodb", region_name=region_name or os.environ.get("AWS_REGION", "us-east-1"))
+            self.table = dynamo.Table(table_name)
+
+    def current(self, key: Optional[str]) -> Optional[dict]:
+        if self.table is None or not key:
+            return None
+        return self.table.get_item(Key={'PK': key}, ProjectionExpression='generation, latest_ts').get('Item')
+
+    def is_stale(self, slack_event: dict) -> bool:
+        generation = slack_event.get('debounce_generation')
+        if generation is None:
+            return False
+        key = debounce_key(slack_event.get('channel'), slack_event.get('thread_ts') or slack_event.get('ts'))
+        item = self.current(key)
+        if item is None:
+            return False
+        return int(item.get('generation', 0)) > int(generation)
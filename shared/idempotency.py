@@ -0,0 +1,109 @@
+import os, time, functools
+from typing import Callable, Optional
+
+import boto3
+from botocore.exceptions import ClientError
+
+
+IDEMPOTENCY_TABLE = os.environ.get('IDEMPOTENCY_TABLE')
+# How long a completed delivery is remembered (Slack retries within minutes, SQS/Lambda within hours)
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 24 * 3600))
+# In-progress claims without a Lambda context expire after this long, so a crashed run can be retried
+IDEMPOTENCY_IN_PROGRESS_SECONDS = int(os.environ.get('IDEMPOTENCY_IN_PROGRESS_SECONDS', 900))
+
+IN_PROGRESS = "IN_PROGRESS"
+COMPLETED = "COMPLETED"
+
+DUPLICATE_RESPONSE = {'statusCode': 200, 'body': 'Duplicate delivery skipped'}
+
+
+def channel_ts_key(channel: Optional[str], ts: Optional[str]) -> Optional[str]:
+    return f"{channel}#{ts}" if channel and ts else None
+
+
+class IdempotencyStore:
+    """One conditional-write record per (hop, channel_ts) with IN_PROGRESS/COMPLETED status and a TTL.
+
+    Without a table (local runs) every claim succeeds.
+    """
+
+    def __init__(self, hop: str, table_name: Optional[str] = IDEMPOTENCY_TABLE, ttl: int = IDEMPOTENCY_TTL_SECONDS,
+                 region_name: Optional[str] = None):
+        self.hop = hop
+        self.ttl = ttl
+        self.table = None
+        if table_name:
+            dynamo = boto3.resource("dynamodb", region_name=region_name or os.environ.get("AWS_REGION", "us-east-1"))
+            self.table = dynamo.Table(table_name)
+
+    def _pk(self, key: str) -> str:
+        return f"{self.hop}#{key}"
+
+    def claim(self, key: Optional[str], context=None) -> bool:
+        """True if this delivery should be processed; False if another one completed it or is processing it."""
+        if self.table is None or not key:
+            return True
+        now = int(time.time())
+        remaining_ms = context.get_remaining_time_in_millis() if hasattr(context, 'get_remaining_time_in_millis') else None
+        in_progress_until = now + (remaining_ms // 1000 + 1 if remaining_ms else IDEMPOTENCY_IN_PROGRESS_SECONDS)
+        try:
+            self.table.put_item(
+                Item={
+                    'PK': self._pk(key),
+                    'status': IN_PROGRESS,
+                    'in_progress_until': in_progress_until,
+                    'expireAt': now + self.ttl,
+                },
+                # New key, a claim whose run died (timeout) or a record the TTL sweeper has not deleted yet
+                ConditionExpression="attribute_not_exists(PK) OR (#status = :in_progress AND in_progress_until < :now) OR expireAt < :now",
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':in_progress': IN_PROGRESS, ':now': now},
+            )
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                print(f"Duplicate delivery of {self._pk(key)}, skipping")
+                return False
+            raise
+
+    def complete(self, key: Optional[str]):
+        if self.table is None or not key:
+            return
+        self.table.update_item(
+            Key={'PK': self._pk(key)},
+            UpdateExpression="SET #status = :completed, completed_at = :now",
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':completed': COMPLETED, ':now': int(time.time())},
+        )
+
+    def release(self, key: Optional[str]):
+        """Forget a failed attempt so the retry of the same delivery is processed."""
+        if self.table is None or not key:
+            return
+        self.table.delete_item(Key={'PK': self._pk(key)})
+
+
+def idempotent_handler(store: IdempotencyStore, key_fn: Callable[[dict], Optional[str]]):
+    """Run a Lambda handler at most once per key. 5xx responses and exceptions release the claim for a retry."""
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            try:
+                key = key_fn(event)
+            except Exception as e:      # Malformed event: let the handler report it
+                print(f"Could not compute the idempotency key: {e}")
+                key = None
+            if not store.claim(key, context):
+                return DUPLICATE_RESPONSE
+            try:
+                response = handler(event, context)
+            except Exception:
+                store.release(key)
+                raise
+            if isinstance(response, dict) and int(response.get('statusCode', 200)) >= 500:
+                store.release(key)
+            else:
+                store.complete(key)
+            return response
+        return wrapper
+    return decorator
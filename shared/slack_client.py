@@ -0,0 +1,95 @@
+import os, io, threading
+from http.client import HTTPMessage
+from typing import Any, Dict, Optional
+from urllib.error import HTTPError
+from urllib.request import Request
+
+import requests
+from requests.adapters import HTTPAdapter
+from slack_sdk import WebClient
+from slack_sdk.http_retry.builtin_handlers import (
+    ConnectionErrorRetryHandler,
+    RateLimitErrorRetryHandler,
+    ServerErrorRetryHandler,
+)
+
+
+SLACK_POOL_SIZE = int(os.environ.get('SLACK_POOL_SIZE', 16))
+SLACK_RATE_LIMIT_RETRIES = int(os.environ.get('SLACK_RATE_LIMIT_RETRIES', 3))
+# Web API base URL (a local stand-in in the single-process runtime, see local_runtime/)
+SLACK_API_URL = os.environ.get('SLACK_API_URL', WebClient.BASE_URL)
+
+# One connection pool per container, shared by every client (keep-alive across invocations)
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def shared_session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=SLACK_POOL_SIZE)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+class PooledWebClient(WebClient):
+    """WebClient over a shared keep-alive pool (urllib opens a new TLS connection per call).
+
+    Retries rate-limited calls after the Retry-After header, plus connection and 5xx errors, with the SDK retry handlers.
+    """
+
+    def __init__(self, token: Optional[str] = None, session: Optional[requests.Session] = None, **kwargs):
+        kwargs.setdefault('retry_handlers', [
+            ConnectionErrorRetryHandler(),
+            RateLimitErrorRetryHandler(max_retry_count=SLACK_RATE_LIMIT_RETRIES),
+            ServerErrorRetryHandler(),
+        ])
+        kwargs.setdefault('timeout', 15)
+        kwargs.setdefault('base_url', SLACK_API_URL)
+        super().__init__(token=token, **kwargs)
+        self.session = session or shared_session()
+
+    def _perform_urllib_http_request_internal(self, url: str, req: Request) -> Dict[str, Any]:
+        # Content-Length is recomputed by requests
+        headers = {k: str(v) for k, v in req.header_items() if k.lower() != 'content-length'}
+        proxies = {"http": self.proxy, "https": self.proxy} if self.proxy else None
+        response = self.session.request(req.get_method(), url, data=req.data, headers=headers,
+                                        timeout=self.timeout, proxies=proxies)
+        if response.status_code >= 400:
+            # Same error path as urllib, so the SDK retry handlers (Retry-After included) apply unchanged
+            message = HTTPMessage()
+            for key, value in response.headers.items():
+                message[key] = value
+            raise HTTPError(url, response.status_code, response.reason, message, io.BytesIO(response.content))
+        if response.headers.get('Content-Type', '').startswith('application/gzip'):
+            body = response.content
+        else:
+            body = response.content.decode(response.encoding or 'utf-8')
+        return {"status": response.status_code, "headers": response.headers, "body": body}
+
+
+def slack_ts_key(ts: Optional[str]) -> int:
+    """Slack ts ("<seconds>.<micro>" string) as integer microseconds, to compare ts as numbers rather than as text.
+
+    Fits a DynamoDB Number; the event listener computes the same key (slackTsKey in main.js).
+    """
+    seconds, _, micro = (ts or '0').partition('.')
+    return int(seconds) * 1_000_000 + int(micro[:6].ljust(6, '0'))
+
+
+def get_slack_client(token: Optional[str] = None, **kwargs) -> PooledWebClient:
+    return PooledWebClient(token=token or os.environ['SLACK_BOT_TOKEN'], **kwargs)
+
+
+def fetch_replies(client: WebClient, channel: str, thread_ts: str, oldest: Optional[str] = None, limit: int = 200) -> list:
+    """Every message of the thread, following next_cursor (a single conversations.replies call stops at `limit`)."""
+    kwargs = {'channel': channel, 'ts': thread_ts, 'limit': limit}
+    if oldest:
+        kwargs['oldest'] = oldest
+    messages = []
+    for page in client.conversations_replies(**kwargs):
+        messages.extend(page['messages'])
+    return messages
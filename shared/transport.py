@@ -0,0 +1,123 @@
+import os, re, json, gzip, base64, threading
+from typing import Callable, Dict, NamedTuple, Optional
+
+import boto3
+import requests
+from botocore.config import Config
+from requests.adapters import HTTPAdapter
+
+
+# "lambda" (async invoke), "http" (local `sam local start-api` URLs) or "inprocess" (registered handlers, same process)
+TRANSPORT_MODE = os.environ.get('TRANSPORT_MODE') or ('http' if os.environ.get('ENV', 'dev') == 'dev' else 'lambda')
+# Bodies bigger than this are sent gzip+base64 encoded (async invoke payloads are limited to 256KB)
+TRANSPORT_COMPRESS_MIN_BYTES = int(os.environ.get('TRANSPORT_COMPRESS_MIN_BYTES', 16 * 1024))
+TRANSPORT_POOL_SIZE = int(os.environ.get('TRANSPORT_POOL_SIZE', 16))
+
+ENCODING_KEY = '_encoding'
+GZIP_BASE64 = 'gzip+base64'
+
+# Tuned for Event invokes, which return as soon as Lambda queues the payload
+# https://boto3.amazonaws.com/v1/documentation/api/latest/guide/retries.html#adaptive-retry-mode
+LAMBDA_CONFIG = Config(
+    tcp_keepalive=True,
+    connect_timeout=3,
+    read_timeout=15,
+    max_pool_connections=TRANSPORT_POOL_SIZE,
+    retries={'max_attempts': 5, 'mode': 'adaptive'},
+)
+
+
+class Target(NamedTuple):
+    local_url_env: str
+    arn_env: str
+    api_event: bool      # The receiver expects an API Gateway-like event ({'body': <json string>})
+    compress: bool       # The receiver decodes compressed bodies
+
+
+TARGETS = {
+    'QAAgent': Target('LOCAL_AGENT_QA_URL', 'AGENT_QA_LAMBDA_ARN', True, True),
+    'ArchitectureAgent': Target('LOCAL_AGENT_ARCHITECTURE_URL', 'AGENT_ARCHITECTURE_LAMBDA_ARN', True, True),
+    'Sender': Target('LOCAL_SENDER_FUNCTION_URL', 'SENDER_FUNCTION_ARN', False, True),
+    'Evaluator': Target('LOCAL_EVALUATOR_URL', 'EVALUATOR_LAMBDA_ARN', True, False),
+}
+
+_lambda_client = None
+_session: Optional[requests.Session] = None
+_lock = threading.Lock()
+_handlers: Dict[str, Callable] = {}
+
+
+def lambda_client():
+    global _lambda_client
+    with _lock:
+        if _lambda_client is None:
+            _lambda_client = boto3.client('lambda', region_name=os.environ.get('AWS_REGION', 'us-east-1'), config=LAMBDA_CONFIG)
+        return _lambda_client
+
+
+def http_session() -> requests.Session:
+    global _session
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=TRANSPORT_POOL_SIZE)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def register(target: str, handler: Callable):
+    """Route `target` to `handler(event, context)` in "inprocess" mode (tests, single-process deployments)."""
+    _handlers[target] = handler
+
+
+def encode_body(payload: dict, min_bytes: int = TRANSPORT_COMPRESS_MIN_BYTES) -> dict:
+    raw = json.dumps(payload).encode()
+    if len(raw) < min_bytes:
+        return payload
+    return {ENCODING_KEY: GZIP_BASE64, 'data': base64.b64encode(gzip.compress(raw)).decode()}
+
+
+def decode_body(body: dict) -> dict:
+    if isinstance(body, dict) and body.get(ENCODING_KEY) == GZIP_BASE64:
+        return json.loads(gzip.decompress(base64.b64decode(body['data'])))
+    return body
+
+
+def parse_event(event) -> dict:
+    """Request of an event sent by `send`: API-like ({'body': ...}) or raw, compressed or not."""
+    if isinstance(event, str):
+        event = json.loads(event)
+    body = event['body'] if isinstance(event, dict) and 'body' in event else event
+    if isinstance(body, str):
+        body = json.loads(body)
+    return decode_body(body)
+
+
+def _local_url(url: str) -> str:
+    # From inside the SAM containers the host is host.docker.internal
+    return re.sub(r'https?:\/\/(localhost|127\.0\.0\.1)(:\d+)?', r'http://host.docker.internal\2', url)
+
+
+def send(target: str, payload: dict, mode: str = TRANSPORT_MODE):
+    """Deliver `payload` to another function of the app (asynchronously when deployed)."""
+    spec = TARGETS[target]
+    body = encode_body(payload) if spec.compress else payload
+    event = {'body': json.dumps(body), 'headers': {'Content-Type': 'application/json'}} if spec.api_event else body
+
+    if mode == 'inprocess':
+        print(f"Calling {target} in process")
+        return _handlers[target](event, None)
+
+    if mode == 'http':
+        url = _local_url(os.environ[spec.local_url_env])
+        print(f"Calling local {target} at {url}")
+        response = http_session().post(url, headers={'Content-Type': 'application/json'}, json=body, timeout=(3, 900))
+        print(f"Event sent to local {target}:", response.status_code, response.text)
+        return response
+
+    arn = os.environ[spec.arn_env]
+    print(f"Invoking {target} Lambda Function {arn}")
+    response = lambda_client().invoke(FunctionName=arn, InvocationType='Event', Payload=json.dumps(event))
+    print(f"Event sent to {target} Lambda:", response)
+    return response
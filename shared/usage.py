@@ -0,0 +1,198 @@
+import os, sys, time, threading, argparse, datetime
+from typing import Dict, List, Optional
+
+import boto3
+from boto3.dynamodb.conditions import Key
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+DYNAMO_DB_LOG_TABLE = os.environ.get('DYNAMO_DB_LOG_TABLE')
+# USD per million tokens: (input, output, cache read, cache write), matched by substring of the model id
+# https://aws.amazon.com/bedrock/pricing/
+MODEL_PRICES = {
+    'claude-3-5-haiku': (0.80, 4.00, 0.08, 1.00),
+    'claude-3-haiku': (0.25, 1.25, 0.03, 0.30),
+    'claude-sonnet-4': (3.00, 15.00, 0.30, 3.75),
+    'claude-3-7-sonnet': (3.00, 15.00, 0.30, 3.75),
+    'claude-3-5-sonnet': (3.00, 15.00, 0.30, 3.75),
+    'claude-opus-4': (15.00, 75.00, 1.50, 18.75),
+}
+COUNTERS = ('calls', 'input_tokens', 'output_tokens', 'cache_read_tokens', 'cache_write_tokens', 'cost_musd')
+# gsi1 partition of the per-channel totals (the per-thread ones are partitioned by their channel name)
+CHANNELS_PARTITION = "USAGE#CHANNELS"
+
+
+def model_price(model_id: str) -> tuple:
+    for name, price in MODEL_PRICES.items():
+        if name in model_id:
+            return price
+    return (0.0, 0.0, 0.0, 0.0)
+
+
+def cost_musd(model_id: str, input_tokens: int, output_tokens: int, cache_read: int, cache_write: int) -> int:
+    """Cost in millionths of a dollar (integers: DynamoDB doesn't take floats and ADD stays exact)."""
+    price_in, price_out, price_read, price_write = model_price(model_id)
+    # input_tokens includes the cached ones (LangChain usage_metadata convention)
+    uncached = max(input_tokens - cache_read - cache_write, 0)
+    return round(uncached * price_in + output_tokens * price_out + cache_read * price_read + cache_write * price_write)
+
+
+class UsageTracker(BaseCallbackHandler):
+    """Token usage of every chat model call of a request, per model id. Pass it in `config={'callbacks': [...]}`:
+    it is inherited by the nested calls (graph nodes, structured output, ReAct steps)."""
+
+    def __init__(self):
+        self.models: Dict[str, Dict[str, int]] = {}
+        self._run_models: Dict[str, str] = {}
+        self.lock = threading.Lock()     # Concurrent calls (speculative evaluator, parallel graph branches)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        model_id = (metadata or {}).get('ls_model_name') or (kwargs.get('invocation_params') or {}).get('model_id')
+        if model_id:
+            with self.lock:
+                self._run_models[str(run_id)] = model_id
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self.lock:
+            model_id = self._run_models.pop(str(run_id), None)
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, 'message', None)
+                usage = getattr(message, 'usage_metadata', None)
+                if not usage:
+                    continue
+                metadata = message.response_metadata or {}
+                model = model_id or metadata.get('model_name') or metadata.get('model_id') or "unknown"
+                self.add(model, usage)
+
+    def add(self, model_id: str, usage: dict):
+        details = usage.get('input_token_details') or {}
+        counts = {
+            'calls': 1,
+            'input_tokens': int(usage.get('input_tokens', 0)),
+            'output_tokens': int(usage.get('output_tokens', 0)),
+            'cache_read_tokens': int(details.get('cache_read') or 0),
+            'cache_write_tokens': int(details.get('cache_creation') or 0),
+        }
+        counts['cost_musd'] = cost_musd(model_id, counts['input_tokens'], counts['output_tokens'],
+                                        counts['cache_read_tokens'], counts['cache_write_tokens'])
+        with self.lock:
+            totals = self.models.setdefault(model_id, dict.fromkeys(COUNTERS, 0))
+            for counter, value in counts.items():
+                totals[counter] += value
+
+    def totals(self) -> Dict[str, int]:
+        with self.lock:
+            return {counter: sum(model[counter] for model in self.models.values()) for counter in COUNTERS}
+
+    def summary(self) -> dict:
+        """Totals and per-model counters (ints only, storable as is in DynamoDB)."""
+        with self.lock:
+            models = {model: dict(counters) for model, counters in self.models.items()}
+        return {**self.totals(), 'models': models}
+
+    @property
+    def calls(self) -> int:
+        return self.totals()['calls']
+
+
+class UsageLedger:
+    """Usage aggregated per thread and per channel (per month) in LogTable, next to the chain logs.
+
+    Thread totals:  thread_ts=<thread ts>, message_ts=USAGE#<channel>, channel_name=<channel>
+    Channel totals: thread_ts=USAGE#<channel>, message_ts=USAGE#<yyyy-mm>, channel_name=USAGE#CHANNELS
+    so gsi1 (channel_name, message_ts) lists the threads of a channel and the channels of a month.
+    """
+
+    def __init__(self, table_name: Optional[str] = DYNAMO_DB_LOG_TABLE, region_name: Optional[str] = None):
+        self.table = None
+        if table_name:
+            dynamo = boto3.resource("dynamodb", region_name=region_name or os.environ.get("AWS_REGION", "us-east-1"))
+            self.table = dynamo.Table(table_name)
+
+    @staticmethod
+    def month(at: Optional[float] = None) -> str:
+        return datetime.datetime.fromtimestamp(at or time.time(), datetime.timezone.utc).strftime("%Y-%m")
+
+    def _add(self, key: dict, partition: str, totals: Dict[str, int], models: List[str], source: str, extra: dict):
+        names = {f"#{counter}": counter for counter in COUNTERS}
+        values = {f":{counter}": totals[counter] for counter in COUNTERS}
+        self.table.update_item(
+            Key=key,
+            UpdateExpression=(
+                "ADD " + ", ".join(f"#{counter} :{counter}" for counter in COUNTERS) + ", models :models, sources :sources "
+                "SET channel_name = :partition, record_type = :record_type, updated_at = :now"
+                + "".join(f", {name} = :{name}" for name in extra)
+            ),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues={
+                **values, ':models': set(models), ':sources': {source}, ':partition': partition,
+                ':record_type': 'usage', ':now': int(time.time()), **{f":{name}": value for name, value in extra.items()},
+            },
+        )
+
+    def record(self, channel_name: str, thread_ts: str, tracker: UsageTracker, source: str):
+        """Add the usage of a request to its thread and channel totals (best effort: never fails the request)."""
+        if self.table is None or not tracker.calls:
+            return
+        totals, models = tracker.totals(), sorted(tracker.models)
+        try:
+            self._add({'thread_ts': thread_ts, 'message_ts': f"USAGE#{channel_name}"}, channel_name,
+                      totals, models, source, {})
+            self._add({'thread_ts': f"USAGE#{channel_name}", 'message_ts': f"USAGE#{self.month()}"}, CHANNELS_PARTITION,
+                      totals, models, source, {'channel': channel_name})
+        except Exception as e:
+            print(f"Could not record the usage of {channel_name}/{thread_ts}: {e}")
+
+    def thread(self, channel_name: str, thread_ts: str) -> Optional[dict]:
+        """Totals of a thread so far (e.g. to check it against a budget)."""
+        if self.table is None:
+            return None
+        return self.table.get_item(Key={'thread_ts': thread_ts, 'message_ts': f"USAGE#{channel_name}"}).get('Item')
+
+    def _query(self, partition: str, sort_condition) -> List[dict]:
+        items, kwargs = [], {
+            'IndexName': 'gsi1',
+            'KeyConditionExpression': Key('channel_name').eq(partition) & sort_condition,
+        }
+        while True:
+            page = self.table.query(**kwargs)
+            items += page['Items']
+            if 'LastEvaluatedKey' not in page:
+                return items
+            kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+    def top_channels(self, month: Optional[str] = None, limit: int = 10) -> List[dict]:
+        items = self._query(CHANNELS_PARTITION, Key('message_ts').eq(f"USAGE#{month or self.month()}"))
+        return sorted(items, key=lambda item: item.get('cost_musd', 0), reverse=True)[:limit]
+
+    def top_threads(self, channel_name: str, limit: int = 10) -> List[dict]:
+        items = self._query(channel_name, Key('message_ts').begins_with("USAGE#"))
+        return sorted(items, key=lambda item: item.get('cost_musd', 0), reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Most expensive channels (of a month) or threads (of a channel)")
+    parser.add_argument('scope', choices=('channels', 'threads'))
+    parser.add_argument('--channel', help="Channel name (threads)")
+    parser.add_argument('--month', help="yyyy-mm (channels), current month by default")
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--table', default=DYNAMO_DB_LOG_TABLE)
+    args = parser.parse_args()
+    if not args.table or (args.scope == 'threads' and not args.channel):
+        parser.error("--table (or DYNAMO_DB_LOG_TABLE) is required, and --channel for threads")
+
+    ledger = UsageLedger(args.table)
+    if args.scope == 'channels':
+        items = ledger.top_channels(args.month, args.limit)
+    else:
+        items = ledger.top_threads(args.channel, args.limit)
+    for item in items:
+        name = item['channel'] if args.scope == 'channels' else item['thread_ts']
+        print(f"{name:<30} ${int(item['cost_musd']) / 1e6:>10.4f} {int(item['calls']):>6} calls "
+              f"{int(item['input_tokens']):>10} in {int(item['output_tokens']):>9} out "
+              f"{int(item['cache_read_tokens']):>9} cached  {', '.join(sorted(item.get('models', [])))}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,260 @@
+import os, io, re, json, time, uuid, hashlib, threading, unicodedata
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import boto3
+import numpy as np
+from botocore.exceptions import ClientError
+
+
+# 'bedrock' (Titan text embeddings) or 'hashing' (local feature hashing: no model call, for local runs)
+EMBEDDINGS = os.environ.get('EMBEDDINGS', 'bedrock')
+EMBEDDINGS_MODEL = os.environ.get('EMBEDDINGS_MODEL', 'amazon.titan-embed-text-v2:0')
+HASHING_DIMENSIONS = 2048
+MAX_EMBED_CHARS = 20000     # Titan v2 takes up to 8k tokens
+# How often a warm container checks whether another one changed the stored index
+INDEX_REFRESH_SECONDS = float(os.environ.get('INDEX_REFRESH_SECONDS', 60))
+SAVE_ATTEMPTS = 3
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9_.\-]*[a-z0-9]|[a-z0-9]")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words without accents ('configuración' -> 'configuracion'), keeping ids like 'gpt-4.1' or 's3'."""
+    text = unicodedata.normalize('NFKD', text.lower()).encode('ascii', 'ignore').decode()
+    return TOKEN_PATTERN.findall(text)
+
+
+def bm25_scores(query: Sequence[str], documents: Sequence[Counter], k1: float = 1.5, b: float = 0.75) -> np.ndarray:
+    """Okapi BM25 of each tokenized document for the query tokens."""
+    lengths = np.array([sum(document.values()) for document in documents], dtype=np.float32)
+    average = max(float(lengths.mean()), 1.0)
+    scores = np.zeros(len(documents), dtype=np.float32)
+    for term in set(query):
+        frequencies = np.array([document.get(term, 0) for document in documents], dtype=np.float32)
+        matches = int((frequencies > 0).sum())
+        if not matches:
+            continue
+        idf = np.log(1 + (len(documents) - matches + 0.5) / (matches + 0.5))
+        scores += idf * frequencies * (k1 + 1) / (frequencies + k1 * (1 - b + b * lengths / average))
+    return scores
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.where(norms == 0, 1, norms)).astype(np.float32)
+
+
+class HashingEmbeddings:
+    """Signed feature hashing of word unigrams and bigrams, sublinear term frequency, L2 normalized.
+
+    Lexical rather than semantic, but deterministic across processes (blake2b, not the salted `hash()`).
+    """
+
+    def __init__(self, dimensions: int = HASHING_DIMENSIONS):
+        self.dimensions = dimensions
+        self.name = f"hashing-{dimensions}"
+
+    def _vector(self, text: str) -> np.ndarray:
+        words = tokenize(text)
+        counts: Dict[str, int] = {}
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            counts[feature] = counts.get(feature, 0) + 1
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature, count in counts.items():
+            digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'little')
+            vector[digest % self.dimensions] += (1.0 if digest >> 63 else -1.0) * (1.0 + np.log(count))
+        return vector
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        return normalize(np.stack([self._vector(text) for text in texts]))
+
+
+class BedrockEmbeddings:
+    """Titan text embeddings (one InvokeModel call per text)."""
+
+    def __init__(self, model_id: str = EMBEDDINGS_MODEL, region_name: Optional[str] = None):
+        self.model_id = self.name = model_id
+        self.client = boto3.client('bedrock-runtime', region_name=region_name or os.environ.get('AWS_REGION', 'us-east-1'))
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = []
+        for text in texts:
+            body = json.dumps({'inputText': text[:MAX_EMBED_CHARS], 'normalize': True})
+            response = self.client.invoke_model(modelId=self.model_id, body=body)
+            vectors.append(json.loads(response['body'].read())['embedding'])
+        return normalize(np.array(vectors, dtype=np.float32))
+
+
+def get_embeddings(kind: str = EMBEDDINGS):
+    return HashingEmbeddings() if kind == 'hashing' else BedrockEmbeddings()
+
+
+class IndexStorage:
+    """The .npz of an index at s3://bucket/key or at a local path. `version` (ETag / mtime) detects concurrent writes."""
+
+    def __init__(self, location: str):
+        self.location = location
+        if location.startswith('s3://'):
+            self.bucket, _, self.key = location[len('s3://'):].partition('/')
+            self.s3 = boto3.client('s3', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
+        else:
+            self.bucket = None
+
+    def version(self) -> Optional[str]:
+        try:
+            if self.bucket:
+                return self.s3.head_object(Bucket=self.bucket, Key=self.key)['ETag']
+            return str(os.stat(self.location).st_mtime_ns)
+        except (FileNotFoundError, ClientError) as e:
+            if isinstance(e, ClientError) and e.response['Error']['Code'] not in ('404', 'NoSuchKey', 'NotFound'):
+                raise
+            return None
+
+    def read(self) -> Tuple[Optional[bytes], Optional[str]]:
+        try:
+            if self.bucket:
+                response = self.s3.get_object(Bucket=self.bucket, Key=self.key)
+                return response['Body'].read(), response['ETag']
+            with open(self.location, 'rb') as file:
+                return file.read(), str(os.fstat(file.fileno()).st_mtime_ns)
+        except (FileNotFoundError, ClientError) as e:
+            if isinstance(e, ClientError) and e.response['Error']['Code'] not in ('404', 'NoSuchKey', 'NotFound'):
+                raise
+            return None, None
+
+    def write(self, data: bytes, expected_version: Optional[str]) -> Optional[str]:
+        """Write only if the stored copy is still `expected_version` (None: does not exist yet).
+
+        Returns the version of what was written (not re-read: another writer may already have replaced it),
+        or None on a conflict.
+        """
+        if self.bucket:
+            condition = {'IfMatch': expected_version} if expected_version else {'IfNoneMatch': '*'}
+            try:
+                return self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=data, **condition)['ETag']
+            except ClientError as e:
+                # https://docs.aws.amazon.com/AmazonS3/latest/userguide/conditional-writes.html
+                if e.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                    return None
+                raise
+        if self.version() != expected_version:
+            return None
+        os.makedirs(os.path.dirname(os.path.abspath(self.location)), exist_ok=True)
+        temporary = f"{self.location}.{uuid.uuid4().hex}.tmp"
+        with open(temporary, 'wb') as file:
+            file.write(data)
+        version = str(os.stat(temporary).st_mtime_ns)     # Kept by the rename
+        os.replace(temporary, self.location)
+        return version
+
+
+class VectorIndex:
+    """Normalized embeddings (a NumPy matrix) plus a JSON entry per row, stored as one .npz.
+
+    Loaded once per container and reloaded when another container changed it (checked every INDEX_REFRESH_SECONDS).
+    Writes are conditional on the version that was read: on a conflict the stored index is reloaded and the new
+    entries are added again, so concurrent writers don't drop each other's entries.
+    Entries older than `ttl_seconds` (or past their own `expires_at`) are not returned and are dropped on the next write.
+    """
+
+    def __init__(self, location: str, embeddings=None, ttl_seconds: Optional[float] = None, max_entries: int = 5000):
+        self.storage = IndexStorage(location)
+        self.embeddings = embeddings or get_embeddings()
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries: List[dict] = []
+        self.vectors: Optional[np.ndarray] = None
+        self.version: Optional[str] = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+        self._tokens: Dict[str, Counter] = {}     # Entry id -> term counts (keyword scoring)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def load(self):
+        data, version = self.storage.read()
+        entries, vectors = [], None
+        if data:
+            stored = np.load(io.BytesIO(data), allow_pickle=False)
+            metadata = json.loads(str(stored['metadata']))
+            if metadata['embeddings'] == self.embeddings.name:
+                entries, vectors = metadata['entries'], stored['vectors']
+            else:
+                print(f"Index {self.storage.location} was built with {metadata['embeddings']}, starting a new one")
+        self.entries, self.vectors, self.version = entries, vectors, version
+        self.checked_at = time.time()
+
+    def refresh(self, force: bool = False):
+        if force or time.time() - self.checked_at > INDEX_REFRESH_SECONDS:
+            if self.checked_at == 0.0 or self.storage.version() != self.version:
+                self.load()
+            self.checked_at = time.time()
+
+    def _live(self, entry: dict, now: float) -> bool:
+        if 'expires_at' in entry:    # Per-entry freshness overrides the index TTL
+            return now < entry['expires_at']
+        return self.ttl_seconds is None or now - entry['created_at'] < self.ttl_seconds
+
+    def _keyword_scores(self, query: str) -> np.ndarray:
+        """BM25 of every entry text, scaled to [0, 1] by the best match."""
+        documents = []
+        for entry in self.entries:
+            if entry['id'] not in self._tokens:
+                self._tokens[entry['id']] = Counter(tokenize(entry['text']))
+            documents.append(self._tokens[entry['id']])
+        scores = bm25_scores(tokenize(query), documents)
+        return scores / scores.max() if scores.max() > 0 else scores
+
+    def search(self, query: str, k: int = 3, min_score: float = 0.0, keyword_weight: float = 0.0,
+               where: Optional[Callable[[dict], bool]] = None) -> List[Tuple[float, dict]]:
+        """Up to `k` (score, entry) pairs, best first, among the live entries accepted by `where`.
+
+        The score is the cosine similarity, blended with the BM25 keyword score when `keyword_weight` > 0
+        (exact identifiers such as ARNs, instance ids or bucket names that embeddings blur).
+        """
+        with self.lock:
+            self.refresh()
+            if not self.entries:
+                return []
+            scores = self.vectors @ self.embeddings.embed([query])[0]
+            if keyword_weight:
+                scores = (1 - keyword_weight) * scores + keyword_weight * self._keyword_scores(query)
+            now, results = time.time(), []
+            for row in np.argsort(-scores):
+                if scores[row] < min_score or len(results) == k:
+                    break
+                entry = self.entries[row]
+                if self._live(entry, now) and (where is None or where(entry)):
+                    results.append((float(scores[row]), entry))
+            return results
+
+    def add(self, text: str, metadata: dict) -> dict:
+        """Embed and store an entry (`text` is what queries are compared with)."""
+        entry = {'id': uuid.uuid4().hex, 'text': text, 'created_at': time.time(), **metadata}
+        vector = self.embeddings.embed([text])
+        with self.lock:
+            for _ in range(SAVE_ATTEMPTS):
+                self.refresh(force=True)
+                self._append(entry, vector)
+                version = self.storage.write(self._serialize(), self.version)
+                if version:
+                    self.version = version
+                    return entry
+                print(f"Index {self.storage.location} changed while writing, retrying")
+        raise RuntimeError(f"Could not write the index {self.storage.location} after {SAVE_ATTEMPTS} attempts")
+
+    def _append(self, entry: dict, vector: np.ndarray):
+        now = time.time()
+        keep = [row for row, stored in enumerate(self.entries) if self._live(stored, now)]
+        keep = keep[max(len(keep) - self.max_entries + 1, 0):]     # Oldest first
+        entries = [self.entries[row] for row in keep] + [entry]
+        vectors = [self.vectors[keep]] if keep else []
+        self.entries, self.vectors = entries, np.concatenate(vectors + [vector]).astype(np.float32)
+
+    def _serialize(self) -> bytes:
+        buffer = io.BytesIO()
+        metadata = json.dumps({'embeddings': self.embeddings.name, 'entries': self.entries}, ensure_ascii=False)
+        np.savez_compressed(buffer, vectors=self.vectors, metadata=np.array(metadata))
+        return buffer.getvalue()